@@ -0,0 +1,126 @@
+"""
+Checkpoint size and load time of long lead conversations, with and without the message delta codec.
+
+Every turn replays the messages of a typical lead creation, one checkpoint per graph step as
+the graph writes them. Run from the app directory:
+
+    python -m benchmarks.bench_checkpoints --turns 10 50 200
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from support_files import checkpoint_codec
+from support_files.checkpoint_codec import MessageDeltaCodec
+from support_files.checkpointer import BoundedSqliteSaver
+
+
+def _call(name: str, args: dict) -> AIMessage:
+    return AIMessage(content="", id=str(uuid.uuid4()),
+                     tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:24]}"}])
+
+
+def turn_messages(turn: int) -> list:
+    """The messages one lead creation turn adds to the state, in order."""
+    customer = {"name": f"customer {turn}", "phone": f"+91 98{turn:08d}", "email": f"customer{turn}@dealer-mail.com",
+                "civil_id": f"{turn:012d}"}
+    messages = [HumanMessage(content=f"Create a lead for {customer['name']}, phone {customer['phone']}, "
+                                     f"email {customer['email']}, civil ID {customer['civil_id']}, model creta sx.",
+                             id=str(uuid.uuid4()))]
+    handoff = _call("Lead_assistant", {"location": "Chennai", "civilID": customer["civil_id"],
+                                       "request": "Create a lead", **customer})
+    messages.append(handoff)
+    messages.append(ToolMessage(content="The assistant is now the Lead Assistant. Reflect on the above conversation "
+                                        "between the host assistant and the user. " * 4,
+                                tool_call_id=handoff.tool_calls[0]["id"], id=str(uuid.uuid4())))
+    verify = _call("customer_existence_verification", customer)
+    messages.append(verify)
+    messages.append(ToolMessage(content="No matching records found for the provided details. "
+                                        "Would you like to proceed with creating a new lead?",
+                                name="customer_existence_verification", tool_call_id=verify.tool_calls[0]["id"],
+                                id=str(uuid.uuid4())))
+    create = _call("customer_lead_creation", {**customer, "model": "creta", "variant": "sx"})
+    messages.append(create)
+    messages.append(ToolMessage(content=f"Lead successfully created for {customer['name']}.\n" + "\n".join(
+        f"{key}: {value}" for key, value in customer.items()), name="customer_lead_creation",
+        tool_call_id=create.tool_calls[0]["id"], id=str(uuid.uuid4())))
+    escalate = _call("CompleteOrEscalate", {"cancel": True, "reason": "I have fully completed the task."})
+    messages.append(escalate)
+    messages.append(ToolMessage(content="Resuming dialog with the host assistant.",
+                                tool_call_id=escalate.tool_calls[0]["id"], id=str(uuid.uuid4())))
+    messages.append(AIMessage(content=f"The lead for {customer['name']} has been created. Anything else?",
+                              id=str(uuid.uuid4())))
+    return messages
+
+
+def write_thread(saver: BoundedSqliteSaver, thread_id: str, turns: int) -> float:
+    """Checkpoint `turns` turns one step at a time and return the seconds spent in `put` and `flush`."""
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    messages, step, elapsed = [], 0, 0.0
+    for turn in range(turns):
+        for message in turn_messages(turn):
+            messages.append(message)
+            step += 1
+            checkpoint = empty_checkpoint()
+            checkpoint["id"] = f"{step:012d}"
+            checkpoint["channel_values"] = {"messages": list(messages), "dialog_state": ["lead_agent"], "user_info": ""}
+            checkpoint["channel_versions"] = {"messages": step, "dialog_state": step}
+            started = time.perf_counter()
+            config = saver.put(config, checkpoint, {"source": "loop", "step": step, "writes": None}, {})
+            elapsed += time.perf_counter() - started
+    started = time.perf_counter()
+    saver.flush()
+    return elapsed + time.perf_counter() - started
+
+
+def bytes_stored(saver: BoundedSqliteSaver) -> int:
+    checkpoints = saver._conn.execute(
+        "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints"
+    ).fetchone()[0]
+    messages = saver._conn.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM messages").fetchone()[0]
+    return checkpoints + messages
+
+
+def benchmark(codec_name: str, codec, turns: int, loads: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="checkpoint-bench-") as workdir:
+        # Nothing is trimmed, so the database holds every byte written
+        saver = BoundedSqliteSaver(os.path.join(workdir, "checkpoints.sqlite"), max_checkpoints_per_thread=None,
+                                   idle_ttl=None, flush_interval=3600, codec=codec)
+        write_s = write_thread(saver, "bench", turns)
+        written = bytes_stored(saver)
+
+        config = {"configurable": {"thread_id": "bench", "checkpoint_ns": ""}}
+        load_times = []
+        for _ in range(loads):
+            started = time.perf_counter()
+            checkpoint_tuple = saver.get_tuple(config)
+            load_times.append(time.perf_counter() - started)
+        assert len(checkpoint_tuple.checkpoint["channel_values"]["messages"]) == turns * len(turn_messages(0))
+        saver.close()
+    return {
+        "codec": codec_name,
+        "turns": turns,
+        "bytes_per_turn": round(written / turns),
+        "total_kib": round(written / 1024, 1),
+        "write_ms_per_turn": round(write_s / turns * 1000, 3),
+        "load_ms": round(statistics.median(load_times) * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the checkpoint encodings on long conversations.")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200], help="Turns per thread.")
+    parser.add_argument("--loads", type=int, default=20, help="Loads of the latest checkpoint to time.")
+    args = parser.parse_args()
+
+    codecs = [("plain", None), ("delta", MessageDeltaCodec())]
+    if checkpoint_codec.zstandard is not None:
+        codecs.append(("delta+zstd", MessageDeltaCodec(compress=True)))
+    for turns in args.turns:
+        for codec_name, codec in codecs:
+            print(json.dumps(benchmark(codec_name, codec, turns, args.loads)))
@@ -0,0 +1,175 @@
+"""
+Offline end-to-end benchmark of the lead graph.
+
+The Groq models are replaced by scripted chat models and Neo4j by an in-memory graph, so the
+numbers measure the graph itself: routing, windowing, tools, validation, fuzzy matching and
+checkpointing. Run from the app directory:
+
+    python -m benchmarks.bench_graph --leads 1000 100000 --turns 10 50 200
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+_workdir = tempfile.mkdtemp(prefix="lead-graph-bench-")
+os.environ["INSTRUMENTATION"] = "0"
+os.environ["LLM_CACHE"] = "0"
+os.environ["LLM_CACHE_PATH"] = os.path.join(_workdir, "llm_cache.sqlite")
+
+import email_validator
+from support_files import tool_execution
+from support_files.checkpointer import BoundedSqliteSaver
+from support_files.instrumentation import Instrumentation, InstrumentationCallbackHandler
+from support_files.lead_agent import lead_agent_prompt_template
+from support_files.message_window import MessageWindow
+from benchmarks.fakes import (AsyncFakeNeo4jGraph, FakeNeo4jGraph, ScriptedChatModel, lead_script,
+                              primary_script, seed_leads, summary_script)
+import main
+
+# No DNS lookups for the generated email domains
+email_validator.CHECK_DELIVERABILITY = False
+
+
+class RecordingInstrumentation(Instrumentation):
+    """Keeps every sample besides the histograms, for exact percentiles."""
+
+    def __init__(self):
+        super().__init__(enabled=True)
+        self.samples = defaultdict(list)
+
+    def observe(self, metric: str, seconds: float, **labels):
+        super().observe(metric, seconds, **labels)
+        label = labels.get("node") or labels.get("model") or labels.get("query") or ""
+        self.samples[f"{metric}[{label}]" if label else metric].append(seconds)
+
+
+def install_fake_database(leads: list, latency: float) -> FakeNeo4jGraph:
+    """Point the tools at an in-memory graph holding `leads` and drop the fuzzy index built from the last one."""
+    fake = FakeNeo4jGraph(leads, latency=latency)
+    tool_execution.graph = tool_execution.test_graph = fake
+    tool_execution.async_graph = tool_execution.async_test_graph = AsyncFakeNeo4jGraph(fake)
+    tool_execution.lead_name_index.invalidate()
+    return fake
+
+
+def build_graph(checkpoint_path: str, llm_latency: float, token_budget: int):
+    primary = ScriptedChatModel(script=primary_script, latency=llm_latency)
+    lead = ScriptedChatModel(script=lead_script, latency=llm_latency)
+    summarizer = ScriptedChatModel(script=summary_script, latency=llm_latency)
+    builder = main.create_graph_builder(
+        main.primary_assistant_prompt | primary,
+        lead_agent_prompt_template | lead,
+        MessageWindow(token_budget, summarizer),
+        MessageWindow(token_budget, summarizer),
+    )
+    memory = BoundedSqliteSaver(path=checkpoint_path, flush_interval=0.05)
+    return builder.compile(checkpointer=memory), memory
+
+
+def customers(count: int, seed: int) -> list:
+    """User messages for new customers, who are not in the seeded dataset."""
+    return [json.dumps({
+        "name": lead["name"].lower(), "phone": lead["phone_number"], "civil_id": lead["civil_id"],
+        "email": lead["email"].replace("@", ".new@"), "model": lead["model"], "variant": lead["variant"],
+    }) for lead in seed_leads(count, seed=seed)]
+
+
+def run_conversation(graph, thread_id: str, messages: list, callbacks: list = None) -> list:
+    """Run one user turn per message on a single thread and return the latency of every turn."""
+    config = {"configurable": {"thread_id": thread_id}, "callbacks": callbacks or []}
+    latencies = []
+    for message in messages:
+        started = time.perf_counter()
+        graph.invoke({"messages": [("user", message)]}, config)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _summarize(samples: list) -> dict:
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+    }
+
+
+def benchmark(lead_count: int, turns: int, llm_latency: float, db_latency: float, token_budget: int) -> dict:
+    """
+    Returns:
+    - Turns per second, per-turn and per-node latencies, and memory growth for one dataset size
+      and conversation length.
+    """
+    started = time.perf_counter()
+    install_fake_database(seed_leads(lead_count), db_latency)
+    seeded = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed = len(tool_execution.lead_name_index)
+    index_build = time.perf_counter() - started
+
+    checkpoint_path = os.path.join(_workdir, f"bench-{lead_count}-{turns}.sqlite")
+    graph, memory = build_graph(checkpoint_path, llm_latency, token_budget)
+    messages = customers(turns, seed=lead_count + turns)
+    recorder = RecordingInstrumentation()
+
+    # Warm up the validators, the prompt templates and the first checkpoint write
+    run_conversation(graph, "warmup", messages[:1])
+
+    started = time.perf_counter()
+    latencies = run_conversation(graph, "timed", messages, [InstrumentationCallbackHandler(recorder)])
+    elapsed = time.perf_counter() - started
+
+    # Separate pass, tracemalloc slows everything down
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    run_conversation(graph, "memory", messages)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    memory.flush()
+    memory.close()
+    return {
+        "leads": lead_count,
+        "turns": turns,
+        "seed_s": round(seeded, 3),
+        "name_index": {"names": indexed, "build_s": round(index_build, 3)},
+        "turns_per_s": round(turns / elapsed, 2),
+        "turn_latency": _summarize(latencies),
+        "nodes": {name: _summarize(samples) for name, samples in sorted(recorder.samples.items())},
+        "memory": {
+            "growth_kib": round((current - baseline) / 1024, 1),
+            "peak_kib": round((peak - baseline) / 1024, 1),
+            "checkpoint_db_kib": round(os.path.getsize(checkpoint_path) / 1024, 1),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the lead graph offline with a scripted LLM and an in-memory graph database.")
+    parser.add_argument("--leads", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="Sizes of the seeded lead dataset.")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200], help="User turns per conversation.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call.")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Simulated seconds per Cypher query.")
+    parser.add_argument("--token-budget", type=int, default=4000, help="Token budget of both message windows.")
+    parser.add_argument("--output", help="Append every result to this JSON lines file.")
+    args = parser.parse_args()
+
+    for lead_count in args.leads:
+        for turns in args.turns:
+            result = benchmark(lead_count, turns, args.llm_latency, args.db_latency, args.token_budget)
+            print(json.dumps(result, indent=2))
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(result) + "\n")
@@ -0,0 +1,121 @@
+"""
+Tail latency of the assistant model calls with and without hedging and failover.
+
+The Groq backends are replaced by scripted chat models drawing their response times from a
+log-normal distribution with a slow tail, and failing in bursts for the failover scenario.
+Run from the app directory:
+
+    python -m benchmarks.bench_hedging --calls 500 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+os.environ["INSTRUMENTATION"] = "0"
+
+from langchain_core.messages import AIMessage, HumanMessage
+from support_files.llm_hedging import HedgeStats, HedgedChatModel
+from benchmarks.fakes import ScriptedChatModel, latency_distribution
+
+
+def _reply(messages: list) -> AIMessage:
+    return AIMessage(content="Sure, which car model is the customer interested in?")
+
+
+def stub_model(median: float, slow_rate: float, slow: float, seed: int) -> ScriptedChatModel:
+    return ScriptedChatModel(script=_reply, latency=latency_distribution(median, slow_rate=slow_rate, slow=slow, seed=seed))
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_calls(runnable, calls: int, concurrency: int, burst: tuple = None, failing=None) -> dict:
+    """
+    Parameters:
+    - burst: `(start, end)` call indexes during which `failing` returns errors only.
+
+    Returns:
+    - Latency percentiles and the number of failed calls.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one(index: int):
+        nonlocal failures
+        async with slots:
+            if burst is not None:
+                failing.error_rate = 1.0 if burst[0] <= index < burst[1] else 0.0
+            started = time.perf_counter()
+            try:
+                await runnable.ainvoke([HumanMessage(content="Create a lead for arun kumar")])
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(index) for index in range(calls)))
+    return {
+        "calls": calls,
+        "failures": failures,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+def benchmark(calls: int, concurrency: int, median: float, slow_rate: float, slow: float,
+              hedge_percentile: float) -> list:
+    results = []
+
+    def scenario(name: str, runnable, stats: HedgeStats = None, **options):
+        result = asyncio.run(run_calls(runnable, calls, concurrency, **options))
+        result = {"scenario": name, **result}
+        if stats is not None:
+            result["stats"] = stats.snapshot()
+            result["breakers"] = runnable.breaker_states()
+        results.append(result)
+
+    scenario("single", stub_model(median, slow_rate, slow, seed=1))
+
+    stats = HedgeStats()
+    hedged = HedgedChatModel([("primary", stub_model(median, slow_rate, slow, seed=1))],
+                             hedge_percentile=hedge_percentile, min_hedge_delay=0.0, stats=stats)
+    scenario("hedged_same_backend", hedged, stats)
+
+    stats = HedgeStats()
+    hedged = HedgedChatModel([("primary", stub_model(median, slow_rate, slow, seed=1)),
+                              ("secondary", stub_model(median * 1.5, slow_rate, slow, seed=2))],
+                             hedge_percentile=hedge_percentile, min_hedge_delay=0.0, stats=stats)
+    scenario("hedged_secondary", hedged, stats)
+
+    # The primary fails for a fifth of the run, the breaker should route around it after a few errors
+    burst = (calls * 2 // 5, calls * 3 // 5)
+    primary = stub_model(median, slow_rate, slow, seed=1)
+    scenario("single_error_burst", primary, burst=burst, failing=primary)
+
+    stats = HedgeStats()
+    primary = stub_model(median, slow_rate, slow, seed=1)
+    failover = HedgedChatModel([("primary", primary), ("secondary", stub_model(median * 1.5, slow_rate, slow, seed=2))],
+                               hedge_percentile=None, failure_threshold=3, reset_timeout=median * 20, stats=stats)
+    scenario("failover_error_burst", failover, stats, burst=burst, failing=primary)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare single, hedged and failover model calls on stub backends.")
+    parser.add_argument("--calls", type=int, default=500, help="Model calls per scenario.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Calls in flight at the same time.")
+    parser.add_argument("--median", type=float, default=0.05, help="Median seconds per call.")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of calls in the slow tail.")
+    parser.add_argument("--slow", type=float, default=0.5, help="Extra seconds of a slow call.")
+    parser.add_argument("--hedge-percentile", type=float, default=0.9, help="Latency percentile triggering a hedge.")
+    args = parser.parse_args()
+
+    for result in benchmark(args.calls, args.concurrency, args.median, args.slow_rate, args.slow, args.hedge_percentile):
+        print(json.dumps(result))
@@ -0,0 +1,82 @@
+"""
+Cold start cost of the lead graph, measured in fresh interpreters.
+
+Reports the wall time of `import main`, of the first `build_graph()` and of a second,
+cached `build_graph()`, plus the slowest modules from `python -X importtime`. Run from the
+app directory:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_PROBE = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.build_graph()
+built = time.perf_counter()
+main.build_graph()
+rebuilt = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "build_s": built - imported, "cached_build_s": rebuilt - built}))
+"""
+
+
+def _environment(workdir: str) -> dict:
+    env = dict(os.environ)
+    # The Groq clients only need a key to be constructed, nothing is sent
+    env.setdefault("GROQ_API_KEY", "startup-benchmark")
+    env["CHECKPOINT_DB"] = os.path.join(workdir, "checkpoints.sqlite")
+    env["LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.sqlite")
+    return env
+
+
+def measure(runs: int) -> dict:
+    """
+    Returns:
+    - Median and worst timing of every startup phase over `runs` fresh interpreters.
+    """
+    samples = []
+    with tempfile.TemporaryDirectory(prefix="lead-graph-startup-") as workdir:
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-c", _PROBE], env=_environment(workdir), check=True,
+                                    capture_output=True, text=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        phase: {"median_ms": round(statistics.median(s[phase] for s in samples) * 1000, 1),
+                "max_ms": round(max(s[phase] for s in samples) * 1000, 1)}
+        for phase in samples[0]
+    }
+
+
+def slowest_imports(top: int) -> list:
+    """
+    Returns:
+    - The `top` modules with the highest cumulative import time of `import main`.
+    """
+    with tempfile.TemporaryDirectory(prefix="lead-graph-startup-") as workdir:
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=_environment(workdir),
+                                check=True, capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line.split(":", 1)[1].split("|")
+        modules.append({"module": module.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(modules, key=lambda module: module["cumulative_ms"], reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import and build time of the lead graph.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list.")
+    args = parser.parse_args()
+
+    print(json.dumps({"phases": measure(args.runs), "slowest_imports": slowest_imports(args.top)}, indent=2))
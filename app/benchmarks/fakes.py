@@ -0,0 +1,241 @@
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Any, Callable, List, Optional, Union
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from support_files.cypher_queries import query_registry
+
+_FIRST_NAMES = ["arun", "bala", "chandru", "deepa", "ezhil", "farah", "ganesh", "hari", "indra", "jaya",
+                "karthik", "lakshmi", "mohan", "nila", "omar", "priya", "rahul", "sara", "tamil", "uma"]
+_LAST_NAMES = ["kumar", "raj", "ganeshan", "iyer", "khan", "nair", "pillai", "reddy", "shah", "varma"]
+_MODELS = [("creta", "sx"), ("venue", "s"), ("verna", "sx(o)"), ("tucson", "signature")]
+
+
+def seed_leads(count: int, seed: int = 0) -> list:
+    """Deterministic fake Lead records with valid phone numbers, civil IDs and emails."""
+    rng = random.Random(seed)
+    leads = []
+    for i in range(count):
+        first, last = rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+        model, variant = rng.choice(_MODELS)
+        leads.append({
+            "id": f"lead-{i}",
+            "name": f"{first.capitalize()} {last}",
+            "phone_number": f"+91 9{rng.randrange(10 ** 9):09d}",
+            "civil_id": f"{rng.randrange(10 ** 12):012d}",
+            "email": f"{first}.{last}{i}@dealer-mail.com",
+            "model": model,
+            "variant": variant,
+        })
+    return leads
+
+
+class FakeNeo4jGraph:
+    """
+    In-process stand-in for `Neo4jConnectionManager` answering the registered queries from dictionaries.
+
+    Queries are recognized by their registry text, so the tools run unchanged. `latency` adds a
+    fixed delay per query to model the network round trip.
+    """
+
+    def __init__(self, leads: list, latency: float = 0.0):
+        self.latency = latency
+        self.leads = {}
+        self._by = {"phone_number": {}, "civil_id": {}, "email": {}}
+        for lead in leads:
+            self._add(lead)
+        self._handlers = {
+            "all_lead_names": self._all_lead_names,
+            "identifier_lookup": self._lookup,
+            "lead_creation": self._create,
+            "bulk_lead_creation": self._bulk_create,
+        }
+        self._names = {query.text: query.name for query in query_registry}
+
+    def _add(self, lead: dict):
+        self.leads[lead["id"]] = lead
+        for key, index in self._by.items():
+            index.setdefault(lead[key], lead)
+
+    def _all_lead_names(self, params: dict) -> list:
+        return [{"lead_id": lead["id"], "customer_name": lead["name"]} for lead in self.leads.values()]
+
+    def _lookup(self, params: dict) -> list:
+        rows = []
+        for param, column in (("phone", "phone_number"), ("civil_id", "civil_id"), ("email", "email")):
+            lead = self._by[column].get(params.get(param)) if params.get(param) else None
+            if lead is not None:
+                rows.append({"identifier": param, "lead_name": lead["name"], "phone_number": lead["phone_number"],
+                             "civil_id": lead["civil_id"], "email": lead["email"], "lead_id": lead["id"]})
+        return rows
+
+    def _create(self, params: dict) -> list:
+        existing = self._by["phone_number"].get(params["mobile"])
+        lead = {
+            "id": existing["id"] if existing else str(uuid.uuid4()),
+            "name": params["name"],
+            "phone_number": params["mobile"],
+            "civil_id": params["civil_id"],
+            "email": params["email"],
+            "model": params["model"],
+            "variant": params["variant"],
+        }
+        self._add(lead)
+        return [{"lead_id": lead["id"], "lead_name": lead["name"]}]
+
+    def _bulk_create(self, params: dict) -> list:
+        return [row for record in params["rows"] for row in self._create(record)]
+
+    def query(self, query: str, params: dict = None) -> list:
+        if self.latency:
+            time.sleep(self.latency)
+        name = self._names.get(query)
+        if name not in self._handlers:
+            return []
+        return self._handlers[name](params or {})
+
+    def execute_write(self, query: str, params: dict = None) -> list:
+        return self.query(query, params)
+
+
+class AsyncFakeNeo4jGraph:
+    """Async view of a `FakeNeo4jGraph`, standing in for `AsyncNeo4jConnectionManager`."""
+
+    def __init__(self, graph: FakeNeo4jGraph):
+        self.graph = graph
+
+    async def query(self, query: str, params: dict = None) -> list:
+        if self.graph.latency:
+            await asyncio.sleep(self.graph.latency)
+        name = self.graph._names.get(query)
+        if name not in self.graph._handlers:
+            return []
+        return self.graph._handlers[name](params or {})
+
+
+def _tool_call(name: str, args: dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:24]}"}])
+
+
+def _customer(messages: list) -> dict:
+    """The benchmark sends every customer as a JSON user message."""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            try:
+                return json.loads(message.content)
+            except (TypeError, ValueError):
+                return {}
+    return {}
+
+
+def primary_script(messages: list) -> AIMessage:
+    """Delegate every user turn to the lead assistant, then answer once it hands control back."""
+    last = messages[-1]
+    if isinstance(last, HumanMessage):
+        customer = _customer(messages)
+        return _tool_call("Lead_assistant", {
+            "location": "Chennai", "name": customer.get("name", ""), "phone": customer.get("phone", ""),
+            "email": customer.get("email", ""), "civilID": customer.get("civil_id", ""),
+            "request": "Create a lead",
+        })
+    return AIMessage(content="The lead has been handled. Is there anything else I can help you with?")
+
+
+def lead_script(messages: list) -> AIMessage:
+    """Verify by name, verify by identifiers, create the lead and escalate back, one step per call."""
+    customer = _customer(messages)
+    steps = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage) and message.name:
+            steps.append(message.name)
+
+    verifications = steps.count("customer_existence_verification")
+    if "customer_lead_creation" in steps:
+        return _tool_call("CompleteOrEscalate", {"cancel": True, "reason": "I have fully completed the task."})
+    if verifications == 0:
+        return _tool_call("customer_existence_verification", {"name": customer.get("name")})
+    if verifications == 1:
+        return _tool_call("customer_existence_verification", {
+            "name": customer.get("name"), "phone": customer.get("phone"),
+            "email": customer.get("email"), "civil_id": customer.get("civil_id"),
+        })
+    return _tool_call("customer_lead_creation", {
+        "name": customer.get("name"), "phone": customer.get("phone"), "civil_id": customer.get("civil_id"),
+        "email": customer.get("email"), "model": customer.get("model"), "variant": customer.get("variant"),
+    })
+
+
+def summary_script(messages: list) -> AIMessage:
+    return AIMessage(content="The user created leads for several customers.")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model replaying predetermined tool calls, chosen by `script` from the prompt messages.
+
+    `bind_tools` is accepted and ignored, so it drops in wherever ChatGroq is bound. `latency`
+    simulates the provider's response time, either fixed seconds or a function drawing them, e.g.
+    `latency_distribution`. `error_rate` is the share of calls failing with a ConnectionError.
+    """
+
+    script: Callable[[list], AIMessage]
+    latency: Union[float, Callable[[], float]] = 0.0
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        if self.error_rate and random.random() < self.error_rate:
+            raise ConnectionError("Simulated provider error")
+        message = self.script(messages)
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(str(message.content)) // 4}},
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._result(messages)
+
+    def bind_tools(self, tools: list, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+
+def latency_distribution(median: float, sigma: float = 0.3, slow_rate: float = 0.0, slow: float = 0.0,
+                         seed: Optional[int] = None) -> Callable[[], float]:
+    """
+    Log-normal response times around `median` seconds, plus a `slow_rate` share of calls taking
+    `slow` seconds more, the long tail of a loaded provider.
+    """
+    rng = random.Random(seed)
+
+    def draw() -> float:
+        delay = rng.lognormvariate(math.log(median), sigma)
+        if slow_rate and rng.random() < slow_rate:
+            delay += slow
+        return delay
+
+    return draw
@@ -8,11 +8,22 @@ from typing import Callable
 from langchain_core.messages import ToolMessage
 from langgraph.graph.message import AnyMessage, add_messages
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langgraph.checkpoint.memory import MemorySaver
+from support_files.checkpointer import BoundedSqliteSaver
+from support_files.checkpoint_codec import MessageDeltaCodec
+from support_files.message_window import MessageWindow
+from support_files.retry import RetryPolicy, ainvoke_with_retry, invoke_with_retry
+from support_files.llm_cache import cached
+from support_files.llm_hedging import resilient
+from support_files.instrumentation import instrumented_config
+from support_files.pre_router import PreRouter
+from support_files.prefetch import VerificationPrefetcher
+from support_files.lead_write_queue import LeadWriteQueue, report_text
+from support_files.tool_runner import ParallelToolNode
+from loguru import logger
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.runnables import Runnable, RunnableConfig
 from support_files.tool_execution import *
-from support_files.lead_agent import lead_assistant_runnable, lead_agent_tool,safe_tool, sensitive_tool
+from support_files.lead_agent import create_lead_assistant_runnable, lead_agent_tool,safe_tool, sensitive_tool
 from langchain_groq import ChatGroq
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, StateGraph, START
@@ -20,13 +31,17 @@ from langgraph.prebuilt import tools_condition
 ist_timezone = timezone("Asia/Kolkata")
 from dotenv import load_dotenv
 load_dotenv()
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableLambda
 from langgraph.prebuilt import ToolNode
 from typing import Annotated, Literal, Optional
 from typing_extensions import TypedDict
 from langgraph.graph.message import AnyMessage, add_messages
 import os
+import argparse
+import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
 
 LANGCHAIN_TRACING_V2="true"
 LANGCHAIN_API_KEY= os.getenv("LANGCHAIN_API_KEY")
@@ -41,6 +56,13 @@ def update_dialog_stack(left: list[str], right: Optional[str]) -> list[str]:
     return left + [right]
 
 
+def update_summaries(left: Optional[dict], right: dict) -> dict:
+    """Merge the rolling summaries of the assistants, keyed by assistant name."""
+    # Threads checkpointed before the summaries were kept per assistant hold a single one, it is dropped
+    summaries = {name: summary for name, summary in (left or {}).items() if isinstance(summary, dict)}
+    return {**summaries, **right}
+
+
 class State(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     user_info: str
@@ -54,27 +76,83 @@ class State(TypedDict):
         ],
         update_dialog_stack,
     ]
+    # Rolling summary of the turns that no longer fit in each assistant's token budget, by assistant name
+    summary: Annotated[dict, update_summaries]
+
+# Bounds the LLM calls of one assistant turn, for empty responses as well as rate limits
+llm_retry_policy = RetryPolicy(
+    max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", 3)),
+    base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+    max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 8)),
+    deadline=float(os.getenv("LLM_RETRY_DEADLINE", 30)),
+)
+
+# Tag of the assistants' reply LLM calls, the serving layer streams their tokens to the client
+REPLY_TAG = "assistant_reply"
+
 class Assistant:
-    def __init__(self, runnable: Runnable):
-        self.runnable = runnable
+    def __init__(self, runnable: Runnable, window: Optional[MessageWindow] = None,
+                 retry_policy: Optional[RetryPolicy] = None, lead_writes: Optional[LeadWriteQueue] = None,
+                 name: str = "assistant"):
+        self.name = name
+        self.runnable = runnable.with_config(tags=[REPLY_TAG])
+        self.window = window
+        self.retry_policy = retry_policy or llm_retry_policy
+        self.lead_writes = lead_writes
+
+    def _write_notices(self, state: State, config: RunnableConfig) -> tuple:
+        """
+        Add the outcome of the thread's queued lead writes to the state the assistant sees.
+
+        Returns:
+        - `(state, notices, reports)`, the reports are acknowledged with `_ack_notices` once the
+          assistant answered, so a failed turn reports them again.
+        """
+        if self.lead_writes is None:
+            return state, [], []
+        thread_id = (config.get("configurable") or {}).get("thread_id")
+        reports = self.lead_writes.pending_reports(thread_id)
+        notices = [SystemMessage(content=report_text(report)) for report in reports]
+        if notices:
+            state = {**state, "messages": [*state["messages"], *notices]}
+        return state, notices, reports
+
+    def _own_summary(self, state: State) -> State:
+        """The state with this assistant's summary, each assistant windows the messages to its own budget."""
+        return {**state, "summary": (state.get("summary") or {}).get(self.name)}
+
+    def _ack_notices(self, reports: list):
+        if reports:
+            self.lead_writes.ack_reports(reports)
 
     def __call__(self, state: State, config: RunnableConfig):
-        while True:
-            result = self.runnable.invoke(state)
-            # If the LLM happens to return an empty response, we will re-prompt it
-            # for an actual response.
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
-                messages = state["messages"] + [("user", "Respond with a real output.")]
-                state = {**state, "messages": messages}
-                messages = state["messages"] + [("user", "Respond with a real output.")]
-                state = {**state, "messages": messages}
-            else:
-                break
-        return {"messages": result}
+        update = {}
+        if self.window is not None:
+            messages, summary = self.window.apply(self._own_summary(state))
+            state = {**state, "messages": messages}
+            if summary is not None:
+                update["summary"] = {self.name: summary}
+        state, notices, reports = self._write_notices(state, config)
+        result = invoke_with_retry(self.runnable, state, self.retry_policy, self.name, config=config)
+        self._ack_notices(reports)
+        return {**update, "messages": [*notices, result]}
+
+    async def acall(self, state: State, config: RunnableConfig):
+        """Async version of `__call__`, used by `astream`/`astream_events` so tokens stream from the event loop."""
+        update = {}
+        if self.window is not None:
+            messages, summary = await self.window.aapply(self._own_summary(state))
+            state = {**state, "messages": messages}
+            if summary is not None:
+                update["summary"] = {self.name: summary}
+        state, notices, reports = await asyncio.to_thread(self._write_notices, state, config)
+        result = await ainvoke_with_retry(self.runnable, state, self.retry_policy, self.name, config=config)
+        await asyncio.to_thread(self._ack_notices, reports)
+        return {**update, "messages": [*notices, result]}
+
+    def as_node(self, name: Optional[str] = None) -> Runnable:
+        """Graph node running `__call__` under invoke/stream and `acall` under ainvoke/astream."""
+        return RunnableLambda(self, afunc=self.acall, name=name or self.name)
 
 class CompleteOrEscalate(BaseModel):
     """A tool to mark the current task as completed and/or to escalate control of the dialog to the main assistant,
@@ -113,8 +191,11 @@ def handle_tool_error(state) -> dict:
     }
 
 
-def create_tool_node_with_fallback(tools: list) -> dict:
-    return ToolNode(tools).with_fallbacks(
+def create_tool_node_with_fallback(tools: list, sequential_tools: Optional[list] = None,
+                                   prefetcher: Optional[VerificationPrefetcher] = None) -> dict:
+    # `tools` run concurrently, `sequential_tools` one at a time after them, results keep the order of the calls.
+    # The node awaits the tools' coroutines when the graph runs through ainvoke/astream
+    return ParallelToolNode(tools, sequential_tools, prefetcher=prefetcher).as_node().with_fallbacks(
         [RunnableLambda(handle_tool_error)], exception_key="error"
     )
 
@@ -160,10 +241,17 @@ class Lead_assistant(BaseModel):
         }
 
 
-def create_entry_node(assistant_name: str, new_dialog_state: str) -> Callable:
-    def entry_node(state: State) -> dict:
-        tool_call_id = state["messages"][-1].tool_calls[0]["id"]
-        print("this is tool call id", tool_call_id)
+def create_entry_node(assistant_name: str, new_dialog_state: str,
+                      prefetcher: Optional[VerificationPrefetcher] = None) -> Callable:
+    def entry_node(state: State, config: RunnableConfig) -> dict:
+        tool_call = state["messages"][-1].tool_calls[0]
+        tool_call_id = tool_call["id"]
+        logger.debug("Entering {} for tool call {}", assistant_name, tool_call_id)
+        if prefetcher is not None:
+            # The hand-off carries the customer's details, verify them while the assistant's LLM call runs
+            args = tool_call["args"]
+            prefetcher.start(config, name=args.get("name"), email=args.get("email"),
+                             phone=args.get("phone"), civil_id=args.get("civilID"))
         return {
             "messages": [
                 ToolMessage(
@@ -181,8 +269,6 @@ def create_entry_node(assistant_name: str, new_dialog_state: str) -> Callable:
     return entry_node
 
 
-model = ChatGroq(model="llama3-70b-8192",temperature=1)
-
 primary_assistant_prompt = ChatPromptTemplate.from_messages(
     [
         (
@@ -204,7 +290,6 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
 ).partial(time=datetime.now(ist_timezone).isoformat())
 
 # primary_assistant_tools = [customer_existence_verification]
-primary_assistant_runnable = primary_assistant_prompt | model.bind_tools([Lead_assistant])
 def pop_dialog_state(state: State) -> dict:
     """Pop the dialog stack and return to the main assistant.
 
@@ -212,42 +297,18 @@ def pop_dialog_state(state: State) -> dict:
     to specific sub-graphs.
     """
     messages = []
-    if state["messages"][-1].tool_calls:
-        # Note: Doesn't currently handle the edge case where the llm performs parallel tool calls
-        messages.append(
-            ToolMessage(
-                content="Resuming dialog with the host assistant. Please reflect on the past conversation and assist the user as needed.",
-                tool_call_id=state["messages"][-1].tool_calls[0]["id"],
-            )
-        )
-    print(messages)
+    # Every tool call needs an answer, the calls made next to CompleteOrEscalate are not run
+    for tool_call in state["messages"][-1].tool_calls:
+        if tool_call["name"] == CompleteOrEscalate.__name__:
+            content = "Resuming dialog with the host assistant. Please reflect on the past conversation and assist the user as needed."
+        else:
+            content = f"{tool_call['name']} was not run because the task was handed back to the host assistant."
+        messages.append(ToolMessage(content=content, tool_call_id=tool_call["id"]))
     return {
         "dialog_state": "pop",
         "messages": messages,
     }
 
-# Compile graph
-builder = StateGraph(State)
-
-builder.add_node("enter_lead_assistant",create_entry_node("Lead Assistant", "lead_agent"))
-builder.add_node("lead_agent", Assistant(lead_assistant_runnable))
-builder.add_edge("enter_lead_assistant", "lead_agent")
-
-builder.add_node(
-    "lead_assistant_safe_tools",
-    create_tool_node_with_fallback(safe_tool))
-
-builder.add_node(
-    "lead_assistant_sensitive_tools",
-    create_tool_node_with_fallback(sensitive_tool))
-
-builder.add_node("primary_assistant", Assistant(primary_assistant_runnable))
-builder.add_edge(START, "primary_assistant")
-# builder.add_node("primary_assistant_tools", create_tool_node_with_fallback(primary_assistant_tools))
-builder.add_node("leave_skill", pop_dialog_state)
-builder.add_edge("leave_skill", "primary_assistant")
-# builder.add_edge("primary_assistant", "enter_lead_assistant")
-
 def route_lead_assistant(
     state: State,
 ) -> Literal[
@@ -257,28 +318,22 @@ def route_lead_assistant(
     "__end__",
 ]:
     route = tools_condition(state)
-    print("This is the route",route)
+    logger.debug("Lead assistant route: {}", route)
     if route == END:
         return END
     tool_calls = state["messages"][-1].tool_calls
     did_cancel = any(tc["name"] == CompleteOrEscalate.__name__ for tc in tool_calls)
     
     if did_cancel:
-        print("This is the tool calls",tool_calls)
-        print("this is the name",CompleteOrEscalate.__name__)
+        logger.debug("Lead assistant escalated with {}", tool_calls)
         return "leave_skill"
     
-    safe_toolnames = [t.name for t in safe_tool]
-    if all(tc["name"] in safe_toolnames for tc in tool_calls):
-        print("This is the safe tool names",safe_toolnames)
-        return "lead_assistant_safe_tools"
-    
+    # Any write sends the whole batch to the sensitive node, which runs the reads first and
+    # then the writes. Unknown tools are answered with an error by either node.
     sensitive_toolnames = [t.name for t in sensitive_tool]
-    if all(tc["name"] in sensitive_toolnames for tc in tool_calls):
-        print("This is the sensitive tool names",sensitive_toolnames)
+    if any(tc["name"] in sensitive_toolnames for tc in tool_calls):
         return "lead_assistant_sensitive_tools"
-
-    return END
+    return "lead_assistant_safe_tools"
 
 
 ######################################################################################
@@ -301,19 +356,6 @@ def route_primary_assistant(
     raise ValueError("Invalid route")
 
 
-# The assistant can route to one of the delegated assistants,
-# directly use a tool, or directly respond to the user
-builder.add_conditional_edges(
-    "primary_assistant",
-    route_primary_assistant,
-    {
-        "enter_lead_assistant": "enter_lead_assistant",
-        #"primary_assistant": "primary_assistant",
-        END: END,
-    },
-)
-# builder.add_edge("primary_assistant_tools", "primary_assistant")
-
 def route_to_workflow(
     state: State,
 ) -> Literal[
@@ -327,31 +369,243 @@ def route_to_workflow(
     return dialog_state[-1]
 
 
-# builder.add_conditional_edges("fetch_user_info", route_to_workflow)
+def create_graph_builder(primary_runnable: Runnable, lead_runnable: Runnable,
+                         primary_window: Optional[MessageWindow] = None,
+                         lead_window: Optional[MessageWindow] = None,
+                         pre_router: Optional[PreRouter] = None,
+                         prefetcher: Optional[VerificationPrefetcher] = None,
+                         lead_writes: Optional[LeadWriteQueue] = None) -> StateGraph:
+    """
+    Wire the primary and lead assistants, their tools and the routing into an uncompiled graph.
+
+    With a `pre_router` the obvious turns skip the primary assistant's LLM call, the others start
+    at the primary assistant as before. With a `prefetcher` entering the lead assistant starts the
+    customer verification, and the lead assistant's tool nodes answer a matching call from it.
+    With `lead_writes` lead creations are queued and both assistants tell the user how they ended.
+    """
+    builder = StateGraph(State)
+
+    builder.add_node("enter_lead_assistant",create_entry_node("Lead Assistant", "lead_agent", prefetcher))
+    builder.add_node("lead_agent", Assistant(lead_runnable, lead_window, lead_writes=lead_writes, name="lead_agent").as_node())
+    builder.add_edge("enter_lead_assistant", "lead_agent")
+
+    builder.add_node(
+        "lead_assistant_safe_tools",
+        create_tool_node_with_fallback(safe_tool, prefetcher=prefetcher))
+
+    builder.add_node(
+        "lead_assistant_sensitive_tools",
+        create_tool_node_with_fallback(safe_tool, sensitive_tool if lead_writes is None else [lead_writes.tool()], prefetcher))
+
+    builder.add_node("primary_assistant",
+                     Assistant(primary_runnable, primary_window, lead_writes=lead_writes,
+                               name="primary_assistant").as_node())
+    if pre_router is None:
+        builder.add_edge(START, "primary_assistant")
+    else:
+        builder.add_node("pre_router_handoff", pre_router.handoff)
+        builder.add_edge("pre_router_handoff", "enter_lead_assistant")
+        builder.add_conditional_edges(
+            START,
+            pre_router.route,
+            {
+                "primary_assistant": "primary_assistant",
+                "lead_agent": "lead_agent",
+                "pre_router_handoff": "pre_router_handoff",
+            },
+        )
+    # builder.add_node("primary_assistant_tools", create_tool_node_with_fallback(primary_assistant_tools))
+    builder.add_node("leave_skill", pop_dialog_state)
+    builder.add_edge("leave_skill", "primary_assistant")
+    # builder.add_edge("primary_assistant", "enter_lead_assistant")
+
+    # The assistant can route to one of the delegated assistants,
+    # directly use a tool, or directly respond to the user
+    builder.add_conditional_edges(
+        "primary_assistant",
+        route_primary_assistant,
+        {
+            "enter_lead_assistant": "enter_lead_assistant",
+            #"primary_assistant": "primary_assistant",
+            END: END,
+        },
+    )
+    # builder.add_edge("primary_assistant_tools", "primary_assistant")
+    # builder.add_conditional_edges("fetch_user_info", route_to_workflow)
+
+    builder.add_edge("lead_assistant_safe_tools", "lead_agent")
+    builder.add_edge("lead_assistant_sensitive_tools", "lead_agent")
+    builder.add_conditional_edges("lead_agent",route_lead_assistant)
+    return builder
+
+
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class GraphConfig:
+    """Everything `build_graph` needs, hashable so that each configuration is built only once."""
+
+    model_name: str = "llama3-70b-8192"
+    # The primary model samples at temperature 1, so its cache is opted into separately
+    primary_llm_cache: bool = False
+    # Token budget of the history sent to each assistant, older turns are summarized
+    primary_token_budget: int = 4000
+    lead_token_budget: int = 4000
+    # Secondary model the assistants fail over to, and hedging after a latency percentile of the primary
+    fallback_model_name: Optional[str] = None
+    hedge_percentile: Optional[float] = None
+    hedge_min_delay: float = 0.5
+    hedge_max_delay: float = 10.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+    # Rule-based routing of obvious turns without the primary assistant's LLM call
+    pre_router: bool = False
+    pre_router_min_confidence: float = 0.8
+    # Verify the hand-off's customer details while the lead assistant's first LLM call runs
+    verification_prefetch: bool = True
+    # Queue lead creations in a local database and write them to Neo4j in the background
+    lead_write_behind: bool = False
+    lead_queue_db: str = "lead_writes.sqlite"
+    # Durable checkpoints, trimmed to the last N per thread and expired after a period of inactivity
+    checkpoint_db: str = "checkpoints.sqlite"
+    checkpoint_max_per_thread: int = 10
+    checkpoint_idle_ttl: float = 7 * 24 * 3600
+    checkpoint_flush_interval: float = 0.5
+    # Store every message once per thread instead of in every checkpoint, optionally zstd compressed
+    checkpoint_delta: bool = True
+    checkpoint_zstd: bool = False
+
+    def __post_init__(self):
+        # LLM_HEDGE_PERCENTILE=95 would otherwise hedge after the slowest recent call
+        if self.hedge_percentile is not None and not 0 < self.hedge_percentile < 1:
+            raise ValueError(f"LLM_HEDGE_PERCENTILE must be a fraction between 0 and 1, e.g. 0.95, "
+                             f"got {self.hedge_percentile}.")
+
+    @classmethod
+    def from_env(cls) -> "GraphConfig":
+        return cls(
+            model_name=os.getenv("LLM_MODEL", cls.model_name),
+            primary_llm_cache=_env_flag("PRIMARY_LLM_CACHE"),
+            primary_token_budget=int(os.getenv("PRIMARY_ASSISTANT_TOKEN_BUDGET", cls.primary_token_budget)),
+            lead_token_budget=int(os.getenv("LEAD_ASSISTANT_TOKEN_BUDGET", cls.lead_token_budget)),
+            fallback_model_name=os.getenv("LLM_FALLBACK_MODEL") or None,
+            hedge_percentile=float(os.environ["LLM_HEDGE_PERCENTILE"]) if os.getenv("LLM_HEDGE_PERCENTILE") else None,
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", cls.hedge_min_delay)),
+            hedge_max_delay=float(os.getenv("LLM_HEDGE_MAX_DELAY", cls.hedge_max_delay)),
+            breaker_failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", cls.breaker_failure_threshold)),
+            breaker_reset_timeout=float(os.getenv("LLM_BREAKER_RESET_TIMEOUT", cls.breaker_reset_timeout)),
+            pre_router=_env_flag("PRE_ROUTER"),
+            pre_router_min_confidence=float(os.getenv("PRE_ROUTER_MIN_CONFIDENCE", cls.pre_router_min_confidence)),
+            verification_prefetch=_env_flag("VERIFICATION_PREFETCH", "1"),
+            lead_write_behind=_env_flag("LEAD_WRITE_BEHIND"),
+            lead_queue_db=os.getenv("LEAD_QUEUE_DB", cls.lead_queue_db),
+            checkpoint_db=os.getenv("CHECKPOINT_DB", cls.checkpoint_db),
+            checkpoint_max_per_thread=int(os.getenv("CHECKPOINT_MAX_PER_THREAD", cls.checkpoint_max_per_thread)),
+            checkpoint_idle_ttl=float(os.getenv("CHECKPOINT_IDLE_TTL", cls.checkpoint_idle_ttl)),
+            checkpoint_flush_interval=float(os.getenv("CHECKPOINT_FLUSH_INTERVAL", cls.checkpoint_flush_interval)),
+            checkpoint_delta=_env_flag("CHECKPOINT_DELTA", "1"),
+            checkpoint_zstd=_env_flag("CHECKPOINT_ZSTD"),
+        )
+
 
-builder.add_edge("lead_assistant_safe_tools", "lead_agent")
-builder.add_edge("lead_assistant_sensitive_tools", "lead_agent")
-builder.add_conditional_edges("lead_agent",route_lead_assistant)
+def build_graph(config: Optional[GraphConfig] = None):
+    """
+    Build the Groq clients, the checkpointer and the compiled graph on first use.
 
-# Compile graph
-memory = MemorySaver()
-part_4_graph = builder.compile(checkpointer=memory) #,interrupt_before=["lead_assistant_sensitive_tools"]
+    Importing this module creates none of them and the Neo4j connections open on their first
+    query, so the graph can be embedded in workers and cold starts only pay for what they run.
 
-part_4_graph.get_graph(xray=True).draw_mermaid_png(output_file_path="part_4_graph.png")
+    Parameters:
+    - config: Graph configuration, read from the environment when omitted.
 
-config = {
-    "configurable": {
-        "thread_id": 1,
+    Returns:
+    - The compiled graph, the same instance for every call with an equal configuration.
+    """
+    return _build_graph(config or GraphConfig.from_env())
+
+
+def groq_client(model_name: str, temperature: float) -> ChatGroq:
+    """A Groq client leaving every retry to `llm_retry_policy`, its own retries would multiply the attempts."""
+    return ChatGroq(model=model_name, temperature=temperature, max_retries=0)
+
+
+@lru_cache(maxsize=None)
+def _build_graph(config: GraphConfig):
+    primary_model = groq_client(config.model_name, temperature=1)
+    # The lead agent and the summarizer both want deterministic output and share one client
+    precise_model = groq_client(config.model_name, temperature=0)
+    primary_fallbacks, precise_fallbacks = (), ()
+    if config.fallback_model_name:
+        primary_fallbacks = (groq_client(config.fallback_model_name, temperature=1),)
+        precise_fallbacks = (groq_client(config.fallback_model_name, temperature=0),)
+    hedge_options = {
+        "hedge_percentile": config.hedge_percentile,
+        "min_hedge_delay": config.hedge_min_delay,
+        "max_hedge_delay": config.hedge_max_delay,
+        "failure_threshold": config.breaker_failure_threshold,
+        "reset_timeout": config.breaker_reset_timeout,
     }
-}
-
-_printed = set()
-while True:
-    print(State["messages"])
-    question = input("Ask question: ")
-    events = part_4_graph.stream(
-        {"messages": ("user", question)}, config, stream_mode="values"
+
+    primary_runnable = primary_assistant_prompt | resilient(
+        [primary_model, *primary_fallbacks],
+        lambda m: cached(m.bind_tools([Lead_assistant]), enabled=config.primary_llm_cache),
+        **hedge_options,
+    )
+    builder = create_graph_builder(
+        primary_runnable,
+        create_lead_assistant_runnable(precise_model, precise_fallbacks, **hedge_options),
+        MessageWindow(config.primary_token_budget, precise_model),
+        MessageWindow(config.lead_token_budget, precise_model),
+        PreRouter(config.pre_router_min_confidence) if config.pre_router else None,
+        VerificationPrefetcher() if config.verification_prefetch else None,
+        LeadWriteQueue(config.lead_queue_db) if config.lead_write_behind else None,
     )
-    for event in events:
-        _print_event(event, _printed)
-        # print(event)
+
+    memory = BoundedSqliteSaver(
+        path=config.checkpoint_db,
+        max_checkpoints_per_thread=config.checkpoint_max_per_thread,
+        idle_ttl=config.checkpoint_idle_ttl,
+        flush_interval=config.checkpoint_flush_interval,
+        codec=MessageDeltaCodec(compress=config.checkpoint_zstd) if config.checkpoint_delta else None,
+    )
+    graph = builder.compile(checkpointer=memory) #,interrupt_before=["lead_assistant_sensitive_tools"]
+    logger.info("Compiled the lead graph with {}", config)
+    return graph
+
+
+def __getattr__(name: str):
+    # `from main import part_4_graph` keeps working, it now builds the graph on first access
+    if name == "part_4_graph":
+        return build_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat with the lead graph from the terminal.")
+    parser.add_argument("--diagram", nargs="?", const="part_4_graph.png", metavar="PATH",
+                        help="Render the graph to a PNG (part_4_graph.png by default) and exit.")
+    args = parser.parse_args()
+
+    part_4_graph = build_graph()
+    if args.diagram:
+        part_4_graph.get_graph(xray=True).draw_mermaid_png(output_file_path=args.diagram)
+        raise SystemExit(0)
+
+    # Times every node and LLM call when INSTRUMENTATION is set
+    config = instrumented_config({
+        "configurable": {
+            "thread_id": 1,
+        }
+    })
+
+    _printed = set()
+    while True:
+        question = input("Ask question: ")
+        events = part_4_graph.stream(
+            {"messages": ("user", question)}, config, stream_mode="values"
+        )
+        for event in events:
+            _print_event(event, _printed)
+            # print(event)
@@ -0,0 +1,274 @@
+"""
+Concurrent multi-session server for `part_4_graph`.
+
+Clients connect over TCP and exchange newline delimited JSON. Every connection is one
+session mapped to its own `thread_id` in the checkpointer:
+
+    -> {"session_id": "optional, as issued before", "message": "I want to create a lead"}
+    <- {"type": "session", "session_id": "..."}
+    <- {"type": "token", "node": "primary_assistant", "run_id": "...", "content": "Sure"}
+    <- {"type": "tool_calls", "node": "primary_assistant", "run_id": "...", "tool_calls": [...]}
+    <- {"type": "message", "role": "ai", "content": "...", "dialog_state": "lead_agent"}
+    <- {"type": "done", "elapsed_ms": 1234.5}
+
+Session ids are issued by the server and signed with SESSION_SECRET, a client resumes a conversation
+by sending back the id it was given. Ids the server did not issue are rejected with an "invalid_session"
+error, so a client can not read another customer's conversation by guessing its thread. Without
+SESSION_SECRET a random secret is drawn at start up, and sessions do not survive a restart.
+
+Reply tokens are sent as the assistants generate them, tool calls only once complete, and
+every message once it is part of the graph state. Tokens with a new `run_id` for the same node
+restart the reply, e.g. after a retried LLM call. With STREAM_TOKENS=0 only whole messages are sent. A session runs at most
+`SESSION_CONCURRENCY` turns at a time and the whole process at most `MAX_CONCURRENT_TURNS`;
+turns beyond `MAX_PENDING_TURNS` waiting for a slot are rejected with a "busy" error instead
+of queueing without bound. Run one worker per core with `--workers`, they share the port
+through SO_REUSEPORT.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import secrets
+import time
+import uuid
+from typing import Optional
+from loguru import logger
+from main import REPLY_TAG, build_graph
+from support_files.instrumentation import instrumentation, instrumented_config
+from support_files.llm_hedging import HEDGE_TAG
+
+HOST = os.getenv("BOT_HOST", "0.0.0.0")
+PORT = int(os.getenv("BOT_PORT", 8765))
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", 64))
+MAX_PENDING_TURNS = int(os.getenv("MAX_PENDING_TURNS", 256))
+SESSION_CONCURRENCY = int(os.getenv("SESSION_CONCURRENCY", 1))
+STREAM_TOKENS = os.getenv("STREAM_TOKENS", "1").lower() in ("1", "true", "yes")
+# Key signing the session ids, shared by every worker and restart that must accept them
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+# Longest request line accepted from a client, in bytes
+MAX_LINE_BYTES = 64 * 1024
+
+
+class SessionServer:
+    """Serve many conversations of one compiled graph from a single event loop."""
+
+    def __init__(self, graph, max_concurrent_turns: int = MAX_CONCURRENT_TURNS,
+                 max_pending_turns: int = MAX_PENDING_TURNS, session_concurrency: int = SESSION_CONCURRENCY,
+                 stream_tokens: bool = STREAM_TOKENS, session_secret: Optional[bytes] = None):
+        """
+        Parameters:
+        - graph: The compiled LangGraph graph, with a checkpointer.
+        - max_concurrent_turns: Turns running at the same time across all sessions.
+        - max_pending_turns: Turns allowed to wait for a free slot before new ones are rejected.
+        - session_concurrency: Turns running at the same time within one session.
+        - stream_tokens: Send the assistants' reply tokens as they are generated.
+        - session_secret: Key signing the issued session ids, a random one when not given.
+        """
+        self.graph = graph
+        self.max_pending_turns = max_pending_turns
+        self.session_concurrency = session_concurrency
+        self.stream_tokens = stream_tokens
+        self._session_secret = session_secret or secrets.token_bytes(32)
+        self._turn_slots = asyncio.Semaphore(max_concurrent_turns)
+        self._session_slots = {}
+        self._pending = 0
+        self.active_sessions = 0
+        self.turns_served = 0
+        self.turns_rejected = 0
+
+    def _sign(self, thread_id: str) -> str:
+        return hmac.new(self._session_secret, thread_id.encode(), hashlib.sha256).hexdigest()
+
+    def issue_session(self) -> tuple:
+        """
+        Returns:
+        - `(thread_id, session_id)` of a new conversation, the session id to give to the client.
+        """
+        thread_id = uuid.uuid4().hex
+        return thread_id, f"{thread_id}.{self._sign(thread_id)}"
+
+    def resume_session(self, session_id: str) -> Optional[str]:
+        """The thread of a session id issued by this server, None for any other id."""
+        thread_id, _, signature = str(session_id).rpartition(".")
+        if not thread_id or not hmac.compare_digest(signature.encode(), self._sign(thread_id).encode()):
+            return None
+        return thread_id
+
+    def _session_slot(self, thread_id: str) -> asyncio.Semaphore:
+        slot = self._session_slots.get(thread_id)
+        if slot is None:
+            slot = self._session_slots[thread_id] = asyncio.Semaphore(self.session_concurrency)
+        return slot
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, payload: dict):
+        writer.write((json.dumps(payload, default=str) + "\n").encode())
+        # Waits while the client is not reading, so a slow client only slows down its own session
+        await writer.drain()
+
+    async def _send_new_message(self, writer: asyncio.StreamWriter, values: dict, printed: set):
+        """Send the latest message of a state snapshot unless the client already has it."""
+        message = values.get("messages")
+        if isinstance(message, list):
+            message = message[-1] if message else None
+        if message is None or message.id in printed:
+            return
+        printed.add(message.id)
+        dialog_state = values.get("dialog_state")
+        await self._send(writer, {
+            "type": "message",
+            "role": message.type,
+            "content": message.content,
+            "tool_calls": getattr(message, "tool_calls", None) or [],
+            "dialog_state": dialog_state[-1] if dialog_state else None,
+        })
+
+    async def _stream_events(self, inputs: dict, config: dict, writer: asyncio.StreamWriter, printed: set):
+        """Stream reply tokens and buffered tool calls of the assistants besides the state snapshots."""
+        tool_call_chunks = {}
+        # The graph itself streams full state snapshots instead of its default per node updates
+        async for event in self.graph.astream_events(inputs, config, version="v2", stream_mode="values"):
+            kind = event["event"]
+            if kind == "on_chain_stream" and not event.get("parent_ids"):
+                await self._send_new_message(writer, event["data"]["chunk"], printed)
+                continue
+            tags = event.get("tags", [])
+            # Hedged duplicates of a request would interleave their tokens with the original's
+            if REPLY_TAG not in tags or HEDGE_TAG in tags:
+                continue
+
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind == "on_chat_model_stream":
+                chunk = event["data"]["chunk"]
+                if chunk.tool_call_chunks:
+                    # Partial tool call arguments are not valid JSON, keep them until the call is complete
+                    buffered = tool_call_chunks.get(event["run_id"])
+                    tool_call_chunks[event["run_id"]] = chunk if buffered is None else buffered + chunk
+                if isinstance(chunk.content, str) and chunk.content:
+                    await self._send(writer, {"type": "token", "node": node, "run_id": event["run_id"],
+                                              "content": chunk.content})
+            elif kind == "on_chat_model_end":
+                buffered = tool_call_chunks.pop(event["run_id"], None)
+                if buffered is not None and buffered.tool_calls:
+                    await self._send(writer, {"type": "tool_calls", "node": node, "run_id": event["run_id"],
+                                              "tool_calls": buffered.tool_calls})
+
+    async def run_turn(self, thread_id: str, question: str, writer: asyncio.StreamWriter, printed: set):
+        """Stream one user turn through the graph and send its tokens and new messages to the client."""
+        if self._pending >= self.max_pending_turns:
+            self.turns_rejected += 1
+            await self._send(writer, {"type": "error", "error": "busy", "detail": "Server is at capacity, retry later."})
+            return
+
+        self._pending += 1
+        waiting = True
+        try:
+            async with self._session_slot(thread_id), self._turn_slots:
+                self._pending -= 1
+                waiting = False
+                started = time.perf_counter()
+                config = instrumented_config({"configurable": {"thread_id": thread_id}})
+                inputs = {"messages": ("user", question)}
+                if self.stream_tokens:
+                    await self._stream_events(inputs, config, writer, printed)
+                else:
+                    async for values in self.graph.astream(inputs, config, stream_mode="values"):
+                        await self._send_new_message(writer, values, printed)
+                self.turns_served += 1
+                await self._send(writer, {"type": "done", "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+        finally:
+            if waiting:
+                self._pending -= 1
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one connection, i.e. one session, until the client disconnects."""
+        thread_id = None
+        printed = set()
+        self.active_sessions += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await self._send(writer, {"type": "error", "error": "line_too_long"})
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    question = request["message"]
+                except (ValueError, KeyError, TypeError):
+                    await self._send(writer, {"type": "error", "error": "bad_request",
+                                              "detail": 'Expected a JSON object with a "message" field.'})
+                    continue
+
+                if thread_id is None:
+                    session_id = request.get("session_id")
+                    if session_id:
+                        thread_id = self.resume_session(session_id)
+                        if thread_id is None:
+                            await self._send(writer, {"type": "error", "error": "invalid_session",
+                                                      "detail": "Unknown session id, leave it out to start a new session."})
+                            continue
+                    else:
+                        thread_id, session_id = self.issue_session()
+                    await self._send(writer, {"type": "session", "session_id": session_id})
+                try:
+                    await self.run_turn(thread_id, question, writer, printed)
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    logger.exception(f"Turn failed for session {thread_id}")
+                    await self._send(writer, {"type": "error", "error": "turn_failed", "detail": str(e)})
+        except ConnectionError:
+            logger.info(f"Session {thread_id} disconnected.")
+        finally:
+            self.active_sessions -= 1
+            slot = self._session_slots.get(thread_id)
+            if slot is not None and not slot.locked():
+                self._session_slots.pop(thread_id, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str = HOST, port: int = PORT, reuse_port: bool = False):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE_BYTES, reuse_port=reuse_port)
+        logger.info(f"Serving part_4_graph on {host}:{port} (pid {os.getpid()}).")
+        async with server:
+            await server.serve_forever()
+
+
+def _run_worker(host: str, port: int, reuse_port: bool, session_secret: bytes, index: int = 0):
+    metrics_port = os.getenv("METRICS_PORT")
+    if instrumentation.enabled and metrics_port:
+        # Workers share the port range, worker n serves METRICS_PORT + n
+        instrumentation.serve_prometheus(int(metrics_port) + index, host="0.0.0.0")
+    # Built inside the worker, so every process opens its own checkpointer and connections
+    server = SessionServer(build_graph(), session_secret=session_secret)
+    asyncio.run(server.serve(host, port, reuse_port=reuse_port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve part_4_graph to many concurrent sessions.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes sharing the port.")
+    args = parser.parse_args()
+    # Drawn once, so every worker accepts the session ids the others issued
+    session_secret = SESSION_SECRET.encode() if SESSION_SECRET else secrets.token_bytes(32)
+
+    if args.workers <= 1:
+        _run_worker(args.host, args.port, False, session_secret)
+    else:
+        # Workers share the SQLite checkpoints but buffer their own recent writes, so a session must stay on its connection
+        workers = [multiprocessing.Process(target=_run_worker, args=(args.host, args.port, True, session_secret, index))
+                   for index in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
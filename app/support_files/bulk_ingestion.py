@@ -0,0 +1,165 @@
+import argparse
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+from loguru import logger
+from support_files.cypher_queries import query_registry
+from support_files.graph_connection import Neo4jConnectionManager, test_graph_pool
+from support_files.identifier_cache import identifier_cache
+from support_files.tool_execution import lead_creation_error, lead_creation_params, lead_name_index
+
+# Column names used by dealer exports for the customer_lead_creation parameters
+FIELD_ALIASES = {
+    "name": ("name", "customer_name", "full_name"),
+    "phone": ("phone", "phone_number", "mobile"),
+    "civil_id": ("civil_id", "civilID", "civil id"),
+    "email": ("email", "email_address"),
+    "model": ("model", "car_model"),
+    "variant": ("variant", "car_variant"),
+}
+
+
+def read_records(path: str) -> Iterator[tuple]:
+    """
+    Stream `(line_number, record)` pairs from a CSV or JSONL file without loading it in memory.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, e
+        else:
+            # Line 1 is the header
+            for line_number, row in enumerate(csv.DictReader(file), start=2):
+                yield line_number, row
+
+
+def _lead_fields(record: dict) -> dict:
+    fields = {}
+    for field, aliases in FIELD_ALIASES.items():
+        value = next((record[alias] for alias in aliases if record.get(alias) not in (None, "")), None)
+        fields[field] = str(value) if value is not None else None
+    return fields
+
+
+def prepare_record(item: tuple) -> tuple:
+    """
+    Validate one record like customer_lead_creation does.
+
+    Returns:
+    - `(line_number, params, None)` for a valid record, `(line_number, None, error)` otherwise.
+    """
+    line_number, record = item
+    if isinstance(record, Exception):
+        return line_number, None, f"Error: Malformed record: {record}."
+    if not isinstance(record, dict):
+        return line_number, None, "Error: Record is not an object."
+    fields = _lead_fields(record)
+    error = lead_creation_error(**fields)
+    if error:
+        return line_number, None, error
+    return line_number, lead_creation_params(**fields), None
+
+
+class IngestionReport:
+    """Progress, throughput and per-record errors of one bulk ingestion."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.written = 0
+        self.errors = []
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """Records processed per second."""
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "read": self.read,
+            "written": self.written,
+            "failed": len(self.errors),
+            "elapsed_s": round(self.elapsed, 2),
+            "records_per_s": round(self.throughput, 1),
+        }
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def ingest_leads(records: Iterable[tuple], graph: Neo4jConnectionManager = test_graph_pool,
+                 batch_size: int = 500, workers: int = 8, report: Optional[IngestionReport] = None) -> IngestionReport:
+    """
+    Validate and write leads in `UNWIND` batches, one explicit transaction per batch.
+
+    Parameters:
+    - records: `(line_number, record)` pairs, e.g. from `read_records`.
+    - graph: Connection the leads are written to, the same test database as customer_lead_creation by default.
+    - batch_size: Records per transaction.
+    - workers: Threads validating records in parallel.
+    - report: Report to update (optional).
+
+    Returns:
+    - The ingestion report.
+    """
+    report = report or IngestionReport()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in _batches(records, batch_size):
+            rows, lines = [], []
+            for line_number, params, error in executor.map(prepare_record, batch):
+                if error:
+                    report.errors.append((line_number, error))
+                else:
+                    rows.append(params)
+                    lines.append(line_number)
+            report.read += len(batch)
+
+            if rows:
+                try:
+                    result = query_registry.execute_write(graph, "bulk_lead_creation", {"rows": rows})
+                except Exception as e:
+                    logger.error(f"Failed to write a batch of {len(rows)} leads: {e}")
+                    report.errors.extend((line_number, f"Error: Failed to create lead due to: {e}.") for line_number in lines)
+                else:
+                    report.written += len(rows)
+                    for row in result:
+                        lead_name_index.upsert(row['lead_id'], row['lead_name'])
+                    for params in rows:
+                        identifier_cache.invalidate_lead(params)
+
+            logger.info(
+                f"Ingested {report.read} records ({report.written} written, {len(report.errors)} failed), "
+                f"{report.throughput:.0f} records/s."
+            )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import leads from a dealer CSV or JSONL export.")
+    parser.add_argument("path", help="CSV file with a header row, or a .jsonl file.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--errors", help="Write the rejected records to this JSONL file.")
+    args = parser.parse_args()
+
+    report = ingest_leads(read_records(args.path), batch_size=args.batch_size, workers=args.workers)
+    print(json.dumps(report.summary()))
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as file:
+            for line_number, error in report.errors:
+                file.write(json.dumps({"line": line_number, "error": error}) + "\n")
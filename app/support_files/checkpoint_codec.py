@@ -0,0 +1,167 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+import msgpack
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+# Type tag of the checkpoints written by the codec, rows of the plain serializer keep theirs
+DELTA_TYPE = "msgpack-delta"
+_DIGEST_SIZE = 16
+# Flag byte in front of every blob
+_RAW, _ZSTD = b"r", b"z"
+# msgpack extension code of the values encoded with the checkpoint serializer
+_TYPED = 1
+
+
+def _split_hashes(joined: bytes) -> list:
+    return [joined[i:i + _DIGEST_SIZE] for i in range(0, len(joined), _DIGEST_SIZE)]
+
+
+class MessageDeltaCodec:
+    """
+    Binary checkpoint encoding storing every message once per thread.
+
+    A checkpoint holds the whole `messages` list, so a long conversation would write the same
+    messages again at every step. The codec writes the rest of the checkpoint as usual and the
+    list as 16 byte content hashes. Message bodies are msgpack encoded and only those the thread
+    does not have yet are returned for storage. Values msgpack has no type for, e.g. datetimes or
+    pydantic models in `additional_kwargs`, are encoded with the checkpoint serializer so they come
+    back with their type. Bodies and checkpoints can be compressed with zstd when the `zstandard`
+    package is installed.
+    """
+
+    def __init__(self, compress: bool = False, level: int = 3, min_compress_size: int = 256,
+                 known_threads: int = 1024):
+        """
+        Parameters:
+        - compress: Compress with zstd, ignored when zstandard is not installed.
+        - level: zstd compression level.
+        - min_compress_size: Blobs smaller than this are stored as they are.
+        - known_threads: Threads whose stored message hashes are remembered to skip rewriting them.
+        """
+        self.compress = compress and zstandard is not None
+        self.min_compress_size = min_compress_size
+        self.known_threads = known_threads
+        self._compressor = zstandard.ZstdCompressor(level=level) if self.compress else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+        self._known = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pack(self, raw: bytes) -> bytes:
+        if self._compressor is not None and len(raw) >= self.min_compress_size:
+            return _ZSTD + self._compressor.compress(raw)
+        return _RAW + raw
+
+    def _unpack(self, blob: bytes) -> bytes:
+        if blob[:1] == _ZSTD:
+            if self._decompressor is None:
+                raise RuntimeError("This checkpoint is zstd compressed, install zstandard to read it.")
+            return self._decompressor.decompress(blob[1:])
+        return bytes(blob[1:])
+
+    def _known_hashes(self, key: tuple) -> set:
+        known = self._known.get(key)
+        if known is None:
+            known = self._known[key] = set()
+            while len(self._known) > self.known_threads:
+                self._known.popitem(last=False)
+        else:
+            self._known.move_to_end(key)
+        return known
+
+    def encode(self, thread_id: str, checkpoint_ns: str, checkpoint: dict,
+               dumps_typed: Callable[[Any], tuple]) -> tuple:
+        """
+        Parameters:
+        - thread_id, checkpoint_ns: Thread the checkpoint belongs to.
+        - checkpoint: The LangGraph checkpoint.
+        - dumps_typed: Serializer of everything but the messages, e.g. `saver.serde.dumps_typed`.
+
+        Returns:
+        - `(type, blob, new_messages)` where `new_messages` are the `(hash, body)` pairs to store.
+        """
+        channel_values = checkpoint.get("channel_values") or {}
+        messages = channel_values.get("messages")
+        # Anything but a list of messages is left to `dumps_typed`
+        split = isinstance(messages, list) and all(isinstance(m, BaseMessage) for m in messages)
+        if not split:
+            messages = []
+        else:
+            checkpoint = {**checkpoint, "channel_values": {k: v for k, v in channel_values.items() if k != "messages"}}
+
+        def typed(value: Any) -> msgpack.ExtType:
+            return msgpack.ExtType(_TYPED, msgpack.packb(list(dumps_typed(value)), use_bin_type=True))
+
+        hashes, new_messages = [], []
+        with self._lock:
+            known = self._known_hashes((thread_id, checkpoint_ns))
+            for message in messages:
+                body = msgpack.packb(message_to_dict(message), default=typed, use_bin_type=True)
+                digest = hashlib.blake2b(body, digest_size=_DIGEST_SIZE).digest()
+                hashes.append(digest)
+                if digest not in known:
+                    known.add(digest)
+                    new_messages.append((digest, self._pack(body)))
+
+        inner_type, inner = dumps_typed(checkpoint)
+        outer = msgpack.packb({"t": inner_type, "c": inner, "m": b"".join(hashes),
+                               "has_messages": split}, use_bin_type=True)
+        return DELTA_TYPE, self._pack(outer), new_messages
+
+    def decode(self, blob: bytes, loads_typed: Callable[[tuple], Any],
+               fetch_bodies: Callable[[list], dict]) -> dict:
+        """
+        Parameters:
+        - blob: What `encode` returned.
+        - loads_typed: Deserializer matching the `dumps_typed` used to encode.
+        - fetch_bodies: Returns `{hash: body}` for the given hashes.
+
+        Returns:
+        - The full checkpoint, messages included.
+        """
+        outer = msgpack.unpackb(self._unpack(blob), raw=False)
+        checkpoint = loads_typed((outer["t"], outer["c"]))
+        if not outer.get("has_messages"):
+            return checkpoint
+        hashes = _split_hashes(outer["m"])
+        bodies = fetch_bodies(list(set(hashes)))
+        missing = [digest.hex() for digest in hashes if digest not in bodies]
+        if missing:
+            raise KeyError(f"Checkpoint {checkpoint.get('id')} refers to {len(missing)} missing messages.")
+
+        def typed(code: int, data: bytes) -> Any:
+            if code != _TYPED:
+                return msgpack.ExtType(code, data)
+            return loads_typed(tuple(msgpack.unpackb(data, raw=False)))
+
+        messages = messages_from_dict([msgpack.unpackb(self._unpack(bodies[digest]), raw=False, ext_hook=typed)
+                                       for digest in hashes])
+        checkpoint["channel_values"] = {**checkpoint.get("channel_values", {}), "messages": messages}
+        return checkpoint
+
+    def message_hashes(self, blob: bytes) -> list:
+        """Hashes of the messages a blob returned by `encode` refers to."""
+        outer = msgpack.unpackb(self._unpack(blob), raw=False)
+        return _split_hashes(outer["m"]) if outer.get("has_messages") else []
+
+    def forget_hashes(self, thread_id: str, checkpoint_ns: str, hashes: list):
+        """Drop remembered hashes whose messages were deleted, so the next checkpoint stores them again."""
+        with self._lock:
+            known = self._known.get((thread_id, checkpoint_ns))
+            if known is not None:
+                known.difference_update(hashes)
+
+    def forget(self, thread_id: Optional[str] = None):
+        """Drop the remembered hashes of a thread, or of all threads, after their messages were deleted."""
+        with self._lock:
+            if thread_id is None:
+                self._known.clear()
+            else:
+                for key in [key for key in self._known if key[0] == thread_id]:
+                    del self._known[key]
@@ -0,0 +1,339 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+    get_checkpoint_id,
+)
+from loguru import logger
+from support_files.checkpoint_codec import DELTA_TYPE, MessageDeltaCodec
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    hash BLOB NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, hash)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_updated_at ON checkpoints (updated_at);
+"""
+
+
+class BoundedSqliteSaver(BaseCheckpointSaver):
+    """
+    Durable LangGraph checkpointer on SQLite in WAL mode with bounded retention.
+
+    `put` and `put_writes` only append to an in-memory buffer, which a background thread
+    commits in one transaction every `flush_interval` seconds, so graph steps never wait on
+    the disk. Any read flushes the buffer first, so a thread always resumes from its latest step.
+    A batch that fails to commit, e.g. while another worker holds the database longer than
+    `busy_timeout`, stays buffered and is retried with the next flush.
+
+    Retention keeps the last `max_checkpoints_per_thread` checkpoints of every thread and deletes
+    threads that have not been written to for `idle_ttl` seconds.
+
+    With a `codec` the messages are stored once per thread in their own table and checkpoints only
+    refer to them, so a step writes its new messages instead of the whole history. Checkpoints
+    written with and without a codec can be read either way.
+    """
+
+    def __init__(self, path: str = "checkpoints.sqlite", max_checkpoints_per_thread: Optional[int] = 10,
+                 idle_ttl: Optional[float] = 7 * 24 * 3600, flush_interval: float = 0.5,
+                 sweep_interval: float = 600, busy_timeout: float = 30.0, *, serde=None,
+                 codec: Optional[MessageDeltaCodec] = None):
+        """
+        Parameters:
+        - path: SQLite database file.
+        - max_checkpoints_per_thread: Checkpoints kept per thread, None keeps all of them.
+        - idle_ttl: Seconds after the last write before a thread is deleted, None never expires threads.
+        - flush_interval: Seconds between two batched commits.
+        - sweep_interval: Seconds between two idle thread sweeps.
+        - busy_timeout: Seconds a commit waits for other processes sharing the file to release it.
+        - serde: Serializer, defaults to LangGraph's.
+        - codec: Message delta encoding of the checkpoints (optional).
+        """
+        super().__init__(serde=serde)
+        self.codec = codec
+        # Reads delta encoded rows even when new checkpoints are written without a codec
+        self._reader = codec or MessageDeltaCodec()
+        self.path = path
+        self.max_checkpoints_per_thread = max_checkpoints_per_thread
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._pending_checkpoints = []
+        self._pending_writes = []
+        self._pending_messages = []
+        self._last_sweep = 0.0
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="checkpoint-flusher", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush checkpoints: {e}")
+
+    def flush(self):
+        """Commit every buffered checkpoint and write in one transaction and apply retention."""
+        with self._lock:
+            if not self._pending_checkpoints and not self._pending_writes:
+                self._maybe_sweep()
+                return
+            checkpoints, self._pending_checkpoints = self._pending_checkpoints, []
+            writes, self._pending_writes = self._pending_writes, []
+            messages, self._pending_messages = self._pending_messages, []
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?)", messages)
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", checkpoints
+                    )
+                    self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)", writes)
+                    if self.max_checkpoints_per_thread:
+                        for thread_id, checkpoint_ns in {(row[0], row[1]) for row in checkpoints}:
+                            self._trim_thread(thread_id, checkpoint_ns)
+            except sqlite3.Error:
+                # Rolled back, put the batch back ahead of what was buffered meanwhile
+                self._pending_checkpoints[:0] = checkpoints
+                self._pending_writes[:0] = writes
+                self._pending_messages[:0] = messages
+                raise
+            self._maybe_sweep()
+
+    def _trim_thread(self, thread_id: str, checkpoint_ns: str):
+        stale = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.max_checkpoints_per_thread),
+        ).fetchall()
+        if not stale:
+            return
+        keys = [(thread_id, checkpoint_ns, row[0]) for row in stale]
+        self._conn.executemany(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", keys
+        )
+        self._conn.executemany(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", keys
+        )
+        # Messages only the trimmed checkpoints referred to
+        referenced = set()
+        for (checkpoint,) in self._conn.execute(
+            "SELECT checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND type = ?",
+            (thread_id, checkpoint_ns, DELTA_TYPE),
+        ):
+            referenced.update(self._reader.message_hashes(checkpoint))
+        orphans = [row[0] for row in self._conn.execute(
+            "SELECT hash FROM messages WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, checkpoint_ns)
+        ) if row[0] not in referenced]
+        if orphans:
+            self._conn.executemany(
+                "DELETE FROM messages WHERE thread_id = ? AND checkpoint_ns = ? AND hash = ?",
+                [(thread_id, checkpoint_ns, digest) for digest in orphans],
+            )
+            self._reader.forget_hashes(thread_id, checkpoint_ns, orphans)
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if not self.idle_ttl or now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        with self._conn:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?",
+                (now - self.idle_ttl,),
+            )]
+            for thread_id in expired:
+                self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+                self._conn.execute("DELETE FROM messages WHERE thread_id = ?", (thread_id,))
+                self._reader.forget(thread_id)
+        if expired:
+            logger.info(f"Expired {len(expired)} idle checkpoint threads.")
+
+    def close(self):
+        """Stop the background flusher and commit what is left."""
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        self._conn.close()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            self.flush()
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (str(thread_id), checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (str(thread_id), checkpoint_ns),
+                ).fetchone()
+            return self._to_tuple(row) if row else None
+
+    def _to_tuple(self, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata, _ = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint=self._load_checkpoint(thread_id, checkpoint_ns, type_, checkpoint),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                            "checkpoint_id": parent_id}} if parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def _load_checkpoint(self, thread_id: str, checkpoint_ns: str, type_: str, checkpoint: bytes) -> Checkpoint:
+        if type_ != DELTA_TYPE:
+            return self.serde.loads_typed((type_, checkpoint))
+
+        def fetch_bodies(hashes: list) -> dict:
+            bodies = {}
+            # Stay below SQLite's limit of bound parameters
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                bodies.update(self._conn.execute(
+                    f"SELECT hash, body FROM messages WHERE thread_id = ? AND checkpoint_ns = ? "
+                    f"AND hash IN ({', '.join('?' * len(chunk))})",
+                    (thread_id, checkpoint_ns, *chunk),
+                ).fetchall())
+            return bodies
+
+        return self._reader.decode(checkpoint, self.serde.loads_typed, fetch_bodies)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query, params = "SELECT * FROM checkpoints", []
+        conditions = []
+        if config is not None:
+            conditions.append("thread_id = ?")
+            params.append(str(config["configurable"]["thread_id"]))
+            if "checkpoint_ns" in config["configurable"]:
+                conditions.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+        if before is not None:
+            conditions.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            self.flush()
+            results = []
+            for row in self._conn.execute(query, params).fetchall():
+                checkpoint_tuple = self._to_tuple(row)
+                if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(checkpoint_tuple)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        new_messages = []
+        if self.codec is None:
+            type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+        with self._lock:
+            if self.codec is not None:
+                # Under the lock, a trim must not delete a message this checkpoint found already stored
+                type_, serialized_checkpoint, new_messages = self.codec.encode(
+                    thread_id, checkpoint_ns, checkpoint, self.serde.dumps_typed
+                )
+            self._pending_messages.extend(
+                (thread_id, checkpoint_ns, digest, body) for digest, body in new_messages
+            )
+            self._pending_checkpoints.append((
+                thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                type_, serialized_checkpoint, metadata_type, serialized_metadata, time.time(),
+            ))
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized_value = self.serde.dumps_typed(value)
+            # Errors and scheduled tasks have fixed slots, as in MemorySaver
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+                         type_, serialized_value))
+        with self._lock:
+            self._pending_writes.extend(rows)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in results:
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        # Only appends to the buffer, cheap enough to run on the event loop
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str) -> None:
+        self.put_writes(config, writes, task_id)
@@ -1,26 +1,201 @@
+import threading
+import time
+from support_files.instrumentation import instrumentation
 
-# Customer existence query
-customer_existance_query = """
-MATCH (c:Customer) 
-WHERE toLower(c.name) CONTAINS toLower($customer_name) 
-RETURN c.name as customer_name, c.phone_number as phone_number
+
+# Query for every Lead holding one of the identifiers, the ones that are not looked up are passed as null.
+# Not limited, the exact match of a verification may be any of the leads sharing an identifier.
+identifier_lookup_query = """
+CALL {
+    MATCH (l:Lead)
+    WHERE $phone IS NOT NULL AND l.phone_number = $phone
+    RETURN 'phone' AS identifier, l
+    UNION ALL
+    MATCH (l:Lead)
+    WHERE $civil_id IS NOT NULL AND l.civil_id = $civil_id
+    RETURN 'civil_id' AS identifier, l
+    UNION ALL
+    MATCH (l:Lead)
+    WHERE $email IS NOT NULL AND l.email = $email
+    RETURN 'email' AS identifier, l
+}
+RETURN identifier, l.name AS lead_name, l.phone_number AS phone_number, l.civil_id AS civil_id, l.email AS email,
+       l.id AS lead_id
 """
 
-# Query for check whether phone number exist or not
-is_phone_number_exist_query = """
-MATCH (l:Lead) 
-WHERE l.phone_number = $phone_number 
-RETURN l.name as corresponding_customer
+# Query for creating a batch of leads, same MERGE semantics as customer_lead_creation
+bulk_lead_creation_query = """
+UNWIND $rows AS row
+MERGE (l:Customer {phone_number: row.mobile})
+ON CREATE SET l.createdAt = row.createdAt,
+              l.id = apoc.create.uuid()
+SET l.name = row.name,
+    l.email = row.email,
+    l.model = row.model,
+    l.variant = row.variant,
+    l.civil_id = row.civil_id
+
+WITH l, row
+MERGE (c:Lead {id: l.id})
+ON CREATE SET c.createdAt = row.createdAt
+SET c.name = row.name,
+    c.phone_number = row.mobile,
+    c.email = row.email,
+    c.model = row.model,
+    c.variant = row.variant,
+    c.level = "High"
+MERGE (l)-[:CUSTOMER_OF_LEAD]->(c)
+
+WITH c, row
+CALL {
+    WITH c, row
+    MATCH (m:Model {name: row.model})
+    MERGE (c)-[:PREFERENCE]->(m)
+}
+RETURN c.id AS lead_id, c.name AS lead_name
 """
 
-is_civil_id_exist_query = """
-MATCH (c:Customer) 
-WHERE c.civil_id = $civil_id 
-RETURN c.name as corresponding_customer
+
+# Query for loading every Lead name into the fuzzy name index
+all_lead_names_query = """
+MATCH (c:Lead)
+RETURN c.id AS lead_id, c.name AS customer_name
 """
 
-is_emaild_exist_query = """
-MATCH (c:Customer)
-WHERE c.email = $customer_email
-RETURN c.name as corresponding_customer
-"""
\ No newline at end of file
+# Query for creating a lead and linking it to its customer and preferred model
+lead_creation_query = """
+MERGE (l:Customer {phone_number: $mobile})
+ON CREATE SET l.createdAt = $createdAt,
+              l.id = apoc.create.uuid()
+SET l.name = $name,
+    l.email = $email,
+    l.model = $model,
+    l.variant = $variant,
+    l.civil_id = $civil_id
+
+WITH l
+MERGE (c:Lead {id: l.id})
+ON CREATE SET c.createdAt = $createdAt
+SET c.name = $name,
+    c.phone_number = $mobile,
+    c.email = $email,
+    c.model = $model,
+    c.variant = $variant,
+    c.level = "High"
+MERGE (l)-[:CUSTOMER_OF_LEAD]->(c)
+
+WITH c
+CALL {
+    WITH c
+    MATCH (m:Model {name: $model})
+    MERGE (c)-[:PREFERENCE]->(m)
+}
+RETURN c.id AS lead_id, c.name AS lead_name
+"""
+
+
+class CypherQuery:
+    """A registered query with its own latency and row count statistics."""
+
+    def __init__(self, name: str, text: str, target: str = "main"):
+        """
+        Parameters:
+        - name: Registry key.
+        - text: The Cypher text, never changed after registration so Neo4j caches a single plan.
+        - target: Database the query runs against, "main" or "test".
+        """
+        self.name = name
+        self.text = text
+        self.target = target
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, rows: int = 0, failed: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.rows += rows
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+        instrumentation.observe("cypher_duration_seconds", seconds, query=self.name, target=self.target)
+        instrumentation.increment("cypher_rows_total", rows, query=self.name, target=self.target)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "rows": self.rows,
+                "avg_ms": round(self.total_seconds / self.calls * 1000, 2) if self.calls else 0.0,
+                "max_ms": round(self.max_seconds * 1000, 2),
+            }
+
+
+class QueryRegistry:
+    """
+    The fixed set of Cypher queries the tools are allowed to run.
+
+    Every query text is static and parameterized, so each one is planned once by Neo4j, and
+    every execution goes through `run`, `arun` or `execute_write` to be timed.
+    """
+
+    def __init__(self):
+        self._queries = {}
+
+    def register(self, name: str, text: str, target: str = "main") -> CypherQuery:
+        if name in self._queries:
+            raise ValueError(f"Query '{name}' is already registered.")
+        query = self._queries[name] = CypherQuery(name, text, target)
+        return query
+
+    def __getitem__(self, name: str) -> CypherQuery:
+        return self._queries[name]
+
+    def __iter__(self):
+        return iter(self._queries.values())
+
+    def _timed(self, name: str, execute) -> list:
+        query = self._queries[name]
+        started = time.perf_counter()
+        try:
+            rows = execute(query.text)
+        except Exception:
+            query.record(time.perf_counter() - started, failed=True)
+            raise
+        query.record(time.perf_counter() - started, len(rows))
+        return rows
+
+    def run(self, graph, name: str, params: dict = None) -> list:
+        """Run the query `name` on a `Neo4jConnectionManager` (or anything with `query`)."""
+        return self._timed(name, lambda text: graph.query(text, params or {}))
+
+    def execute_write(self, graph, name: str, params: dict = None) -> list:
+        """Run the query `name` in an explicit write transaction."""
+        return self._timed(name, lambda text: graph.execute_write(text, params or {}))
+
+    async def arun(self, graph, name: str, params: dict = None) -> list:
+        """Run the query `name` on an `AsyncNeo4jConnectionManager`."""
+        query = self._queries[name]
+        started = time.perf_counter()
+        try:
+            rows = await graph.query(query.text, params or {})
+        except Exception:
+            query.record(time.perf_counter() - started, failed=True)
+            raise
+        query.record(time.perf_counter() - started, len(rows))
+        return rows
+
+    def stats(self) -> dict:
+        """Timing and row counts of every registered query."""
+        return {query.name: query.stats() for query in self}
+
+
+query_registry = QueryRegistry()
+query_registry.register("all_lead_names", all_lead_names_query)
+query_registry.register("identifier_lookup", identifier_lookup_query)
+query_registry.register("lead_creation", lead_creation_query, target="test")
+query_registry.register("bulk_lead_creation", bulk_lead_creation_query, target="test")
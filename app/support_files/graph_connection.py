@@ -1,5 +1,10 @@
 import os
+import asyncio
+import threading
+import weakref
 from langchain_community.graphs import Neo4jGraph
+from neo4j import AsyncGraphDatabase, AsyncDriver
+from neo4j.exceptions import ServiceUnavailable, SessionExpired
 from dotenv import load_dotenv
 from loguru import logger
 
@@ -45,4 +50,273 @@ def test_neo4j_connection() -> Neo4jGraph:
         logger.error("Environment variables for Neo4j connection in test_graph are not set correctly.")
     except Exception as e:
         logger.error(f"Unexpected error during Neo4j connection for testing establishment: {e}")
-    return None
\ No newline at end of file
+    return None
+
+class Neo4jConnectionManager:
+    """
+    Lazily opened, shared Neo4j connection for one target database.
+
+    The driver is only created on the first query, so importing the tools no longer waits on
+    Neo4j or its schema introspection. Every caller shares the same pooled driver, and a query
+    that fails because the connection dropped reconnects once and is retried.
+
+    Settings are read from `<prefix>_URI`, `<prefix>_USERNAME` and `<prefix>_PASSWORD`, with the
+    pool tuned through `<prefix>_MAX_POOL_SIZE` and `<prefix>_ACQUISITION_TIMEOUT` (seconds).
+    """
+
+    def __init__(self, env_prefix: str, max_pool_size: int = None, acquisition_timeout: float = None):
+        """
+        Parameters:
+        - env_prefix: Prefix of the environment variables holding the connection settings, e.g. "NEO4J".
+        - max_pool_size: Maximum number of pooled connections (defaults to `<prefix>_MAX_POOL_SIZE` or 50).
+        - acquisition_timeout: Seconds to wait for a free pooled connection (defaults to `<prefix>_ACQUISITION_TIMEOUT` or 30).
+        """
+        self.env_prefix = env_prefix
+        self.max_pool_size = max_pool_size or int(os.getenv(f"{env_prefix}_MAX_POOL_SIZE", 50))
+        self.acquisition_timeout = acquisition_timeout or float(os.getenv(f"{env_prefix}_ACQUISITION_TIMEOUT", 30))
+        self._lock = threading.Lock()
+        self._graph = None
+
+    def _connect(self) -> Neo4jGraph:
+        try:
+            graph = Neo4jGraph(
+                url=os.environ[f"{self.env_prefix}_URI"],
+                username=os.environ[f"{self.env_prefix}_USERNAME"],
+                password=os.environ[f"{self.env_prefix}_PASSWORD"],
+                refresh_schema=False,
+                driver_config={
+                    "max_connection_pool_size": self.max_pool_size,
+                    "connection_acquisition_timeout": self.acquisition_timeout,
+                },
+            )
+        except KeyError as e:
+            logger.error(f"Environment variables for {self.env_prefix} connection are not set correctly.")
+            raise ConnectionError(f"Missing environment variable {e} for the {self.env_prefix} connection.") from e
+        except Exception as e:
+            logger.error(f"Unexpected error during {self.env_prefix} connection establishment: {e}")
+            raise ConnectionError(f"Could not connect to {self.env_prefix}: {e}") from e
+        logger.info(f"Successfully established {self.env_prefix} connection pool (size {self.max_pool_size}).")
+        return graph
+
+    def get(self) -> Neo4jGraph:
+        """
+        Return the shared connection, opening it on first use.
+
+        Raises:
+            ConnectionError: If the connection can not be established. Nothing is cached, so the next call tries again.
+        """
+        graph = self._graph
+        if graph is not None:
+            return graph
+        with self._lock:
+            if self._graph is None:
+                self._graph = self._connect()
+            return self._graph
+
+    def close(self):
+        """Close the pooled driver. The next query opens a new one."""
+        with self._lock:
+            graph, self._graph = self._graph, None
+        if graph is not None:
+            try:
+                graph._driver.close()
+            except Exception as e:
+                logger.warning(f"Error while closing {self.env_prefix} connection: {e}")
+
+    def reconnect(self) -> Neo4jGraph:
+        """Drop the current driver and open a new one."""
+        self.close()
+        return self.get()
+
+    def health_check(self) -> bool:
+        """
+        Check that the database answers a trivial query, reconnecting once if it does not.
+
+        Returns:
+            bool: True if the database is reachable.
+        """
+        try:
+            self.query("RETURN 1 AS ok")
+            return True
+        except Exception as e:
+            logger.error(f"{self.env_prefix} health check failed: {e}")
+            return False
+
+    def execute_write(self, query: str, params: dict = None) -> list:
+        """
+        Run a Cypher write in an explicit transaction, retried by the driver on transient errors.
+
+        Parameters:
+        - query: The Cypher query.
+        - params: The query parameters (optional).
+
+        Returns:
+        - The result rows as dictionaries.
+        """
+        params = params or {}
+        graph = self.get()
+        with graph._driver.session(database=graph._database) as session:
+            return session.execute_write(lambda tx: tx.run(query, params).data())
+
+    def explain(self, query: str, params: dict = None) -> dict:
+        """
+        Return the execution plan Neo4j would use for `query`, without running it.
+
+        Returns:
+        - The plan tree as a dictionary with `operatorType`, `arguments` and `children`.
+        """
+        graph = self.get()
+        with graph._driver.session(database=graph._database) as session:
+            return session.run(f"EXPLAIN {query}", params or {}).consume().plan
+
+    def query(self, query: str, params: dict = None) -> list:
+        """
+        Run a Cypher query on the shared connection.
+
+        Parameters:
+        - query: The Cypher query.
+        - params: The query parameters (optional).
+
+        Returns:
+        - The result rows as dictionaries.
+        """
+        params = params or {}
+        try:
+            return self.get().query(query, params)
+        except (ServiceUnavailable, SessionExpired) as e:
+            logger.warning(f"{self.env_prefix} connection lost ({e}), reconnecting.")
+            return self.reconnect().query(query, params)
+
+
+class AsyncNeo4jConnectionManager:
+    """
+    Async counterpart of `Neo4jConnectionManager` backed by the async Neo4j driver.
+
+    Queries are awaited on the event loop instead of blocking a thread, so many conversations
+    can share one loop. It reads the same environment variables and pool settings.
+
+    An async driver and its lock only work on the event loop they were created on, so each running
+    loop lazily gets its own. The module level pools can be used by one `asyncio.run` after another.
+    """
+
+    def __init__(self, env_prefix: str, max_pool_size: int = None, acquisition_timeout: float = None):
+        """
+        Parameters:
+        - env_prefix: Prefix of the environment variables holding the connection settings, e.g. "NEO4J".
+        - max_pool_size: Maximum number of pooled connections (defaults to `<prefix>_MAX_POOL_SIZE` or 50).
+        - acquisition_timeout: Seconds to wait for a free pooled connection (defaults to `<prefix>_ACQUISITION_TIMEOUT` or 30).
+        """
+        self.env_prefix = env_prefix
+        self.max_pool_size = max_pool_size or int(os.getenv(f"{env_prefix}_MAX_POOL_SIZE", 50))
+        self.acquisition_timeout = acquisition_timeout or float(os.getenv(f"{env_prefix}_ACQUISITION_TIMEOUT", 30))
+        self.database = os.getenv(f"{env_prefix}_DATABASE", "neo4j")
+        # Event loop -> its _LoopDriver, forgotten with the loop
+        self._loops = weakref.WeakKeyDictionary()
+        self._loops_lock = threading.Lock()
+
+    def _loop_driver(self) -> "_LoopDriver":
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            state = self._loops.get(loop)
+            if state is None:
+                state = self._loops[loop] = _LoopDriver()
+            return state
+
+    async def _connect(self) -> AsyncDriver:
+        try:
+            driver = AsyncGraphDatabase.driver(
+                os.environ[f"{self.env_prefix}_URI"],
+                auth=(os.environ[f"{self.env_prefix}_USERNAME"], os.environ[f"{self.env_prefix}_PASSWORD"]),
+                max_connection_pool_size=self.max_pool_size,
+                connection_acquisition_timeout=self.acquisition_timeout,
+            )
+            await driver.verify_connectivity()
+        except KeyError as e:
+            logger.error(f"Environment variables for {self.env_prefix} connection are not set correctly.")
+            raise ConnectionError(f"Missing environment variable {e} for the {self.env_prefix} connection.") from e
+        except Exception as e:
+            logger.error(f"Unexpected error during async {self.env_prefix} connection establishment: {e}")
+            raise ConnectionError(f"Could not connect to {self.env_prefix}: {e}") from e
+        logger.info(f"Successfully established async {self.env_prefix} connection pool (size {self.max_pool_size}).")
+        return driver
+
+    async def get(self) -> AsyncDriver:
+        """
+        Return the shared async driver, opening it on first use.
+
+        Raises:
+            ConnectionError: If the connection can not be established. Nothing is cached, so the next call tries again.
+        """
+        state = self._loop_driver()
+        if state.driver is not None:
+            return state.driver
+        async with state.lock:
+            if state.driver is None:
+                state.driver = await self._connect()
+            return state.driver
+
+    async def close(self):
+        """Close the pooled driver of the running event loop. The next query opens a new one."""
+        state = self._loop_driver()
+        driver, state.driver = state.driver, None
+        if driver is not None:
+            try:
+                await driver.close()
+            except Exception as e:
+                logger.warning(f"Error while closing async {self.env_prefix} connection: {e}")
+
+    async def reconnect(self) -> AsyncDriver:
+        """Drop the current driver and open a new one."""
+        await self.close()
+        return await self.get()
+
+    async def health_check(self) -> bool:
+        """
+        Check that the database answers a trivial query, reconnecting once if it does not.
+
+        Returns:
+            bool: True if the database is reachable.
+        """
+        try:
+            await self.query("RETURN 1 AS ok")
+            return True
+        except Exception as e:
+            logger.error(f"Async {self.env_prefix} health check failed: {e}")
+            return False
+
+    async def _execute(self, driver: AsyncDriver, query: str, params: dict) -> list:
+        records, _, _ = await driver.execute_query(query, params, database_=self.database)
+        return [record.data() for record in records]
+
+    async def query(self, query: str, params: dict = None) -> list:
+        """
+        Run a Cypher query on the shared async driver.
+
+        Parameters:
+        - query: The Cypher query.
+        - params: The query parameters (optional).
+
+        Returns:
+        - The result rows as dictionaries, like `Neo4jGraph.query`.
+        """
+        params = params or {}
+        try:
+            return await self._execute(await self.get(), query, params)
+        except (ServiceUnavailable, SessionExpired) as e:
+            logger.warning(f"Async {self.env_prefix} connection lost ({e}), reconnecting.")
+            return await self._execute(await self.reconnect(), query, params)
+
+
+class _LoopDriver:
+    """The async driver of one event loop and the lock opening it."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.driver = None
+
+
+# Shared, lazily opened connections for the main and the test database
+graph_pool = Neo4jConnectionManager("NEO4J")
+test_graph_pool = Neo4jConnectionManager("TEST_NEO4J")
+async_graph_pool = AsyncNeo4jConnectionManager("NEO4J")
+async_test_graph_pool = AsyncNeo4jConnectionManager("TEST_NEO4J")
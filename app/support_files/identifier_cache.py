@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+from support_files.instrumentation import instrumentation
+
+# Identifier kinds in the order verification reports collisions, with the label used in the messages
+IDENTIFIER_KINDS = (("phone", "phone number"), ("civil_id", "civil ID"), ("email", "email"))
+# Lead columns holding each kind, as returned by the identifier_lookup query
+IDENTIFIER_COLUMNS = {"phone": "phone_number", "civil_id": "civil_id", "email": "email"}
+
+
+def normalize_identifier(value: Optional[str]) -> Optional[str]:
+    """
+    The value looked up and cached, None when there is nothing to look up.
+
+    Kept as given, lead creation stores the identifiers untrimmed and the lookup matches them exactly.
+    """
+    if value is None or not value.strip():
+        return None
+    return value
+
+
+class IdentifierCache:
+    """
+    Process wide LRU cache of the Leads holding a phone number, civil ID or email.
+
+    Found leads are kept for `ttl` seconds and misses, cached as an empty tuple, for
+    `negative_ttl` seconds, so a customer verified a moment ago does not cost another round trip.
+    Lead creations in this process invalidate the identifiers they write at once, writes by other
+    processes are only seen once the entries expire, which is why misses expire sooner.
+
+    A lookup racing with a lead creation could still cache what it read before the write. Every
+    invalidation stamps the identifiers it drops with a new generation, and `put` discards the
+    result of a lookup started at an older `generation()` for any of them.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 300.0, negative_ttl: float = 30.0):
+        """
+        Parameters:
+        - max_entries: Identifiers kept at most, the least recently used go first, 0 disables the cache.
+        - ttl: Seconds a found lead stays cached.
+        - negative_ttl: Seconds a miss stays cached.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counts = Counter()
+        self._generation = 0
+        # Generation of the last invalidation of each identifier, oldest first
+        self._invalidated = OrderedDict()
+        # Newest generation forgotten from `_invalidated`, lookups started before it are not cached
+        self._forgotten = 0
+
+    def _count(self, kind: str, event: str):
+        self._counts[kind, event] += 1
+        instrumentation.increment(f"identifier_cache_{event}_total", kind=kind)
+
+    def get(self, kind: str, value: str) -> Optional[tuple]:
+        """The cached leads of the identifier, an empty tuple for a known miss, None when not cached."""
+        key = (kind, value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._count(kind, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self._count(kind, "hits" if entry[1] else "negative_hits")
+            return entry[1]
+
+    def generation(self) -> int:
+        """Current generation, taken before a lookup and given to `put` with its result."""
+        with self._lock:
+            return self._generation
+
+    def _stale(self, key: tuple, leads: tuple, generation: int) -> bool:
+        if generation < self._forgotten:
+            return True
+        keys = [key, *(("phone", lead.get("phone_number")) for lead in leads)]
+        return any(self._invalidated.get(invalidated, 0) > generation for invalidated in keys)
+
+    def put(self, kind: str, value: str, leads: list, generation: Optional[int] = None):
+        """
+        Cache the leads looked up for an identifier.
+
+        Parameters:
+        - generation: `generation()` before the lookup, the result is dropped when the identifier, or
+          the phone number of a lead found, was invalidated since. None caches the result as is.
+        """
+        if self.max_entries <= 0:
+            return
+        leads = tuple(leads)
+        expires_at = time.monotonic() + (self.ttl if leads else self.negative_ttl)
+        with self._lock:
+            if generation is not None and self._stale((kind, value), leads, generation):
+                self._count(kind, "stale_puts")
+                return
+            self._entries[(kind, value)] = (expires_at, leads)
+            self._entries.move_to_end((kind, value))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_lead(self, params: dict):
+        """
+        Forget the identifiers a lead creation wrote, `params` as built by `lead_creation_params`.
+
+        The write MERGEs on the phone number and may change the email of an existing lead, so
+        every entry holding a lead with that phone number is dropped as well.
+        """
+        phone = normalize_identifier(params.get("mobile"))
+        written = {("phone", phone), ("civil_id", normalize_identifier(params.get("civil_id"))),
+                   ("email", normalize_identifier(params.get("email")))}
+        with self._lock:
+            stale = [key for key, (_, leads) in self._entries.items()
+                     if key in written or any(lead.get("phone_number") == phone for lead in leads)]
+            for key in stale:
+                del self._entries[key]
+            self._generation += 1
+            for key in written:
+                if key[1] is None:
+                    continue
+                self._invalidated[key] = self._generation
+                self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.max_entries, 1):
+                _, self._forgotten = self._invalidated.popitem(last=False)
+        if stale:
+            instrumentation.increment("identifier_cache_invalidations_total", len(stale))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            # Lookups in flight read the database before the clear
+            self._generation += 1
+            self._invalidated.clear()
+            self._forgotten = self._generation
+
+    def stats(self) -> dict:
+        """Hits, negative hits, misses and hit ratio per identifier kind."""
+        with self._lock:
+            counts = dict(self._counts)
+            size = len(self._entries)
+        stats = {"size": size}
+        for kind, _ in IDENTIFIER_KINDS:
+            hits, negative_hits, misses = (counts.get((kind, event), 0) for event in ("hits", "negative_hits", "misses"))
+            lookups = hits + negative_hits + misses
+            stats[kind] = {
+                "hits": hits,
+                "negative_hits": negative_hits,
+                "misses": misses,
+                "hit_ratio": round((hits + negative_hits) / lookups, 3) if lookups else 0.0,
+            }
+        return stats
+
+
+identifier_cache = IdentifierCache(
+    max_entries=int(os.getenv("IDENTIFIER_CACHE_SIZE", 10_000)),
+    ttl=float(os.getenv("IDENTIFIER_CACHE_TTL", 300)),
+    negative_ttl=float(os.getenv("IDENTIFIER_CACHE_NEGATIVE_TTL", 30)),
+)
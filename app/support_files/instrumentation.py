@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from loguru import logger
+
+# Latency buckets in seconds, from an in-memory lookup to a slow LLM completion
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Prometheus style cumulative histogram."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Instrumentation:
+    """
+    Spans and histograms for graph nodes, LLM calls, Cypher queries and fuzzy matching.
+
+    When disabled `span` returns a shared no-op context manager and `observe` returns at once,
+    and no callback handler is attached to the graph, so the hot path pays a single attribute check.
+    """
+
+    def __init__(self, enabled: bool = False, jsonl_path: Optional[str] = None):
+        """
+        Parameters:
+        - enabled: Record anything at all.
+        - jsonl_path: Append every span to this JSON lines file (optional).
+        """
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._jsonl = None
+
+    def observe(self, metric: str, seconds: float, **labels):
+        """Record one span of `seconds` under `metric` with its labels."""
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+            if self.jsonl_path:
+                if self._jsonl is None:
+                    self._jsonl = open(self.jsonl_path, "a", encoding="utf-8")
+                self._jsonl.write(json.dumps({"ts": time.time(), "metric": metric, "seconds": seconds, **labels},
+                                             default=str) + "\n")
+
+    def increment(self, metric: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def _span(self, metric: str, labels: dict):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, time.perf_counter() - started, **labels)
+
+    def span(self, metric: str, **labels):
+        """Time the `with` block, e.g. `with instrumentation.span("fuzzy_match_duration_seconds"):`."""
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(metric, labels)
+
+    def flush(self):
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.flush()
+
+    def prometheus_text(self) -> str:
+        """Every histogram and counter in the Prometheus text exposition format."""
+        def render(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for (metric, labels), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{metric}_bucket{render(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{metric}_sum{render(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{render(labels)} {histogram.count}")
+            for (metric, labels), value in sorted(self._counters.items()):
+                lines.append(f"{metric}{render(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Expose `prometheus_text` on http://host:port/metrics from a daemon thread."""
+        instrumentation = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = instrumentation.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
+
+
+_NO_SPAN = nullcontext()
+
+
+class InstrumentationCallbackHandler(BaseCallbackHandler):
+    """Times every graph node and LLM call of a run, including the token counts reported by the model."""
+
+    run_inline = True
+
+    def __init__(self, instrumentation: Instrumentation):
+        self.instrumentation = instrumentation
+        self._started = {}
+
+    def on_chain_start(self, serialized: dict, inputs: Any, *, run_id: UUID, metadata: Optional[dict] = None,
+                       **kwargs: Any):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node itself, not the runnables nested inside it
+        if node is not None and kwargs.get("name") == node:
+            self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.instrumentation.observe("node_duration_seconds", time.perf_counter() - started[1], node=started[0])
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.instrumentation.observe("node_duration_seconds", time.perf_counter() - started[1],
+                                         node=started[0], error=type(error).__name__)
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID,
+                            metadata: Optional[dict] = None, **kwargs: Any):
+        model = (kwargs.get("invocation_params") or {}).get("model") or (metadata or {}).get("ls_model_name", "unknown")
+        self._started[run_id] = (model, time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        model, began = started
+        self.instrumentation.observe("llm_duration_seconds", time.perf_counter() - began, model=model)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.instrumentation.increment("llm_prompt_tokens_total", usage.get("prompt_tokens", 0), model=model)
+        self.instrumentation.increment("llm_completion_tokens_total", usage.get("completion_tokens", 0), model=model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.instrumentation.observe("llm_duration_seconds", time.perf_counter() - started[1],
+                                         model=started[0], error=type(error).__name__)
+
+
+instrumentation = Instrumentation(
+    enabled=os.getenv("INSTRUMENTATION", "0").lower() in ("1", "true", "yes"),
+    jsonl_path=os.getenv("INSTRUMENTATION_JSONL"),
+)
+
+
+_graph_handler = None
+
+
+def instrumented_config(config: dict) -> dict:
+    """
+    The run config of a graph call with the instrumentation callbacks added, `config` itself when
+    instrumentation is disabled.
+
+    The callbacks go in the config of each call rather than in the graph, so the compiled graph
+    keeps `get_graph`, `get_state` and `update_state`.
+    """
+    global _graph_handler
+    if not instrumentation.enabled:
+        return config
+    if _graph_handler is None:
+        _graph_handler = InstrumentationCallbackHandler(instrumentation)
+    callbacks = config.get("callbacks")
+    if callbacks is None or isinstance(callbacks, list):
+        callbacks = [*(callbacks or []), _graph_handler]
+    else:
+        # A callback manager, e.g. when the graph runs inside another runnable
+        callbacks = callbacks.copy()
+        callbacks.add_handler(_graph_handler, inherit=True)
+    return {**config, "callbacks": callbacks}
@@ -0,0 +1,223 @@
+import heapq
+from typing import Iterable, Optional
+import numpy as np
+
+# Lower cased a-z get their own histogram bucket, every other character is hashed into the
+# remaining ones. Shared buckets can only over count common characters, so the bound stays valid.
+_BUCKETS = 32
+_LETTERS = 26
+_MAX_PREFIX_BOOST = 0.4
+# pyjarowinkler rounds to two decimals, a raw bound this far below the threshold can still round up to it.
+_ROUNDING_SLACK = 0.005 + 1e-9
+
+
+def _bucket(char: str) -> int:
+    code = ord(char) - 97
+    if 0 <= code < _LETTERS:
+        return code
+    return _LETTERS + ord(char) % (_BUCKETS - _LETTERS)
+
+
+def _histogram(lowered: str) -> np.ndarray:
+    histogram = np.zeros(_BUCKETS, dtype=np.int64)
+    for char in lowered:
+        histogram[_bucket(char)] += 1
+    return histogram
+
+
+def _matching_characters(first: str, second: list) -> list:
+    """Same walk as pyjarowinkler, consuming matched characters of `second` in place."""
+    common = []
+    length = len(second)
+    limit = min(len(first), length) // 2
+    for i, char in enumerate(first):
+        left, right = max(0, i - limit), min(i + limit + 1, length)
+        if char in second[left:right]:
+            common.append(char)
+            # pyjarowinkler blanks the first occurrence in the whole string, not in the window.
+            second[second.index(char)] = '*'
+    return common
+
+
+def jaro_winkler(first: str, second: str, scaling: float = 0.1) -> float:
+    """
+    Jaro-Winkler similarity, bit for bit identical to `pyjarowinkler.distance.get_jaro_distance`.
+
+    Parameters:
+    - first: The query name.
+    - second: The stored name.
+    - scaling: Scaling factor for the Winkler prefix adjustment.
+
+    Returns:
+    - The similarity rounded to two decimals.
+    """
+    if not first or not second:
+        raise ValueError("Cannot calculate the Jaro-Winkler similarity of an empty name.")
+
+    shorter, longer = first.lower(), second.lower()
+    if len(first) > len(second):
+        longer, shorter = shorter, longer
+
+    m1 = _matching_characters(shorter, list(longer))
+    m2 = _matching_characters(longer, list(shorter))
+    if not m1 or not m2:
+        jaro = 0.0
+    else:
+        transpositions = sum(1 for a, b in zip(m1, m2) if a != b) // 2
+        jaro = (float(len(m1)) / len(shorter) +
+                float(len(m2)) / len(longer) +
+                float(len(m1) - transpositions) / len(m1)) / 3.0
+
+    if first == second:
+        prefix = len(first)
+    else:
+        prefix = 0
+        for a, b in zip(first, second):
+            if a != b:
+                break
+            prefix += 1
+    cl = min(prefix, 4)
+    return round((jaro + (scaling * cl * (1.0 - jaro))) * 100.0) / 100.0
+
+
+class PackedNames:
+    """
+    Candidate names packed into contiguous arrays for batch scoring.
+
+    Names are lower cased once when they are added and their length and character histogram
+    are stored in NumPy arrays, so the upper bound of every candidate is computed in one pass.
+    Slots are stable: `discard` only marks a name as deleted.
+    """
+
+    def __init__(self, names: Iterable[str] = (), capacity: int = 1024):
+        self.names = []
+        self.lowered = []
+        self._lengths = np.zeros(capacity, dtype=np.int32)
+        self._histograms = np.zeros((capacity, _BUCKETS), dtype=np.uint8)
+        self._alive = np.zeros(capacity, dtype=bool)
+        # Names that can not be bounded: they contain pyjarowinkler's '*' marker or overflow a bucket.
+        self._unbounded = np.zeros(capacity, dtype=bool)
+        self._live = 0
+        for name in names:
+            self.append(name)
+
+    def _grow(self):
+        capacity = max(1024, len(self._lengths) * 2)
+        size = len(self._lengths)
+        for attribute in ("_lengths", "_alive", "_unbounded"):
+            array = getattr(self, attribute)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:size] = array
+            setattr(self, attribute, grown)
+        histograms = np.zeros((capacity, _BUCKETS), dtype=np.uint8)
+        histograms[:size] = self._histograms
+        self._histograms = histograms
+
+    def append(self, name: str) -> int:
+        """
+        Add a name and return its slot.
+        """
+        slot = len(self.names)
+        if slot == len(self._lengths):
+            self._grow()
+        lowered = name.lower()
+        histogram = _histogram(lowered)
+        self.names.append(name)
+        self.lowered.append(lowered)
+        self._lengths[slot] = len(lowered)
+        self._histograms[slot] = np.minimum(histogram, 255)
+        self._unbounded[slot] = "*" in lowered or bool(histogram.max(initial=0) > 255)
+        self._alive[slot] = True
+        self._live += 1
+        return slot
+
+    def discard(self, slot: int):
+        """Mark the name at `slot` as deleted."""
+        if self._alive[slot]:
+            self._alive[slot] = False
+            self._live -= 1
+
+    def is_alive(self, slot: int) -> bool:
+        return bool(self._alive[slot])
+
+    def __len__(self) -> int:
+        return self._live
+
+    def upper_bounds(self, query: str, slots: np.ndarray) -> np.ndarray:
+        """
+        Vectorized upper bound of the Jaro-Winkler similarity between `query` and the names at `slots`.
+
+        Matching characters are bounded by the histogram intersection and the prefix boost by 0.4.
+        """
+        lowered = query.lower()
+        if "*" in lowered:
+            return np.full(len(slots), np.inf)
+        common = np.minimum(self._histograms[slots], _histogram(lowered)).sum(axis=1)
+        lengths = self._lengths[slots]
+        shorter = np.minimum(lengths, len(lowered))
+        longer = np.maximum(lengths, len(lowered))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            jaro = np.where(common > 0, (common / shorter + common / longer + 1.0) / 3.0, 0.0)
+        bounds = jaro + _MAX_PREFIX_BOOST * (1.0 - jaro)
+        bounds[self._unbounded[slots]] = np.inf
+        return bounds
+
+
+def score_batch(query: str, packed: PackedNames, threshold: float = 0.0,
+                top_k: Optional[int] = None, slots: Optional[Iterable[int]] = None) -> list:
+    """
+    Score one query name against many packed candidate names.
+
+    Candidates whose vectorized upper bound can not reach `threshold` exit before the exact
+    character walk. With `top_k` the survivors are visited best bound first and the scan stops
+    as soon as no remaining bound can beat the current k-th score.
+
+    Parameters:
+    - query: The name provided by the user.
+    - packed: The candidate names.
+    - threshold: Minimum similarity a name must reach to be returned.
+    - top_k: Return only the k best names (optional).
+    - slots: Restrict scoring to these slots, e.g. a blocking shortlist (optional).
+
+    Returns:
+    - A list of `(slot, similarity)` tuples, in slot order, or best first when `top_k` is set.
+    """
+    if not query:
+        raise ValueError("Cannot calculate the Jaro-Winkler similarity of an empty name.")
+    if top_k is not None and top_k <= 0:
+        return []
+
+    if slots is None:
+        slots = np.flatnonzero(packed._alive[:len(packed.names)])
+    else:
+        slots = np.fromiter(slots, dtype=np.int64)
+        slots = slots[packed._alive[slots]]
+    slots.sort()
+
+    bounds = packed.upper_bounds(query, slots)
+    keep = bounds >= threshold - _ROUNDING_SLACK
+    slots, bounds = slots[keep], bounds[keep]
+
+    if top_k is None:
+        results = []
+        for slot in slots.tolist():
+            similarity = jaro_winkler(query, packed.names[slot])
+            if similarity >= threshold:
+                results.append((slot, similarity))
+        return results
+
+    # Min-heap of the k best (similarity, -slot) pairs, ties favour the earlier slot.
+    best = []
+    for position in np.argsort(-bounds, kind="stable").tolist():
+        if len(best) == top_k and bounds[position] + _ROUNDING_SLACK < best[0][0]:
+            break
+        slot = int(slots[position])
+        similarity = jaro_winkler(query, packed.names[slot])
+        if similarity < threshold:
+            continue
+        entry = (similarity, -slot)
+        if len(best) < top_k:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+    return [(-slot, similarity) for similarity, slot in sorted(best, reverse=True)]
@@ -3,8 +3,10 @@ from langchain.prompts import ChatPromptTemplate
 from datetime import datetime 
 from pytz import timezone
 from support_files.tool_execution import customer_existence_verification, customer_lead_creation
+from support_files.llm_cache import cached
+from support_files.llm_hedging import resilient
 from langchain_groq import ChatGroq
-from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables import Runnable, RunnableLambda
 from langgraph.prebuilt import ToolNode
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.messages import ToolMessage
@@ -71,7 +73,6 @@ def _print_event(event: dict, _printed: set, max_length=1500):
 
 # Define timezone
 ist_timezone = timezone("Asia/Kolkata")
-model = ChatGroq(model="llama3-70b-8192",temperature=0)
 
 
 lead_agent_prompt_template = ChatPromptTemplate.from_messages(
@@ -103,5 +104,24 @@ sensitive_tool = [customer_lead_creation]
 
 lead_agent_tool = safe_tool+sensitive_tool
 
-lead_assistant_runnable = lead_agent_prompt_template | model.bind_tools(lead_agent_tool + [CompleteOrEscalate])
+
+def create_lead_assistant_runnable(model: ChatGroq = None, fallback_models: tuple = (), **hedge_options) -> Runnable:
+    """
+    Bind the lead agent prompt to its tools.
+
+    Parameters:
+    - model: Chat model to bind, a new temperature 0 Groq client when omitted.
+    - fallback_models: Chat models to fail over to, in order (optional).
+    - hedge_options: Hedging and circuit breaker options of `HedgedChatModel` (optional).
+
+    Returns:
+    - The lead assistant runnable, nothing is created at import time.
+    """
+    if model is None:
+        # The assistant's RetryPolicy bounds the attempts, the client must not retry on its own as well
+        model = ChatGroq(model="llama3-70b-8192", temperature=0, max_retries=0)
+    # The model runs at temperature 0, so identical prompts can be answered from the response cache
+    return lead_agent_prompt_template | resilient(
+        [model, *fallback_models], lambda m: cached(m.bind_tools(lead_agent_tool + [CompleteOrEscalate])), **hedge_options
+    )
 
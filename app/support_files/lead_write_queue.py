@@ -0,0 +1,389 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
+from loguru import logger
+from typing_extensions import Annotated
+from support_files.cypher_queries import query_registry
+from support_files.graph_connection import test_graph_pool
+from support_files.identifier_cache import identifier_cache
+from support_files.instrumentation import instrumentation
+from support_files.tool_execution import customer_lead_creation, lead_creation_error, lead_creation_params, lead_name_index
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lead_writes (
+    key TEXT PRIMARY KEY,
+    thread_id TEXT,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    revision INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    error TEXT,
+    reported INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lead_writes_due ON lead_writes (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS lead_writes_reports ON lead_writes (thread_id, reported);
+"""
+
+# pending -> writing -> committed, or back to pending until `max_attempts`, then failed
+PENDING, WRITING, COMMITTED, FAILED = "pending", "writing", "committed", "failed"
+
+
+def _same_lead(stored: dict, params: dict) -> bool:
+    """True when a write of `params` would not change the stored lead, the creation time aside."""
+    return all(stored.get(field) == value for field, value in params.items() if field != "createdAt")
+
+
+def lead_idempotency_key(phone: str, civil_id: str, model: str) -> str:
+    """Same customer and model give the same key, whatever the formatting of the phone number or civil ID."""
+    normalized = "|".join((re.sub(r"\D", "", phone or ""), re.sub(r"\s", "", civil_id or "").upper(),
+                           (model or "").strip().casefold()))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+class LeadWriteReport(NamedTuple):
+    key: str
+    status: str
+    params: dict
+    error: Optional[str]
+    revision: int
+
+
+def report_text(report: LeadWriteReport) -> str:
+    """Note added to the conversation once a queued lead is stored or given up on."""
+    if report.status == COMMITTED:
+        return (f"The lead for {report.params['name']} (reference {report.key[:8]}) is now saved in the database. "
+                "Tell the user if they are still waiting for it.")
+    return (f"Saving the lead for {report.params['name']} (reference {report.key[:8]}) failed: {report.error}. "
+            "Tell the user the lead was not created and offer to try again.")
+
+
+class LeadWriteQueue:
+    """
+    Durable write-behind queue of the lead creations.
+
+    `enqueue` stores the validated lead in a local SQLite database and returns at once. A
+    background thread writes the due leads to Neo4j in `UNWIND` batches every `flush_interval`
+    seconds and retries failed ones with exponential backoff. The idempotency key of a lead is
+    its primary key, so a retried turn asking for the same lead again does not queue a second
+    write. Asking again with other details, e.g. a corrected email, replaces the queued details,
+    or queues a new write of a lead already stored, like the synchronous MERGE would update it. The
+    Cypher MERGEs on the phone number as well, so a lead written twice after a crash between the
+    commit and the status update still ends up once in the graph.
+
+    Several processes may share the database file, a lead is claimed for `write_timeout` seconds
+    in an immediate transaction and claimed again when its writer did not finish by then. Finished
+    leads are purged `retention` seconds after they were reported, or `unreported_retention`
+    seconds after they finished when nobody picked their report up.
+    """
+
+    def __init__(self, path: str = "lead_writes.sqlite", graph=test_graph_pool, batch_size: int = 100,
+                 flush_interval: float = 0.5, max_attempts: int = 5, backoff: float = 1.0, max_backoff: float = 60.0,
+                 write_timeout: float = 300.0, retention: float = 86_400.0, unreported_retention: float = 7 * 86_400.0,
+                 sweep_interval: float = 600.0, busy_timeout: float = 30.0):
+        """
+        Parameters:
+        - path: SQLite database file of the queue.
+        - graph: Connection the leads are written to, the same test database as customer_lead_creation by default.
+        - batch_size: Leads per write transaction.
+        - flush_interval: Seconds between two flushes of the due leads.
+        - max_attempts: Writes of a lead before it is marked as failed.
+        - backoff, max_backoff: Seconds before the first retry, doubled after every failure up to `max_backoff`.
+        - write_timeout: Seconds a claimed lead is left to its writer before another flush claims it again.
+        - retention: Seconds a finished lead is kept after its report, 0 keeps finished leads.
+        - unreported_retention: Seconds a finished lead whose report was never acknowledged is kept.
+        - sweep_interval: Seconds between two purges of the finished leads.
+        - busy_timeout: Seconds a transaction waits for the other processes sharing the file to release it.
+        """
+        self.path = path
+        self.graph = graph
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.write_timeout = write_timeout
+        self.retention = retention
+        self.unreported_retention = unreported_retention
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if "revision" not in {row[1] for row in self._conn.execute("PRAGMA table_info(lead_writes)")}:
+            # Queues created before the details of a queued lead could change
+            self._conn.execute("ALTER TABLE lead_writes ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        # Set under `_lock` by the worker when it stopped, and by `close` when it stopped waiting for it
+        self._worker_done = False
+        self._abandoned = False
+        self._worker = threading.Thread(target=self._worker_loop, name="lead-writer", daemon=True)
+        self._worker.start()
+
+    def _worker_loop(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                while self.flush() == self.batch_size:
+                    pass
+                self._maybe_sweep()
+            except Exception as e:
+                logger.error(f"Failed to flush the lead write queue: {e}")
+        with self._lock:
+            self._worker_done = True
+            if self._abandoned:
+                # `close` gave up waiting and left the connection to the worker
+                self._conn.close()
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if not self.retention or now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        with self._lock, self._conn:
+            # Leads of no thread have nobody to report to
+            purged = self._conn.execute(
+                "DELETE FROM lead_writes WHERE status IN (?, ?) AND ("
+                "(updated_at < ? AND (reported = 1 OR thread_id IS NULL)) OR updated_at < ?)",
+                (COMMITTED, FAILED, now - self.retention, now - max(self.retention, self.unreported_retention)),
+            ).rowcount
+        if purged:
+            logger.info(f"Purged {purged} finished lead writes.")
+
+    def enqueue(self, params: dict, thread_id: Optional[str] = None) -> tuple:
+        """
+        Queue the write of a validated lead.
+
+        Returns:
+        - `(key, status)`, status is "queued" for a new lead, "requeued" for a failed or stored lead
+          written again, "updated" when the details of a lead still waiting to be written changed, or
+          the current status of the same lead with the same details queued earlier.
+        """
+        key = lead_idempotency_key(params["mobile"], params["civil_id"], params["model"])
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT status, params FROM lead_writes WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO lead_writes (key, thread_id, params, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, thread_id, json.dumps(params), now, now, now),
+                )
+                status = "queued"
+            elif row[0] != FAILED and _same_lead(json.loads(row[1]), params):
+                status = row[0]
+            else:
+                # The lead keeps the time it was first asked for
+                params = {**params, "createdAt": json.loads(row[1])["createdAt"]}
+                # A lead being written is marked with a new revision and written again once the write finishes
+                self._conn.execute(
+                    "UPDATE lead_writes SET thread_id = ?, params = ?, revision = revision + 1, attempts = 0, "
+                    "status = CASE WHEN status = ? THEN status ELSE ? END, "
+                    "next_attempt_at = CASE WHEN status = ? THEN next_attempt_at ELSE ? END, "
+                    "error = NULL, reported = 0, updated_at = ? WHERE key = ?",
+                    (thread_id, json.dumps(params), WRITING, PENDING, WRITING, now, now, key),
+                )
+                status = "updated" if row[0] in (PENDING, WRITING) else "requeued"
+        instrumentation.increment(f"lead_writes_{'deduplicated' if status in (PENDING, WRITING, COMMITTED) else status}_total")
+        if status in ("queued", "requeued", "updated"):
+            self._wake.set()
+        return key, status
+
+    def _claim(self) -> list:
+        """
+        Mark up to `batch_size` due leads as being written and return `(key, params, attempts, revision)` for each.
+
+        The claim runs in an immediate transaction, so a process sharing the database cannot claim
+        the same leads in between. A lead still being written after `write_timeout` seconds, e.g.
+        by a process that died, is due again.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT key, params, attempts, revision FROM lead_writes WHERE status IN (?, ?) AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (PENDING, WRITING, now, self.batch_size),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE lead_writes SET status = ?, next_attempt_at = ? WHERE key = ?",
+                [(WRITING, now + self.write_timeout, row[0]) for row in rows],
+            )
+        return [(key, json.loads(params), attempts, revision) for key, params, attempts, revision in rows]
+
+    def _write(self, batch: list) -> dict:
+        """Write the batch, one lead at a time when the batch fails, and return `{key: error or None}`."""
+        try:
+            result = query_registry.execute_write(self.graph, "bulk_lead_creation", {"rows": [params for _, params, _, _ in batch]})
+        except Exception as e:
+            if len(batch) == 1:
+                return {batch[0][0]: str(e)}
+            logger.warning(f"Failed to write a batch of {len(batch)} leads, writing them one by one: {e}")
+            outcomes = {}
+            for item in batch:
+                outcomes.update(self._write([item]))
+            return outcomes
+        for row in result:
+            lead_name_index.upsert(row['lead_id'], row['lead_name'])
+        for _, params, _, _ in batch:
+            identifier_cache.invalidate_lead(params)
+        return {key: None for key, _, _, _ in batch}
+
+    def flush(self) -> int:
+        """Write the due leads once and return how many were claimed."""
+        batch = self._claim()
+        if not batch:
+            return 0
+        with instrumentation.span("lead_write_batch_duration_seconds"):
+            outcomes = self._write(batch)
+
+        now, updates = time.time(), []
+        for key, _, attempts, revision in batch:
+            error = outcomes[key]
+            attempts += 1
+            if error is None:
+                updates.append((COMMITTED, attempts, now, None, now, key, revision))
+                instrumentation.increment("lead_writes_committed_total")
+            elif attempts >= self.max_attempts:
+                updates.append((FAILED, attempts, now, error, now, key, revision))
+                instrumentation.increment("lead_writes_failed_total")
+                logger.error(f"Giving up on lead {key} after {attempts} attempts: {error}")
+            else:
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                updates.append((PENDING, attempts, now + delay, error, now, key, revision))
+                instrumentation.increment("lead_writes_retried_total")
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE lead_writes SET status = ?, attempts = ?, next_attempt_at = ?, error = ?, updated_at = ? "
+                "WHERE key = ? AND revision = ?",
+                updates,
+            )
+            # Details changed while they were being written, the new ones still have to be written
+            self._conn.executemany(
+                "UPDATE lead_writes SET status = ?, next_attempt_at = ? WHERE key = ? AND revision != ? AND status = ?",
+                [(PENDING, now, key, revision, WRITING) for key, _, _, revision in batch],
+            )
+        return len(batch)
+
+    def pending_reports(self, thread_id: Optional[str]) -> list:
+        """
+        Leads of the thread committed or failed and not acknowledged yet, as `LeadWriteReport`s.
+
+        The reports stay pending until `ack_reports`, so a turn failing before the user was told
+        reports them again on the next one.
+        """
+        if thread_id is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, status, params, error, revision FROM lead_writes WHERE thread_id = ? AND reported = 0 "
+                "AND status IN (?, ?) ORDER BY updated_at",
+                (str(thread_id), COMMITTED, FAILED),
+            ).fetchall()
+        return [LeadWriteReport(key, status, json.loads(params), error, revision)
+                for key, status, params, error, revision in rows]
+
+    def ack_reports(self, reports: list):
+        """Mark the reports as told to the user, unless the lead was queued again since."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE lead_writes SET reported = 1 WHERE key = ? AND revision = ?",
+                [(report.key, report.revision) for report in reports],
+            )
+
+    def status(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM lead_writes WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def depth(self) -> int:
+        """Leads waiting to be written."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM lead_writes WHERE status IN (?, ?)", (PENDING, WRITING)
+            ).fetchone()[0]
+
+    def close(self, timeout: float = 5.0):
+        """
+        Stop the worker, then flush the due leads a last time.
+
+        When the worker is still writing after `timeout` seconds there is no last flush, it would
+        race with the worker's batch. The worker closes the connection once it is done, and leads
+        left behind are written by the next queue opening the file.
+        """
+        self._closed.set()
+        self._wake.set()
+        self._worker.join(timeout)
+        with self._lock:
+            if not self._worker_done:
+                self._abandoned = True
+                logger.warning(f"The lead writer is still writing after {timeout}s, closing without a last flush.")
+                return
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+
+    def tool(self) -> StructuredTool:
+        """A drop-in `customer_lead_creation` tool queueing the write instead of waiting for it."""
+
+        def queue_customer_lead(name    : Annotated[str,"Customer name in lower case"],
+                                phone   : Annotated[str,"Customer phone number in 10 digits"],
+                                civil_id: Annotated[str,"Customer civil ID in 12 digits"],
+                                email   : Annotated[str,"Customer email address"],
+                                model   : Annotated[str,"Car model"],
+                                variant : Annotated[str,"Car variant"],
+                                config  : RunnableConfig = None) -> str:
+            error = lead_creation_error(name, phone, civil_id, email, model, variant)
+            if error:
+                return error
+
+            params = lead_creation_params(name, phone, civil_id, email, model, variant)
+            thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+            key, status = self.enqueue(params, None if thread_id is None else str(thread_id))
+            if status == COMMITTED:
+                return (f"A lead for {params['name']} with exactly these details already exists "
+                        f"(reference {key[:8]}), nothing was changed.")
+            if status == "updated":
+                headline = f"The lead for {params['name']} was still being saved, it will be saved with the details below"
+            elif status in (PENDING, WRITING):
+                headline = f"The lead for {params['name']} with these details is already being saved"
+            else:
+                headline = f"The lead for {params['name']} has been accepted and is being saved"
+            return (
+                f"{headline} (reference {key[:8]}).\n"
+                f"Customer Info:\n"
+                f"Name: {params['name']}\n"
+                f"Phone: {params['mobile']}\n"
+                f"Email: {params['email']}\n"
+                f"Model: {params['model']} (Variant: {params['variant']})\n"
+                f"Civil ID: {params['civil_id']}\n"
+                "The user will be told once it is stored."
+            )
+
+        async def aqueue_customer_lead(name: str, phone: str, civil_id: str, email: str, model: str, variant: str,
+                                       config: RunnableConfig = None) -> str:
+            # The validators and the SQLite insert are blocking
+            return await asyncio.to_thread(queue_customer_lead, name, phone, civil_id, email, model, variant, config)
+
+        return StructuredTool.from_function(
+            func=queue_customer_lead,
+            coroutine=aqueue_customer_lead,
+            name=customer_lead_creation.name,
+            description=customer_lead_creation.description,
+            args_schema=customer_lead_creation.args_schema,
+        )
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional
+from langchain_core.messages import (AIMessage, AIMessageChunk, BaseMessage, message_chunk_to_message, messages_from_dict,
+                                     messages_to_dict)
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig
+from loguru import logger
+
+# The prompts embed the process start time, which would otherwise change every key after a restart
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?([+-]\d{2}:\d{2}|Z)?")
+
+
+def _normalize_message(message: BaseMessage) -> dict:
+    normalized = {
+        "type": message.type,
+        "content": _TIMESTAMP.sub("<time>", message.content.strip()) if isinstance(message.content, str) else message.content,
+    }
+    # Tool call ids are random per session, the calls themselves are what the model sees
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        normalized["tool_calls"] = [{"name": tc["name"], "args": tc["args"]} for tc in tool_calls]
+    return normalized
+
+
+class LLMResponseCache:
+    """
+    Two tier cache of chat model responses.
+
+    A bounded in-memory LRU sits in front of a SQLite table, both honouring the same TTL,
+    so repeated flows are served without a network round trip even after a restart.
+    """
+
+    def __init__(self, path: Optional[str] = "llm_cache.sqlite", max_entries: int = 1024, ttl: Optional[float] = 24 * 3600):
+        """
+        Parameters:
+        - path: SQLite file of the on-disk tier, None keeps the cache in memory only.
+        - max_entries: Responses kept in the in-memory LRU.
+        - ttl: Seconds a response stays valid, None never expires.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = None
+        self._counts = Counter()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    @staticmethod
+    def make_key(messages: list, binding: Any) -> str:
+        """Hash of the normalized messages plus the model and bound tool schemas."""
+        payload = json.dumps(
+            {"messages": [_normalize_message(m) for m in messages], "binding": binding},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, message = entry
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self._counts["memory_hits"] += 1
+                    return message
+                del self._memory[key]
+
+            db = self._db()
+            row = db.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone() if db else None
+            if row is not None and not self._expired(row[1]):
+                message = messages_from_dict([json.loads(row[0])])[0]
+                self._remember(key, row[1], message)
+                self._counts["disk_hits"] += 1
+                return message
+            self._counts["misses"] += 1
+            return None
+
+    def put(self, key: str, message: AIMessage):
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, message)
+            db = self._db()
+            if db is not None:
+                try:
+                    with db:
+                        db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)",
+                                   (key, json.dumps(messages_to_dict([message])[0]), created_at))
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to persist LLM response: {e}")
+
+    def _remember(self, key: str, created_at: float, message: AIMessage):
+        self._memory[key] = (created_at, message)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit and miss counters, e.g. {"memory_hits": 3, "disk_hits": 1, "misses": 7}."""
+        with self._lock:
+            return {"memory_hits": self._counts["memory_hits"], "disk_hits": self._counts["disk_hits"],
+                    "misses": self._counts["misses"]}
+
+
+def _fresh_copy(message: AIMessage) -> AIMessage:
+    """
+    A cached response with new message and tool call ids, so replayed calls never collide.
+
+    The provider's raw tool calls in `additional_kwargs` and its response id would still carry
+    the original ids, they are dropped, `tool_calls` is what gets sent back to the model.
+    """
+    tool_calls = [{**tc, "id": f"call_{uuid.uuid4().hex[:24]}"} for tc in message.tool_calls]
+    additional_kwargs = {key: value for key, value in message.additional_kwargs.items() if key != "tool_calls"}
+    response_metadata = {key: value for key, value in message.response_metadata.items() if key != "id"}
+    return message.copy(update={"id": None, "tool_calls": tool_calls, "additional_kwargs": additional_kwargs,
+                                "response_metadata": response_metadata}, deep=True)
+
+
+def _as_chunk(message: AIMessage) -> AIMessageChunk:
+    """A whole response as the single chunk a stream of it replays."""
+    return AIMessageChunk(content=message.content, additional_kwargs=message.additional_kwargs,
+                          response_metadata=message.response_metadata, tool_calls=message.tool_calls,
+                          usage_metadata=message.usage_metadata)
+
+
+class CachedChatModel(Runnable):
+    """
+    Serve a bound chat model from `LLMResponseCache` when it is asked the exact same thing again.
+
+    Only use it with deterministic (temperature 0) models. Responses without content or tool calls
+    are never cached. Streams pass the model's chunks through on a miss and cache the complete
+    response once the stream ends, a hit is replayed as one chunk.
+    """
+
+    def __init__(self, bound: Runnable, cache: "LLMResponseCache"):
+        self.bound = bound
+        self.cache = cache
+        inner = getattr(bound, "bound", bound)
+        self._binding = {
+            "model": getattr(inner, "model_name", type(inner).__name__),
+            "temperature": getattr(inner, "temperature", None),
+            "kwargs": getattr(bound, "kwargs", {}),
+        }
+
+    def _key(self, input: Any) -> str:
+        messages = input.to_messages() if isinstance(input, PromptValue) else list(input)
+        return self.cache.make_key(messages, self._binding)
+
+    def _store(self, key: str, result: AIMessage):
+        if result.content or result.tool_calls:
+            self.cache.put(key, result)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> AIMessage:
+        key = self._key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return _fresh_copy(cached)
+        result = self.bound.invoke(input, config, **kwargs)
+        self._store(key, result)
+        return result
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> AIMessage:
+        key = self._key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return _fresh_copy(cached)
+        result = await self.bound.ainvoke(input, config, **kwargs)
+        self._store(key, result)
+        return result
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Iterator[AIMessageChunk]:
+        key = self._key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield _as_chunk(_fresh_copy(cached))
+            return
+        final = None
+        for chunk in self.bound.stream(input, config, **kwargs):
+            final = chunk if final is None else final + chunk
+            yield chunk
+        # Only reached when the stream was consumed to the end
+        if final is not None:
+            self._store(key, message_chunk_to_message(final))
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None,
+                      **kwargs) -> AsyncIterator[AIMessageChunk]:
+        key = self._key(input)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield _as_chunk(_fresh_copy(cached))
+            return
+        final = None
+        async for chunk in self.bound.astream(input, config, **kwargs):
+            final = chunk if final is None else final + chunk
+            yield chunk
+        if final is not None:
+            self._store(key, message_chunk_to_message(final))
+
+
+llm_response_cache = LLMResponseCache(
+    path=os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite"),
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("LLM_CACHE_TTL", 24 * 3600)),
+)
+
+
+def cached(bound: Runnable, enabled: Optional[bool] = None) -> Runnable:
+    """
+    Wrap a bound chat model with the shared response cache.
+
+    Parameters:
+    - bound: The chat model, usually after `bind_tools`.
+    - enabled: Force the cache on or off, defaults to the LLM_CACHE environment variable.
+    """
+    if enabled is None:
+        enabled = os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes")
+    return CachedChatModel(bound, llm_response_cache) if enabled else bound
@@ -0,0 +1,408 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, NamedTuple, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable, RunnableConfig
+from loguru import logger
+from support_files.instrumentation import instrumentation
+
+# Tag of the duplicate requests, the serving layer does not stream their tokens
+HEDGE_TAG = "hedge"
+# Latency samples needed before the percentile replaces `max_hedge_delay`
+_MIN_SAMPLES = 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _llm_executor() -> ThreadPoolExecutor:
+    """Process wide pool of the sync backend calls, created on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+    return _executor
+
+
+class CircuitBreaker:
+    """
+    Stop calling a backend after `failure_threshold` consecutive failures.
+
+    Once open, the breaker lets a single trial call through every `reset_timeout` seconds and
+    closes again when it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if time.monotonic() - self._opened_at >= self.reset_timeout else "open"
+
+    def allow(self, owner: Any = True) -> bool:
+        """True when a call may be sent, claiming the trial call of a half open breaker for `owner`."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial = owner
+            return True
+
+    def release_trial(self, owner: Any):
+        """Give back a trial claimed by `owner` whose call was cancelled before it had an outcome."""
+        with self._lock:
+            if self._trial is owner:
+                self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> bool:
+        """Returns True when this failure opened the breaker."""
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                opened = self._opened_at is None or bool(self._trial)
+                self._opened_at = time.monotonic()
+                self._trial = False
+                return opened
+            return False
+
+
+class LatencyWindow:
+    """The last `size` successful call latencies of a backend."""
+
+    def __init__(self, size: int = 200):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < _MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Backend(NamedTuple):
+    name: str
+    runnable: Runnable
+    breaker: CircuitBreaker
+    latencies: LatencyWindow
+
+
+class HedgeStats:
+    """Thread-safe counters of the hedged calls, e.g. `hedge_stats.snapshot()["hedge_wins"]`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, event: str, count: int = 1):
+        with self._lock:
+            self._counts[event] += count
+        instrumentation.increment(f"llm_{event}_total", count)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+hedge_stats = HedgeStats()
+
+# Marks that no hedge finished while the streaming call was still running
+_NO_RESULT = object()
+
+
+class _TokenWatcher(BaseCallbackHandler):
+    """Notices the first token of the call whose tokens are streamed to the client."""
+
+    # Set from the event loop as well, without waiting for an executor
+    run_inline = True
+
+    def __init__(self):
+        self.streamed = threading.Event()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        self.streamed.set()
+
+
+class HedgedChatModel(Runnable):
+    """
+    Call an ordered list of chat model backends with hedging, failover and circuit breakers.
+
+    The first backend whose breaker is closed gets the request. When it has not answered after
+    the `hedge_percentile` of its recent latencies, the same request is sent to the next backend,
+    or again to the same one when there is no other, and the first answer wins. A failing call
+    fails over to the next backend at once. A backend failing `failure_threshold` times in a row is
+    skipped until its breaker lets a trial call through.
+
+    Only the first request streams its tokens, the hedge is tagged with `HEDGE_TAG` so the serving
+    layer drops its tokens. Once the first request has streamed a token it has to finish the reply:
+    no hedge is sent anymore and a hedge answering first is only used if that request fails.
+    """
+
+    def __init__(self, backends: list, hedge_percentile: Optional[float] = 0.95, min_hedge_delay: float = 0.5,
+                 max_hedge_delay: float = 10.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 stats: HedgeStats = hedge_stats):
+        """
+        Parameters:
+        - backends: `(name, runnable)` pairs in order of preference, usually bound and cached chat models.
+        - hedge_percentile: Latency percentile after which a hedged request is sent, None never hedges.
+        - min_hedge_delay, max_hedge_delay: Bounds of the hedge delay in seconds, the maximum is used
+          until a backend has enough latency samples.
+        - failure_threshold: Consecutive failures opening a backend's breaker.
+        - reset_timeout: Seconds before an open breaker lets a trial call through.
+        - stats: Counters of the hedges, wins and failovers.
+        """
+        if hedge_percentile is not None and not 0 < hedge_percentile < 1:
+            raise ValueError(f"hedge_percentile must be between 0 and 1, got {hedge_percentile}.")
+        self.backends = [Backend(name, runnable, CircuitBreaker(failure_threshold, reset_timeout), LatencyWindow())
+                         for name, runnable in backends]
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.stats = stats
+
+    def _pick(self, exclude: tuple = (), owner: Any = True) -> Optional[Backend]:
+        """Next backend whose breaker lets a call through, breakers are only asked when a call will follow."""
+        for backend in self.backends:
+            if all(backend is not other for other in exclude) and backend.breaker.allow(owner):
+                return backend
+        return None
+
+    def _first_backend(self, owner: Any = True) -> Backend:
+        backend = self._pick(owner=owner)
+        if backend is None:
+            # Every breaker is open, trying is still better than failing the turn outright
+            self.stats.record("all_breakers_open")
+            return self.backends[0]
+        return backend
+
+    def _hedge_delay(self, backend: Backend) -> Optional[float]:
+        if self.hedge_percentile is None:
+            return None
+        delay = backend.latencies.percentile(self.hedge_percentile)
+        if delay is None:
+            return self.max_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    @staticmethod
+    def _hedge_config(config: Optional[RunnableConfig]) -> RunnableConfig:
+        config = dict(config or {})
+        config["tags"] = [*config.get("tags", []), HEDGE_TAG]
+        return config
+
+    def _record(self, backend: Backend, started: float, error: Optional[Exception] = None):
+        if error is None:
+            backend.latencies.add(time.monotonic() - started)
+            backend.breaker.record_success()
+        elif backend.breaker.record_failure():
+            self.stats.record("breaker_opened")
+            logger.warning(f"Circuit breaker of {backend.name} opened after: {error}")
+
+    @staticmethod
+    def _runnable(backend: Backend, watcher: Optional["_TokenWatcher"]) -> Runnable:
+        return backend.runnable if watcher is None else backend.runnable.with_config(callbacks=[watcher])
+
+    def _call(self, backend: Backend, watcher: Optional["_TokenWatcher"], input: Any,
+              config: Optional[RunnableConfig], **kwargs):
+        started = time.monotonic()
+        try:
+            result = self._runnable(backend, watcher).invoke(input, config, **kwargs)
+        except Exception as e:
+            self._record(backend, started, e)
+            raise
+        self._record(backend, started)
+        return result
+
+    async def _acall(self, backend: Backend, watcher: Optional["_TokenWatcher"], owner: Any, input: Any,
+                     config: Optional[RunnableConfig], **kwargs):
+        started = time.monotonic()
+        try:
+            result = await self._runnable(backend, watcher).ainvoke(input, config, **kwargs)
+        except Exception as e:
+            self._record(backend, started, e)
+            raise
+        except BaseException:
+            # A cancelled loser says nothing about the backend, but a trial it held must be freed
+            backend.breaker.release_trial(owner)
+            raise
+        self._record(backend, started)
+        return result
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        executor = _llm_executor()
+        watcher = _TokenWatcher()
+
+        def submit(backend: Backend, streamed: bool):
+            # Only one call at a time streams its tokens to the client, the others are tagged as hedges
+            call_config, call_watcher = (config, watcher) if streamed else (self._hedge_config(config), None)
+            # The losing requests finish in the background, their outcome still feeds the breakers
+            future = executor.submit(contextvars.copy_context().run, self._call, backend, call_watcher, input,
+                                     call_config, **kwargs)
+            pending[future] = backend
+            return future
+
+        primary = self._first_backend()
+        pending, tried = {}, [primary]
+        submit(primary, True)
+        hedge_delay = self._hedge_delay(primary)
+        hedge_at = time.monotonic() + hedge_delay if hedge_delay is not None else None
+        hedge, error, spare = None, None, _NO_RESULT
+
+        while pending:
+            timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                hedge_at = None
+                if watcher.streamed.is_set():
+                    # The client already has part of the primary's reply, a hedge could only contradict it
+                    self.stats.record("hedges_skipped")
+                    continue
+                # With a single backend the hedge goes to the same one
+                backend = self._pick(exclude=tuple(tried)) or primary
+                tried.append(backend)
+                self.stats.record("hedges")
+                logger.debug(f"{primary.name} is slower than {hedge_delay:.2f}s, hedging on {backend.name}")
+                hedge = submit(backend, False)
+                continue
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    hedge_at = None
+                    if spare is not _NO_RESULT and not pending:
+                        return spare
+                    # While a hedge is still running it takes over instead of a new request
+                    fallback = None if pending else self._pick(exclude=tuple(tried))
+                    if fallback is not None:
+                        tried.append(fallback)
+                        self.stats.record("failovers")
+                        logger.warning(f"{backend.name} failed with {type(e).__name__}, failing over to {fallback.name}")
+                        submit(fallback, not watcher.streamed.is_set())
+                    continue
+                if future is hedge and watcher.streamed.is_set() and pending:
+                    # Only the streaming call can finish the reply the client is reading, the hedge is kept in reserve
+                    spare = result
+                    continue
+                if hedge is not None:
+                    self.stats.record("hedge_wins" if future is hedge else "hedge_losses")
+                return result
+        if spare is not _NO_RESULT:
+            return spare
+        raise error
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        # Owner of the trial calls this request claims, so cancelling them can give the trials back
+        owner = object()
+        watcher = _TokenWatcher()
+
+        def submit(backend: Backend, streamed: bool):
+            call_config, call_watcher = (config, watcher) if streamed else (self._hedge_config(config), None)
+            task = asyncio.ensure_future(self._acall(backend, call_watcher, owner, input, call_config, **kwargs))
+            pending[task] = backend
+            return task
+
+        primary = self._first_backend(owner)
+        pending, tried = {}, [primary]
+        submit(primary, True)
+        hedge_delay = self._hedge_delay(primary)
+        hedge_at = time.monotonic() + hedge_delay if hedge_delay is not None else None
+        hedge, error, spare = None, None, _NO_RESULT
+
+        try:
+            while pending:
+                timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_at = None
+                    if watcher.streamed.is_set():
+                        self.stats.record("hedges_skipped")
+                        continue
+                    backend = self._pick(exclude=tuple(tried), owner=owner) or primary
+                    tried.append(backend)
+                    self.stats.record("hedges")
+                    logger.debug(f"{primary.name} is slower than {hedge_delay:.2f}s, hedging on {backend.name}")
+                    hedge = submit(backend, False)
+                    continue
+
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error = e
+                        hedge_at = None
+                        if spare is not _NO_RESULT and not pending:
+                            return spare
+                        fallback = None if pending else self._pick(exclude=tuple(tried), owner=owner)
+                        if fallback is not None:
+                            tried.append(fallback)
+                            self.stats.record("failovers")
+                            logger.warning(f"{backend.name} failed with {type(e).__name__}, failing over to {fallback.name}")
+                            submit(fallback, not watcher.streamed.is_set())
+                        continue
+                    if task is hedge and watcher.streamed.is_set() and pending:
+                        spare = result
+                        continue
+                    if hedge is not None:
+                        self.stats.record("hedge_wins" if task is hedge else "hedge_losses")
+                    return result
+            if spare is not _NO_RESULT:
+                return spare
+            raise error
+        finally:
+            # Unlike threads the losing requests can be cancelled, a task cancelled before it started
+            # never reaches the handler in `_acall`, so its trial is given back here as well
+            for task, backend in pending.items():
+                task.cancel()
+                backend.breaker.release_trial(owner)
+
+    def breaker_states(self) -> dict:
+        return {backend.name: backend.breaker.state for backend in self.backends}
+
+
+def resilient(models: list, bind: Callable[[Any], Runnable], hedge_percentile: Optional[float] = None,
+              **options) -> Runnable:
+    """
+    Bind every chat model with `bind` and put them behind a `HedgedChatModel`.
+
+    Parameters:
+    - models: Chat models in order of preference, the first one is the primary.
+    - bind: Turns a chat model into the runnable to call, e.g. binding the tools and the cache.
+    - hedge_percentile, options: Passed on to `HedgedChatModel`.
+
+    Returns:
+    - The bound primary model as it is when there is neither a fallback nor hedging.
+    """
+    if len(models) == 1 and hedge_percentile is None:
+        return bind(models[0])
+    return HedgedChatModel(
+        [(getattr(model, "model_name", type(model).__name__), bind(model)) for model in models],
+        hedge_percentile=hedge_percentile, **options,
+    )
@@ -0,0 +1,152 @@
+import json
+from typing import Optional
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import Runnable
+from loguru import logger
+
+# Rough token estimate, close enough for llama3 style tokenizers without loading one
+_CHARS_PER_TOKEN = 4
+_TOKENS_PER_MESSAGE = 4
+
+summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system",
+         "You maintain a running summary of a conversation between a customer support assistant for the Automotive Industry and a user. "
+         "Update the existing summary with the new messages. Keep every customer name, phone number, email, civil ID, car model, "
+         "variant and the outcome of every lead verification or creation. Reply with the updated summary only."),
+        ("user", "Existing summary:\n{summary}\n\nNew messages:\n{transcript}"),
+    ]
+)
+
+
+def count_tokens(message: BaseMessage) -> int:
+    """Approximate number of prompt tokens used by one message."""
+    text = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += json.dumps(message.tool_calls, default=str)
+    return _TOKENS_PER_MESSAGE + len(text) // _CHARS_PER_TOKEN
+
+
+def group_turns(messages: list) -> list:
+    """
+    Group messages into units that must be kept or dropped together.
+
+    A ToolMessage always stays with the AI message holding its tool call, so the
+    window never sends a tool result without the call that produced it.
+    """
+    units = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and units:
+            units[-1].append(message)
+        else:
+            units.append([message])
+    return units
+
+
+class MessageWindow:
+    """
+    Token budgeted view of `State.messages` with a rolling summary of the older turns.
+
+    The newest turns that fit in `max_tokens` are sent to the LLM as they are. Older turns
+    are folded into `State.summary` by `summarizer`, which is only invoked when the window
+    moves, and the summary is prepended as a system message. The checkpointed history is
+    never modified. When the window moves it frees `summarize_margin` of the budget, so the
+    next turns fit again instead of calling the summarizer on almost every turn.
+    """
+
+    def __init__(self, max_tokens: int = 4000, summarizer: Optional[Runnable] = None, summarize_margin: float = 0.25):
+        """
+        Parameters:
+        - max_tokens: Token budget of the summary plus the recent messages.
+        - summarizer: Chat model used to update the summary, without one older turns are dropped.
+        - summarize_margin: Fraction of the budget left free after the window moved, between 0 and 1.
+        """
+        if not 0 <= summarize_margin < 1:
+            raise ValueError(f"summarize_margin must be between 0 and 1, got {summarize_margin}")
+        self.max_tokens = max_tokens
+        self.summarize_margin = summarize_margin
+        self.summarizer = summary_prompt | summarizer if summarizer is not None else None
+
+    @staticmethod
+    def _summary_input(summary: str, dropped: list) -> dict:
+        transcript = "\n".join(f"{message.type}: {message.content}" for message in dropped)
+        return {"summary": summary or "(none)", "transcript": transcript}
+
+    def _summarize(self, summary: str, dropped: list) -> str:
+        if self.summarizer is None:
+            return summary
+        try:
+            return self.summarizer.invoke(self._summary_input(summary, dropped)).content
+        except Exception as e:
+            logger.warning(f"Failed to update the conversation summary, keeping the previous one: {e}")
+            return summary
+
+    async def _asummarize(self, summary: str, dropped: list) -> str:
+        if self.summarizer is None:
+            return summary
+        try:
+            return (await self.summarizer.ainvoke(self._summary_input(summary, dropped))).content
+        except Exception as e:
+            logger.warning(f"Failed to update the conversation summary, keeping the previous one: {e}")
+            return summary
+
+    def _split(self, state: dict) -> tuple:
+        """`(summary_text, kept, dropped)`, the turns kept in the window and the messages to summarize."""
+        messages = state["messages"]
+        summary = state.get("summary") or {}
+        summary_text, summarized_until = summary.get("text", ""), summary.get("until")
+
+        start = 0
+        if summarized_until is not None:
+            for index, message in enumerate(messages):
+                if message.id == summarized_until:
+                    start = index + 1
+                    break
+        units = group_turns(messages[start:])
+
+        budget = self.max_tokens - len(summary_text) // _CHARS_PER_TOKEN
+        costs = [sum(count_tokens(message) for message in unit) for unit in units]
+        if sum(costs) > budget:
+            # Moving anyway, make room for the next turns
+            budget -= int(self.max_tokens * self.summarize_margin)
+        kept, used = 0, 0
+        for cost in reversed(costs):
+            if kept and used + cost > budget:
+                break
+            kept += 1
+            used += cost
+
+        dropped = [message for unit in units[:len(units) - kept] for message in unit]
+        return summary_text, units[len(units) - kept:], dropped
+
+    @staticmethod
+    def _window(summary_text: str, kept: list) -> list:
+        window = [message for unit in kept for message in unit]
+        if summary_text:
+            window.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {summary_text}"))
+        return window
+
+    def apply(self, state: dict) -> tuple:
+        """
+        Parameters:
+        - state: The graph state.
+
+        Returns:
+        - The messages to send to the LLM and the new summary, None when it did not change.
+        """
+        summary_text, kept, dropped = self._split(state)
+        new_summary = None
+        if dropped:
+            summary_text = self._summarize(summary_text, dropped)
+            new_summary = {"text": summary_text, "until": dropped[-1].id}
+        return self._window(summary_text, kept), new_summary
+
+    async def aapply(self, state: dict) -> tuple:
+        """Async version of `apply`, the summarizer is awaited on the event loop."""
+        summary_text, kept, dropped = self._split(state)
+        new_summary = None
+        if dropped:
+            summary_text = await self._asummarize(summary_text, dropped)
+            new_summary = {"text": summary_text, "until": dropped[-1].id}
+        return self._window(summary_text, kept), new_summary
@@ -0,0 +1,206 @@
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, Iterable, Optional
+from loguru import logger
+from support_files.jaro_winkler import PackedNames, score_batch
+
+# pyjarowinkler rounds the Jaro-Winkler score to two decimals, so a raw score of
+# 0.855 is already reported as 0.86. The bounds below are compared after the same
+# rounding so that the index never drops a name the full scan would have returned.
+_MAX_PREFIX_BOOST = 0.4
+_BOUND_EPSILON = 1e-9
+
+
+def _rounded_upper_bound(common: int, shorter: int, longer: int) -> float:
+    """
+    Upper bound of `get_jaro_distance` for two names sharing at most `common` characters.
+
+    The number of matching characters can never exceed the size of the multiset
+    intersection of both (lower cased) names, and the Winkler prefix boost is at most 0.4.
+    """
+    if common <= 0:
+        jaro = 0.0
+    else:
+        jaro = (common / shorter + common / longer + 1.0) / 3.0 + _BOUND_EPSILON
+    return round((jaro + _MAX_PREFIX_BOOST * (1.0 - jaro)) * 100.0) / 100.0
+
+
+def _min_common_characters(query_length: int, name_length: int, threshold: float) -> Optional[int]:
+    """
+    Smallest number of shared characters a name of `name_length` needs to reach `threshold`.
+
+    Returns None when no name of that length can reach the threshold.
+    """
+    shorter, longer = sorted((query_length, name_length))
+    for common in range(0, shorter + 1):
+        if _rounded_upper_bound(common, shorter, longer) >= threshold:
+            return common
+    return None
+
+
+def _occurrence_keys(text: str) -> list:
+    """Character unigrams tagged with their occurrence number, e.g. 'anna' -> a#1, n#1, n#2, a#2."""
+    seen = Counter()
+    keys = []
+    for char in text:
+        seen[char] += 1
+        keys.append((char, seen[char]))
+    return keys
+
+
+class NameIndex:
+    """
+    In-memory fuzzy name index over the `Lead` names stored in Neo4j.
+
+    The index is built once from `loader` on first use and kept up to date through `upsert`,
+    so name only verification no longer scans every Lead for each call.
+
+    Candidates are generated with a lossless n-gram blocking scheme: every name is
+    indexed by its character unigrams (tagged with their occurrence number) and bucketed
+    by length. For a query of length n and a bucket of length l at least `c` characters must be
+    shared to reach the threshold, so by the pigeonhole principle a candidate must contain one of the
+    `n - c + 1` rarest query keys of that bucket. Only those postings are probed and the shortlist is
+    scored in one batch by `score_batch`.
+    """
+
+    def __init__(self, loader: Callable[[], Iterable], threshold: float = 0.86):
+        """
+        Parameters:
+        - loader: Callable returning `(lead_id, name)` pairs for every Lead in the database.
+        - threshold: Default Jaro-Winkler similarity threshold used by `find_similar`.
+        """
+        self.loader = loader
+        self.threshold = threshold
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._packed = PackedNames()
+        self._ids_by_key = {}
+        self._postings = defaultdict(list)
+        self._lengths = Counter()
+        self._wildcards = []
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            count = 0
+            for lead_id, name in self.loader():
+                self._insert(lead_id, name)
+                count += 1
+            self._loaded = True
+            logger.info(f"Lead name index built with {count} names.")
+
+    def _insert(self, lead_id, name: Optional[str]):
+        if not name:
+            return
+        slot = self._packed.append(name)
+        lowered = self._packed.lowered[slot]
+        if lead_id is not None:
+            self._ids_by_key[lead_id] = slot
+        if "*" in lowered:
+            # pyjarowinkler marks consumed characters with '*', so names containing '*'
+            # can match more characters than they share and are never pruned.
+            self._wildcards.append(slot)
+            return
+        length = len(lowered)
+        self._lengths[length] += 1
+        for key in _occurrence_keys(lowered):
+            self._postings[(length, key)].append(slot)
+
+    def _remove(self, slot: int):
+        if not self._packed.is_alive(slot):
+            return
+        lowered = self._packed.lowered[slot]
+        if "*" in lowered:
+            self._wildcards.remove(slot)
+        else:
+            length = len(lowered)
+            self._lengths[length] -= 1
+            for key in _occurrence_keys(lowered):
+                self._postings[(length, key)].remove(slot)
+        self._packed.discard(slot)
+
+    def upsert(self, lead_id, name: str):
+        """
+        Add a newly created Lead or rename an existing one without rebuilding the index.
+
+        Parameters:
+        - lead_id: The Lead's `id` property.
+        - name: The Lead's name as stored in the database.
+        """
+        with self._lock:
+            if not self._loaded:
+                # The next lookup loads the full list, which already contains this lead.
+                return
+            slot = self._ids_by_key.pop(lead_id, None)
+            if slot is not None:
+                if self._packed.names[slot] == name:
+                    self._ids_by_key[lead_id] = slot
+                    return
+                self._remove(slot)
+            self._insert(lead_id, name)
+
+    def remove(self, lead_id):
+        """Drop a deleted Lead from the index, a no-op for leads it does not hold."""
+        with self._lock:
+            slot = self._ids_by_key.pop(lead_id, None)
+            if slot is not None:
+                self._remove(slot)
+
+    def invalidate(self):
+        """Drop the index so the next lookup reloads it from the database."""
+        with self._lock:
+            self._loaded = False
+            self._packed = PackedNames()
+            self._ids_by_key = {}
+            self._postings = defaultdict(list)
+            self._lengths = Counter()
+            self._wildcards = []
+
+    def _candidates(self, lowered: str, threshold: float) -> Optional[set]:
+        if "*" in lowered:
+            return None
+
+        query_length = len(lowered)
+        query_keys = _occurrence_keys(lowered)
+        candidates = set(self._wildcards)
+
+        for length, count in self._lengths.items():
+            if count <= 0:
+                continue
+            min_common = _min_common_characters(query_length, length, threshold)
+            if min_common is None:
+                continue
+            if min_common == 0:
+                # Every name of this length may reach the threshold, fall back to a full batch scan.
+                return None
+
+            keys = sorted(query_keys, key=lambda key: len(self._postings.get((length, key), ())))
+            for key in keys[:query_length - min_common + 1]:
+                candidates.update(self._postings.get((length, key), ()))
+
+        return candidates
+
+    def find_similar(self, input_name: str, threshold: Optional[float] = None) -> list:
+        """
+        Find the stored names that are similar to `input_name`.
+
+        Parameters:
+        - input_name: The name provided by the user.
+        - threshold: Minimum Jaro-Winkler similarity (defaults to the index threshold).
+
+        Returns:
+        - A list of `(name, similarity)` tuples in database order, identical to a full scan.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        self._ensure_loaded()
+        with self._lock:
+            candidates = self._candidates(input_name.lower(), threshold)
+            matches = score_batch(input_name, self._packed, threshold, slots=candidates)
+            return [(self._packed.names[slot], similarity) for slot, similarity in matches]
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._packed)
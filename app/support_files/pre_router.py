@@ -0,0 +1,171 @@
+import re
+import threading
+import uuid
+from collections import Counter
+from typing import Literal, NamedTuple
+from langchain_core.messages import AIMessage, HumanMessage
+from loguru import logger
+from support_files.instrumentation import instrumentation
+from support_files.validation_functions import check_civil_id, check_email_syntax, check_phone_number
+
+# Candidates only, every match is confirmed by the validators
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Digit groups separated by spaces or hyphens, the groups after the number are cut off by `_phone_candidates`
+_PHONE = re.compile(r"\+\d+(?:[ -]+\d+)*")
+_PHONE_SEPARATOR = re.compile(r"[ -]+")
+_MAX_PHONE_DIGITS = 15
+_CIVIL_ID = re.compile(r"(?<![\d+])\d{12}(?!\d)")
+_AFFIRMATION = re.compile(
+    r"\s*(yes|yeah|yep|no|nope|ok|okay|sure|confirm|confirmed|proceed|go ahead|correct|that'?s (right|correct)|"
+    r"create (a )?new lead|create (the )?lead|create it)\b[\s.!,]*(please)?[\s.!]*",
+    re.IGNORECASE,
+)
+_LEAD_INTENT = re.compile(r"\b(create|new|add|register|open)\b.{0,40}\blead\b", re.IGNORECASE)
+# "Don't create a lead", "How do I add a lead?" mention the intent without asking for it
+_NEGATION = re.compile(r"\b(not|don'?t|doesn'?t|never|cancel|stop|without)\b", re.IGNORECASE)
+_QUESTION = re.compile(r"\s*(how|what|why|when|where|who|which|is|are|does|do|did|should)\b", re.IGNORECASE)
+# Intents the lead agent has no tool for, always left to the primary assistant
+_OTHER_INTENT = re.compile(r"\b(update|delete|remove|test drive|quotation|quote)\b", re.IGNORECASE)
+
+
+class RouteDecision(NamedTuple):
+    """Where a user turn should go, how sure the rules are and which rule decided."""
+    route: str
+    confidence: float
+    rule: str
+    identifiers: dict = {}
+
+
+class PreRouterStats:
+    """Thread-safe counters of the pre-router, e.g. `pre_router_stats.snapshot()["llm_calls_saved"]`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, event: str, count: int = 1):
+        with self._lock:
+            self._counts[event] += count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+pre_router_stats = PreRouterStats()
+
+
+def _phone_candidates(match: str) -> list:
+    """
+    The match and its prefixes ending before a separator, longest first, so a number followed by
+    another one, e.g. "+96550000000 290010100000", is found without the digits after it. Candidates
+    longer than the 15 digits of an E.164 number are left out.
+    """
+    ends = [len(match), *(separator.start() for separator in reversed(list(_PHONE_SEPARATOR.finditer(match))))]
+    return [match[:end] for end in ends if sum(char.isdigit() for char in match[:end]) <= _MAX_PHONE_DIGITS]
+
+
+def extract_identifiers(text: str) -> dict:
+    """
+    Return the valid phone number, civil ID and email found in `text`, each at most once.
+
+    Emails are only checked for their syntax, this runs on the entry edge of every turn and the
+    lead agent validates the details it uses anyway.
+    """
+    identifiers = {}
+    for match in _EMAIL.findall(text):
+        if check_email_syntax(match).valid:
+            identifiers["email"] = match
+            break
+    for candidate in (candidate for match in _PHONE.findall(text) for candidate in _phone_candidates(match)):
+        if check_phone_number(candidate).valid:
+            identifiers["phone"] = candidate
+            break
+    for match in _CIVIL_ID.findall(text):
+        if check_civil_id(match).valid:
+            identifiers["civil_id"] = match
+            break
+    return identifiers
+
+
+class PreRouter:
+    """
+    Rule-based router in front of the primary assistant for turns whose destination is obvious.
+
+    While a lead flow is active, pasted identifiers and short confirmations go straight to the lead
+    agent. Outside of one, an explicit request to create a lead that already gives a customer
+    identifier is handed to the lead agent through a synthesized `Lead_assistant` call, negated
+    requests and questions are not. Everything below `min_confidence` falls back to
+    the primary assistant's LLM call, so the rules only have to be right when they are sure.
+    """
+
+    def __init__(self, min_confidence: float = 0.8, handoff_tool: str = "Lead_assistant",
+                 stats: PreRouterStats = pre_router_stats):
+        """
+        Parameters:
+        - min_confidence: Decisions below this confidence go to the primary assistant.
+        - handoff_tool: Name of the primary assistant's tool delegating to the lead agent.
+        - stats: Counters of the routing decisions and the LLM calls saved.
+        """
+        self.min_confidence = min_confidence
+        self.handoff_tool = handoff_tool
+        self.stats = stats
+
+    def classify(self, state: dict) -> RouteDecision:
+        messages = state.get("messages") or []
+        if not messages or not isinstance(messages[-1], HumanMessage) or not isinstance(messages[-1].content, str):
+            return RouteDecision("primary_assistant", 0.0, "not_a_user_turn")
+        text = messages[-1].content.strip()
+        if _OTHER_INTENT.search(text):
+            return RouteDecision("primary_assistant", 0.0, "other_intent")
+
+        identifiers = extract_identifiers(text)
+        dialog_state = state.get("dialog_state") or []
+        if dialog_state and dialog_state[-1] == "lead_agent":
+            if identifiers:
+                return RouteDecision("lead_agent", 0.95, "identifiers_in_lead_flow", identifiers)
+            if len(text.split()) <= 6 and _AFFIRMATION.fullmatch(text):
+                return RouteDecision("lead_agent", 0.9, "confirmation_in_lead_flow")
+            return RouteDecision("lead_agent", 0.3, "free_text_in_lead_flow")
+
+        if _LEAD_INTENT.search(text):
+            if _NEGATION.search(text) or _QUESTION.match(text):
+                return RouteDecision("primary_assistant", 0.0, "negated_or_question")
+            # A bare keyword is too weak a signal on its own, e.g. "the new lead form is broken"
+            confidence = 0.95 if identifiers else 0.5
+            return RouteDecision("pre_router_handoff", confidence, "lead_creation_intent", identifiers)
+        return RouteDecision("primary_assistant", 0.0, "no_rule")
+
+    def route(self, state: dict) -> Literal["primary_assistant", "lead_agent", "pre_router_handoff"]:
+        """Conditional entry edge of the graph."""
+        decision = self.classify(state)
+        if decision.route == "primary_assistant" or decision.confidence < self.min_confidence:
+            self.stats.record("llm_fallbacks")
+            instrumentation.increment("pre_router_decisions_total", route="primary_assistant", rule=decision.rule)
+            return "primary_assistant"
+
+        logger.debug("Pre-router sent the turn to {} ({}, confidence {})", decision.route, decision.rule,
+                     decision.confidence)
+        # Either way the primary assistant's LLM call is skipped
+        self.stats.record("llm_calls_saved")
+        self.stats.record(decision.rule)
+        instrumentation.increment("pre_router_decisions_total", route=decision.route, rule=decision.rule)
+        instrumentation.increment("pre_router_llm_calls_saved_total")
+        return decision.route
+
+    def handoff(self, state: dict) -> dict:
+        """Node delegating to the lead agent the way the primary assistant would have."""
+        text = state["messages"][-1].content
+        identifiers = extract_identifiers(text)
+        # "unknown" is what the verification tool already treats as a missing value
+        args = {
+            "location": "unknown",
+            "name": "unknown",
+            "phone": identifiers.get("phone", "unknown"),
+            "email": identifiers.get("email", "unknown"),
+            "civilID": identifiers.get("civil_id", "unknown"),
+            "request": text[:500],
+        }
+        return {"messages": [AIMessage(content="", tool_calls=[
+            {"name": self.handoff_tool, "args": args, "id": f"call_{uuid.uuid4().hex[:24]}"}
+        ])]}
@@ -0,0 +1,152 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from loguru import logger
+from support_files.instrumentation import instrumentation
+from support_files.tool_execution import _clean_verification_inputs, verify_customer_existence
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _prefetch_executor() -> ThreadPoolExecutor:
+    """Process wide pool of the speculative verifications, created on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+    return _executor
+
+
+class PrefetchStats:
+    """Thread-safe counters of the prefetched verifications, e.g. `prefetch_stats.snapshot()["hits"]`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, event: str):
+        with self._lock:
+            self._counts[event] += 1
+        instrumentation.increment(f"verification_prefetch_{event}_total")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+prefetch_stats = PrefetchStats()
+
+
+def _thread_id(config: Optional[RunnableConfig]) -> Optional[str]:
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+
+class VerificationPrefetcher:
+    """
+    Start `customer_existence_verification` while the lead agent is still thinking.
+
+    The `Lead_assistant` hand-off already carries the customer's name, phone, email and civil ID,
+    so the entry node starts the verification in the background. When the lead agent then calls
+    the tool with the same arguments on the same thread, the tool node takes the prefetched
+    result instead of querying again. A prefetch is used at most once and only within `ttl`
+    seconds, anything else runs the tool as usual.
+    """
+
+    def __init__(self, verify: Callable[..., str] = verify_customer_existence,
+                 tool_name: str = "customer_existence_verification", ttl: float = 60.0,
+                 max_entries: int = 1024, stats: PrefetchStats = prefetch_stats):
+        """
+        Parameters:
+        - verify: Verification function taking name, email, phone and civil_id.
+        - tool_name: Name of the tool calls the prefetch answers.
+        - ttl: Seconds a prefetched result stays usable.
+        - max_entries: Prefetches kept at once, the oldest are dropped first.
+        - stats: Counters of the started, used and wasted prefetches.
+        """
+        self.verify = verify
+        self.tool_name = tool_name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _key(thread_id: str, name=None, email=None, phone=None, civil_id=None) -> Optional[tuple]:
+        cleaned = tuple(value.strip() if value else None
+                        for value in _clean_verification_inputs(name, email, phone, civil_id))
+        if not any(cleaned):
+            return None
+        return (thread_id, *cleaned)
+
+    def start(self, config: Optional[RunnableConfig], name: str = None, email: str = None,
+              phone: str = None, civil_id: str = None):
+        """Run the verification of these details in the background for the thread of `config`."""
+        thread_id = _thread_id(config)
+        key = self._key(thread_id, name, email, phone, civil_id) if thread_id else None
+        if key is None:
+            return
+        future = _prefetch_executor().submit(contextvars.copy_context().run, self.verify,
+                                             name=name, email=email, phone=phone, civil_id=civil_id)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), future)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self.stats.record("started")
+
+    def _take(self, call: dict, config: Optional[RunnableConfig]) -> Optional[Future]:
+        if call["name"] != self.tool_name:
+            return None
+        thread_id = _thread_id(config)
+        args = call.get("args") or {}
+        key = self._key(thread_id, args.get("name"), args.get("email"), args.get("phone"), args.get("civil_id"))
+        stale = []
+        with self._lock:
+            entry = self._entries.pop(key, None) if key else None
+            if entry is None:
+                # A prefetch of this thread with other details will not be asked for anymore
+                stale = [k for k in self._entries if k[0] == thread_id]
+                for k in stale:
+                    del self._entries[k]
+        if stale:
+            self.stats.record("discarded")
+        if entry is None:
+            self.stats.record("misses")
+            return None
+        started, future = entry
+        if time.monotonic() - started > self.ttl:
+            self.stats.record("expired")
+            return None
+        return future
+
+    def _message(self, call: dict, future: Future) -> Optional[ToolMessage]:
+        try:
+            content = future.result()
+        except Exception as e:
+            self.stats.record("errors")
+            logger.warning(f"Prefetched {self.tool_name} failed, running it again: {e}")
+            return None
+        self.stats.record("hits")
+        return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"])
+
+    def take(self, call: dict, config: Optional[RunnableConfig]) -> Optional[ToolMessage]:
+        """The prefetched answer to `call`, waiting for it when it is still running, None to run the tool."""
+        future = self._take(call, config)
+        return self._message(call, future) if future is not None else None
+
+    async def atake(self, call: dict, config: Optional[RunnableConfig]) -> Optional[ToolMessage]:
+        """Async version of `take`, awaiting a running prefetch without blocking the event loop."""
+        future = self._take(call, config)
+        if future is None:
+            return None
+        await asyncio.wait([asyncio.wrap_future(future)])
+        return self._message(call, future)
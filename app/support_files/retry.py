@@ -0,0 +1,185 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from groq import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from langchain_core.runnables import RunnableConfig
+from loguru import logger
+
+# Errors worth another attempt, everything else is raised at once
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+class RetryStats:
+    """Thread-safe counters of the LLM retries, e.g. `retry_stats.snapshot()["rate_limited"]`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, event: str, count: int = 1):
+        with self._lock:
+            self._counts[event] += count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+retry_stats = RetryStats()
+
+
+class RetryPolicy:
+    """
+    Bounded retry schedule with full jitter exponential backoff and an overall deadline.
+
+    The delay before attempt n is a random value in [0, min(max_delay, base_delay * 2 ** n)],
+    or the server's Retry-After when a rate limit response carries one. No attempt starts
+    once `deadline` seconds have passed since the first one.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 deadline: Optional[float] = 30.0):
+        """
+        Parameters:
+        - max_attempts: Maximum number of LLM calls for one turn, including the first one.
+        - base_delay: Backoff of the first retry, in seconds.
+        - max_delay: Upper bound of a single backoff, in seconds.
+        - deadline: Seconds after which no new attempt is started (optional).
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Seconds to wait before retrying after the failed `attempt` (0 based)."""
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def next_delay(self, attempt: int, started: float, error: Optional[Exception] = None) -> Optional[float]:
+        """Seconds to wait before the next attempt, None when no attempt is left or the deadline would be exceeded."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt, error)
+        if self.deadline is not None and time.monotonic() - started + delay >= self.deadline:
+            return None
+        return delay
+
+    def wait(self, attempt: int, started: float, error: Optional[Exception] = None) -> bool:
+        """
+        Sleep before the next attempt.
+
+        Returns:
+        - False when no attempt is left or the deadline would be exceeded.
+        """
+        delay = self.next_delay(attempt, started, error)
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return True
+
+    async def await_next(self, attempt: int, started: float, error: Optional[Exception] = None) -> bool:
+        """Async version of `wait`, yielding to the event loop while backing off."""
+        delay = self.next_delay(attempt, started, error)
+        if delay is None:
+            return False
+        await asyncio.sleep(delay)
+        return True
+
+
+def _retry_after(error: Optional[Exception]) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_empty_response(result) -> bool:
+    """True when the LLM returned neither tool calls nor text."""
+    return not result.tool_calls and (
+        not result.content
+        or isinstance(result.content, list)
+        and not result.content[0].get("text")
+    )
+
+
+def _retry_prompt(state: dict) -> dict:
+    # If the LLM happens to return an empty response, we will re-prompt it
+    # for an actual response.
+    return {**state, "messages": state["messages"] + [("user", "Respond with a real output.")]}
+
+
+def invoke_with_retry(runnable, state: dict, policy: RetryPolicy, name: str = "assistant",
+                      config: Optional[RunnableConfig] = None):
+    """
+    Invoke `runnable` on `state`, retrying empty responses and transient Groq errors.
+
+    An empty response is re-prompted with "Respond with a real output." appended once per attempt.
+    When every attempt is used up the last empty response is returned, the last error is raised.
+    `config` is passed on so the node's callbacks, e.g. token streaming, see the LLM call.
+    """
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        retry_stats.record("attempts")
+        try:
+            result = runnable.invoke(state, config)
+        except RETRYABLE_ERRORS as e:
+            retry_stats.record("rate_limited" if isinstance(e, RateLimitError) else "transient_errors")
+            if not policy.wait(attempt, started, e):
+                retry_stats.record("exhausted")
+                logger.error(f"{name} gave up after {attempt + 1} attempts: {e}")
+                raise
+            logger.warning(f"{name} attempt {attempt + 1} failed with {type(e).__name__}, retrying.")
+            attempt += 1
+            continue
+
+        if not is_empty_response(result):
+            return result
+
+        retry_stats.record("empty_responses")
+        if not policy.wait(attempt, started):
+            retry_stats.record("exhausted")
+            logger.error(f"{name} returned an empty response {attempt + 1} times, giving up.")
+            return result
+        state = _retry_prompt(state)
+        attempt += 1
+
+
+async def ainvoke_with_retry(runnable, state: dict, policy: RetryPolicy, name: str = "assistant",
+                             config: Optional[RunnableConfig] = None):
+    """Async version of `invoke_with_retry`, awaiting the LLM and the backoff."""
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        retry_stats.record("attempts")
+        try:
+            result = await runnable.ainvoke(state, config)
+        except RETRYABLE_ERRORS as e:
+            retry_stats.record("rate_limited" if isinstance(e, RateLimitError) else "transient_errors")
+            if not await policy.await_next(attempt, started, e):
+                retry_stats.record("exhausted")
+                logger.error(f"{name} gave up after {attempt + 1} attempts: {e}")
+                raise
+            logger.warning(f"{name} attempt {attempt + 1} failed with {type(e).__name__}, retrying.")
+            attempt += 1
+            continue
+
+        if not is_empty_response(result):
+            return result
+
+        retry_stats.record("empty_responses")
+        if not await policy.await_next(attempt, started):
+            retry_stats.record("exhausted")
+            logger.error(f"{name} returned an empty response {attempt + 1} times, giving up.")
+            return result
+        state = _retry_prompt(state)
+        attempt += 1
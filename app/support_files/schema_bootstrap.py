@@ -0,0 +1,109 @@
+import argparse
+import json
+from loguru import logger
+from support_files.cypher_queries import query_registry
+from support_files.graph_connection import Neo4jConnectionManager, graph_pool, test_graph_pool
+
+# name -> DDL, every statement is idempotent thanks to IF NOT EXISTS
+SCHEMA = {
+    # MERGE keys of customer_lead_creation
+    "customer_phone_number_unique": "CREATE CONSTRAINT customer_phone_number_unique IF NOT EXISTS "
+                                    "FOR (c:Customer) REQUIRE c.phone_number IS UNIQUE",
+    "lead_id_unique": "CREATE CONSTRAINT lead_id_unique IF NOT EXISTS FOR (l:Lead) REQUIRE l.id IS UNIQUE",
+    # identifier_lookup of customer_existence_verification
+    "lead_phone_number": "CREATE INDEX lead_phone_number IF NOT EXISTS FOR (l:Lead) ON (l.phone_number)",
+    "lead_civil_id": "CREATE INDEX lead_civil_id IF NOT EXISTS FOR (l:Lead) ON (l.civil_id)",
+    "lead_email": "CREATE INDEX lead_email IF NOT EXISTS FOR (l:Lead) ON (l.email)",
+    "model_name": "CREATE INDEX model_name IF NOT EXISTS FOR (m:Model) ON (m.name)",
+    # Case insensitive name search, the standard analyzer lower cases the tokens
+    "person_name_fulltext": "CREATE FULLTEXT INDEX person_name_fulltext IF NOT EXISTS "
+                            "FOR (n:Lead|Customer) ON EACH [n.name]",
+}
+
+_DUMMY = {"name": "x", "phone": "+10000000000", "civil_id": "000000000000", "email": "x@example.com",
+          "mobile": "+10000000000", "createdAt": "", "model": "x", "variant": "x", "rows": []}
+
+# Graph every registered query runs against
+_TARGETS = {"main": graph_pool, "test": test_graph_pool}
+
+_INDEX_OPERATORS = ("NodeIndexSeek", "NodeUniqueIndexSeek", "NodeIndexScan", "NodeIndexContainsScan",
+                    "NodeIndexEndsWithScan", "MultiNodeIndexSeek", "AssertingMultiNodeIndexSeek",
+                    "NodeIndexSeekByRange", "NodeUniqueIndexSeekByRange", "DirectedRelationshipIndexSeek")
+_SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan", "UnionNodeByLabelsScan", "IntersectionNodeByLabelsScan")
+
+
+def bootstrap(graph: Neo4jConnectionManager) -> dict:
+    """
+    Create the missing indexes and constraints.
+
+    Returns:
+    - `{name: "ok" | error message}` for every schema entry. A uniqueness constraint fails
+      when the existing data already holds duplicates, which is reported instead of raised.
+    """
+    results = {}
+    for name, statement in SCHEMA.items():
+        try:
+            graph.query(statement)
+            results[name] = "ok"
+        except Exception as e:
+            logger.error(f"Failed to create {name}: {e}")
+            results[name] = str(e)
+    return results
+
+
+def check(graph: Neo4jConnectionManager) -> dict:
+    """
+    Returns:
+    - `{name: state}` for every schema entry, "MISSING" when the index does not exist.
+    """
+    existing = {row["name"]: row["state"] for row in graph.query("SHOW INDEXES YIELD name, state")}
+    # Uniqueness constraints are backed by an index of the same name
+    return {name: existing.get(name, "MISSING") for name in SCHEMA}
+
+
+def _operators(plan: dict) -> list:
+    operators = [plan["operatorType"].split("@")[0]]
+    for child in plan.get("children", []):
+        operators.extend(_operators(child))
+    return operators
+
+
+def explain_coverage() -> dict:
+    """
+    Inspect the `EXPLAIN` plan of every query in the registry.
+
+    Returns:
+    - `{query: {"covered": bool, "index_operators": [...], "scan_operators": [...]}}`. A query
+      is covered when it reaches its nodes through an index and never scans a whole label.
+    """
+    coverage = {}
+    for query in query_registry:
+        name = query.name
+        try:
+            operators = _operators(_TARGETS[query.target].explain(query.text, _DUMMY))
+        except Exception as e:
+            coverage[name] = {"covered": False, "error": str(e)}
+            continue
+        index_operators = sorted({op for op in operators if op in _INDEX_OPERATORS})
+        scan_operators = sorted({op for op in operators if op in _SCAN_OPERATORS})
+        coverage[name] = {
+            "covered": bool(index_operators) and not scan_operators,
+            "index_operators": index_operators,
+            "scan_operators": scan_operators,
+        }
+    return coverage
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and check the indexes and constraints of the lead graph.")
+    parser.add_argument("--check-only", action="store_true", help="Only report, do not create anything.")
+    args = parser.parse_args()
+
+    report = {}
+    for target, graph in (("main", graph_pool), ("test", test_graph_pool)):
+        report[target] = {}
+        if not args.check_only:
+            report[target]["created"] = bootstrap(graph)
+        report[target]["indexes"] = check(graph)
+    report["coverage"] = explain_coverage()
+    print(json.dumps(report, indent=2))
@@ -1,16 +1,175 @@
+import asyncio
 from typing_extensions import Annotated, Optional
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from langchain_core.messages import ToolMessage
-from support_files.graph_connection import neo4j_connection, test_neo4j_connection
-from support_files.validation_functions import validate_email_address,validate_civil_id, validate_phone_number
-from support_files.cypher_queries import is_phone_number_exist_query, is_civil_id_exist_query, is_emaild_exist_query
-from pyjarowinkler import distance
-graph = neo4j_connection()
-test_graph = test_neo4j_connection()
-from datetime import datetime 
-
-@tool
-def customer_existence_verification(name: str = None, email: str = None, phone: str = None, civil_id: str = None):
+from support_files.graph_connection import graph_pool, test_graph_pool, async_graph_pool, async_test_graph_pool
+from support_files.validation_functions import check_email, check_civil_id, check_phone_number
+from support_files.cypher_queries import query_registry
+from support_files.name_index import NameIndex
+from support_files.instrumentation import instrumentation
+from support_files.identifier_cache import IDENTIFIER_COLUMNS, IDENTIFIER_KINDS, identifier_cache, normalize_identifier
+# Both connections are opened on their first query, not at import time
+graph = graph_pool
+test_graph = test_graph_pool
+async_graph = async_graph_pool
+async_test_graph = async_test_graph_pool
+from datetime import datetime
+
+
+def load_lead_names():
+    """Fetch every Lead id and name once to build the fuzzy name index."""
+    query = query_registry.run(graph, "all_lead_names")
+    return [(row['lead_id'], row['customer_name']) for row in query]
+
+# Built lazily on the first name only verification and updated on every lead creation
+lead_name_index = NameIndex(load_lead_names, threshold=0.86)
+
+
+def _clean_verification_inputs(name, email, phone, civil_id):
+    """Helper function to clean up attribute values."""
+    def get_value(attr):
+        return None if attr is None or attr.strip() == "" or "unknown" in attr.strip() else attr
+
+    return get_value(name), get_value(email), get_value(phone), get_value(civil_id)
+
+
+def _verification_error(name, email, phone, civil_id) -> Optional[str]:
+    """Return the message to send back when the inputs can not be verified, None otherwise."""
+    if not name and not email and not phone and not civil_id:
+        # Ensure at least one parameter is provided
+        return "Error: At least one of name, email, phone, or civil ID is required to verify customer existence."
+
+    # Validate the phone, email, and civil ID if provided, repeated identifiers are served from the validation cache
+    checks = ((phone, check_phone_number), (civil_id, check_civil_id), (email, check_email))
+    for value, check in checks:
+        if value:
+            result = check(value)
+            if not result.valid:
+                return f"Validation Error: {result.error}"
+
+    return None
+
+
+def _name_match_message(name: str) -> str:
+    """Verify only by name through the in-memory name index."""
+    with instrumentation.span("fuzzy_match_duration_seconds"):
+        name_matches = lead_name_index.find_similar(name)
+    if name_matches:
+        matched_names = ', '.join([i[0] for i in name_matches])
+        return (
+            f"The provided name is associated with the following customer(s): {matched_names}. "
+            "Would you like to proceed with one of these customers, or create a new lead?"
+        )
+    return (
+        f"No matching results found for the name '{name}'. Please review or confirm the provided details. "
+        "Would you like to create a new lead instead?"
+    )
+
+
+def _cached_identifiers(phone, civil_id, email) -> tuple:
+    """
+    Split the identifiers into `{kind: leads}` served by the identifier cache and `{kind: value}` to look up.
+
+    Returns:
+    - `(found, missing, generation)`, the cache generation to store the looked up leads with.
+    """
+    generation = identifier_cache.generation()
+    found, missing = {}, {}
+    for kind, value in (("phone", phone), ("civil_id", civil_id), ("email", email)):
+        value = normalize_identifier(value)
+        if value is None:
+            continue
+        leads = identifier_cache.get(kind, value)
+        if leads is None:
+            missing[kind] = value
+        else:
+            found[kind] = list(leads)
+    return found, missing, generation
+
+
+def _store_identifiers(found: dict, missing: dict, generation: int, rows: list) -> dict:
+    """Add the looked up leads to `found` and the cache, identifiers without a row are cached as misses."""
+    looked_up = {kind: [] for kind in missing}
+    for row in rows:
+        looked_up[row['identifier']].append({key: value for key, value in row.items() if key != 'identifier'})
+    for kind, leads in looked_up.items():
+        identifier_cache.put(kind, missing[kind], leads, generation)
+    return {**found, **looked_up}
+
+
+def lookup_identifiers(phone=None, civil_id=None, email=None) -> dict:
+    """
+    Leads holding each identifier, from the identifier cache or one query for the uncached ones.
+
+    Returns:
+    - `{kind: leads}` for every identifier provided, kind being "phone", "civil_id" or "email".
+    """
+    found, missing, generation = _cached_identifiers(phone, civil_id, email)
+    if not missing:
+        return found
+    params = {kind: missing.get(kind) for kind in IDENTIFIER_COLUMNS}
+    return _store_identifiers(found, missing, generation, query_registry.run(graph, "identifier_lookup", params))
+
+
+async def alookup_identifiers(phone=None, civil_id=None, email=None) -> dict:
+    """Async version of `lookup_identifiers`."""
+    found, missing, generation = _cached_identifiers(phone, civil_id, email)
+    if not missing:
+        return found
+    params = {kind: missing.get(kind) for kind in IDENTIFIER_COLUMNS}
+    return _store_identifiers(found, missing, generation,
+                              await query_registry.arun(async_graph, "identifier_lookup", params))
+
+
+def _exact_matches(name: str, leads_by_kind: dict) -> list:
+    """Leads named `name` holding every provided identifier, case insensitively."""
+    if not name:
+        return []
+    candidates = {lead['lead_id']: lead for leads in leads_by_kind.values() for lead in leads}
+    holders = [{lead['lead_id'] for lead in leads} for leads in leads_by_kind.values()]
+    return [
+        lead for lead_id, lead in candidates.items()
+        if (lead['lead_name'] or "").lower() == name.lower() and all(lead_id in ids for ids in holders)
+    ]
+
+
+def _collisions(leads_by_kind: dict) -> list:
+    """The first lead holding each identifier, in phone, civil ID, email order."""
+    collisions = []
+    for kind, query_type in IDENTIFIER_KINDS:
+        leads = leads_by_kind.get(kind)
+        if leads:
+            lead = leads[0]
+            collisions.append({'query_type': query_type, 'customer_name': lead['lead_name'],
+                               'phone_number': lead['phone_number'], 'email': lead['email'], 'civil_id': lead['civil_id']})
+    return collisions
+
+
+def _exact_match_message(verified_result: list) -> str:
+    customer_data = verified_result[0]
+    return (
+        f"A customer named '{customer_data['lead_name']}' already exists in our system "
+        f"with matching details (Phone: {customer_data['phone_number']}, Email: {customer_data['email']}, Civil ID: {customer_data['civil_id']}). "
+        "Would you like to proceed with this customer, or create a new lead?"
+    )
+
+
+def _collision_message(collisions: list, name: str) -> str:
+    if collisions:
+        customer_data = collisions[0]
+        query_type = customer_data['query_type']
+        return (
+            f"I have identified that the {query_type} you provided is associated with "
+            f"{customer_data['customer_name']}. Could you please confirm or provide the correct {query_type} "
+            f"for {name}?"
+        )
+    return (
+        "No matching records found for the provided details. "
+        "Would you like to proceed with creating a new lead?"
+    )
+
+
+def verify_customer_existence(name: str = None, email: str = None, phone: str = None, civil_id: str = None):
     """
     Verify the existence of the Customer in the database before lead creation.
 
@@ -23,188 +182,52 @@ def customer_existence_verification(name: str = None, email: str = None, phone:
     Returns:
     - Clear and actionable messages for the lead agent to understand the verification results.
     """
+    name, email, phone, civil_id = _clean_verification_inputs(name, email, phone, civil_id)
+    error = _verification_error(name, email, phone, civil_id)
+    if error:
+        return error
 
-    def get_value(attr):
-        """Helper function to clean up attribute values."""
-        return None if attr is None or attr.strip() == "" or "unknown" in attr.strip() else attr
+    if name and all(param is None for param in (phone, civil_id, email)):
+        return _name_match_message(name)
 
-    # Clean inputs
-    name = get_value(name)
-    email = get_value(email)
-    phone = get_value(phone)
-    civil_id = get_value(civil_id)
+    # Leads holding any of the identifiers, identifiers checked recently are served from the cache
+    leads_by_kind = lookup_identifiers(phone, civil_id, email)
+    verified_result = _exact_matches(name, leads_by_kind)
+    if verified_result:
+        return _exact_match_message(verified_result)
 
-    if not name and not email and not phone and not civil_id:
-        # Ensure at least one parameter is provided
-        return "Error: At least one of name, email, phone, or civil ID is required to verify customer existence."
+    # Handle semi-verified results with the first lead holding each identifier
+    return _collision_message(_collisions(leads_by_kind), name)
 
-    def validation():
-        """Validate the phone, email, and civil ID if provided."""
-        if phone:
-            phone_validation = validate_phone_number(phone)
-            if phone_validation is not True:
-                return phone_validation
-
-        if civil_id:
-            civil_validation = validate_civil_id(civil_id)
-            if civil_validation is not True:
-                return civil_validation
-
-        if email:
-            email_validation = validate_email_address(email)
-            if email_validation is not True:
-                return email_validation
-
-        return True
-
-    validated = validation()
-
-    if validated == True:
-        query = graph.query("""MATCH (c:Lead) RETURN c.name AS customer_name""")
-        names_list = [name['customer_name'] for name in query]
-
-        def split_names(names):
-            """Split full names into first and last for better matching."""
-            return [name.split(' ', 1) if ' ' in name else [name] for name in names]
-
-        names_list = split_names(names_list)
-
-        def find_similar_names(input_name, names_list, threshold=0.86):
-            """Find similar names in the database based on Jaro-Winkler similarity."""
-            similar_names = []
-            for name in names_list:
-                full_name = ' '.join(name) if isinstance(name, list) else name
-                similarity = distance.get_jaro_distance(input_name, full_name)
-                if similarity >= threshold:
-                    similar_names.append((full_name, similarity))
-            return similar_names
-
-        if name and all(param is None for param in (phone, civil_id, email)):
-            # Verify only by name
-            name_matches = find_similar_names(name, names_list)
-            if name_matches:
-                matched_names = ', '.join([i[0] for i in name_matches])
-                return (
-                    f"The provided name is associated with the following customer(s): {matched_names}. "
-                    "Would you like to proceed with one of these customers, or create a new lead?"
-                )
-            else:
-                return (
-                    f"No matching results found for the name '{name}'. Please review or confirm the provided details. "
-                    "Would you like to create a new lead instead?"
-                )
 
-        else:
-            # Create query with dynamic conditions based on provided data
-            query = """
-            MATCH (l:Lead)
-            WHERE toLower(l.name) = toLower($name)
-            """
-            conditions = []
-            if phone:
-                conditions.append("l.phone_number = $phone")
-            if civil_id:
-                conditions.append("l.civil_id = $civil_id")
-            if email:
-                conditions.append("l.email = $email")
-
-            if conditions:
-                query += " AND " + " AND ".join(conditions)
-
-            query += """
-            RETURN l.name AS lead_name, l.phone_number AS phone_number, l.civil_id AS civil_id, l.email AS email, l.id AS lead_id
-            """
-
-            # Run the query and check if a customer exists with the provided details
-            verified_result = graph.query(query, {
-                'name': name,
-                'phone': phone,
-                'civil_id': civil_id,
-                'email': email
-            })
-
-            if verified_result:
-                customer_data = verified_result[0]
-                return (
-                    f"A customer named '{customer_data['lead_name']}' already exists in our system "
-                    f"with matching details (Phone: {customer_data['phone_number']}, Email: {customer_data['email']}, Civil ID: {customer_data['civil_id']}). "
-                    "Would you like to proceed with this customer, or create a new lead?"
-                )
-            else:
-                # Handle semi-verified results by running individual queries for each identifier
-                cypher_queries = []
-                if phone:
-                    phone_query = """
-                    MATCH (c:Lead)
-                    WHERE c.phone_number = $phone 
-                    RETURN c.name AS customer_name, c.phone_number AS phone_number, c.email AS email, c.civil_id AS civil_id
-                    """
-                    cypher_queries.append(("phone number", phone_query))
-
-                if civil_id:
-                    civil_id_query = """
-                    MATCH (c:Lead) 
-                    WHERE c.civil_id = $civil_id 
-                    RETURN c.name AS customer_name, c.phone_number AS phone_number, c.email AS email, c.civil_id AS civil_id
-                    """
-                    cypher_queries.append(("civil ID", civil_id_query))
-
-                if email:
-                    email_query = """
-                    MATCH (c:Lead) 
-                    WHERE c.email = $email 
-                    RETURN c.name AS customer_name, c.phone_number AS phone_number, c.email AS email, c.civil_id AS civil_id
-                    """
-                    cypher_queries.append(("email", email_query))
-
-                # Run each individual query for partial verification
-                for query_type, query in cypher_queries:
-                    db_result = graph.query(query, {
-                        'name': name,
-                        'phone': phone,
-                        'civil_id': civil_id,
-                        'email': email
-                    })
-
-                    if db_result:
-                        customer_data = db_result[0]
-                        return (
-                            f"I have identified that the {query_type} you provided is associated with "
-                            f"{customer_data['customer_name']}. Could you please confirm or provide the correct {query_type} "
-                            f"for {name}?"
-                        )
-
-                return (
-                    "No matching records found for the provided details. "
-                    "Would you like to proceed with creating a new lead?"
-                )
-    else:
-        # Return the validation error message
-        return f"Validation Error: {validated}"
-
-
-@tool
-def customer_lead_creation(name    : Annotated[str,"Customer name in lower case"],
-                           phone   : Annotated[str,"Customer phone number in 10 digits"],
-                           civil_id: Annotated[str,"Customer civil ID in 12 digits"],
-                           email   : Annotated[str,"Customer email address"],
-                           model   : Annotated[str,"Car model"],
-                           variant : Annotated[str,"Car variant"]) -> str:
-    """
-    Creates a lead and links it to a customer in the Neo4j database.
+async def averify_customer_existence(name: str = None, email: str = None, phone: str = None, civil_id: str = None):
+    """Async version of `verify_customer_existence`, awaiting Neo4j through the async driver."""
+    name, email, phone, civil_id = _clean_verification_inputs(name, email, phone, civil_id)
+    error = _verification_error(name, email, phone, civil_id)
+    if error:
+        return error
 
-    Parameters:
-    - name: Customer's name (mandatory).
-    - phone: Customer's phone number (mandatory).
-    - civil_id: Customer's civil ID (mandatory).
-    - email: Customer's email (mandatory).
-    - model: The car model the customer is interested in (mandatory).
-    - variant: The car variant (mandatory).
+    if name and all(param is None for param in (phone, civil_id, email)):
+        # The index may have to load the names on first use, keep that off the event loop
+        return await asyncio.to_thread(_name_match_message, name)
 
-    Returns:
-    - A message confirming lead creation or an error message.
-    """
-    
+    leads_by_kind = await alookup_identifiers(phone, civil_id, email)
+    verified_result = _exact_matches(name, leads_by_kind)
+    if verified_result:
+        return _exact_match_message(verified_result)
+
+    return _collision_message(_collisions(leads_by_kind), name)
+
+
+customer_existence_verification = StructuredTool.from_function(
+    func=verify_customer_existence,
+    coroutine=averify_customer_existence,
+    name="customer_existence_verification",
+)
+
+
+def lead_creation_error(name, phone, civil_id, email, model, variant) -> Optional[str]:
+    """Return the message to send back when the lead can not be created, None otherwise."""
     # Helper function to handle null/empty strings
     def get_value(attr):
         return None if attr is None or attr.strip() == "" else attr
@@ -231,42 +254,19 @@ def customer_lead_creation(name    : Annotated[str,"Customer name in lower case"
             "Please ask the user to provide the missing information."
         )
 
-    # Validate email, phone, and civil ID
-    if not validate_email_address(email):
+    # Validate email, phone, and civil ID, usually already cached by the verification step
+    if not check_email(email).valid:
         return "Error: Invalid email address. Please provide a valid email."
-    if not validate_phone_number(phone):
+    if not check_phone_number(phone).valid:
         return "Error: Invalid phone number. Please provide a valid phone number."
-    if not validate_civil_id(civil_id):
+    if not check_civil_id(civil_id).valid:
         return "Error: Invalid civil ID. Please provide a valid civil ID."
 
-    # Proceed with creating the lead
-    query = """
-        MERGE (l:Customer {phone_number: $mobile})
-        ON CREATE SET l.createdAt = $createdAt,
-                      l.id = apoc.create.uuid()
-        SET l.name = $name,
-            l.email = $email,
-            l.model = $model,
-            l.variant = $variant,
-            l.civil_id = $civil_id
-        
-        WITH l
-        MERGE (c:Lead {id: l.id})
-        ON CREATE SET c.createdAt = $createdAt
-        SET c.name = $name, 
-            c.phone_number = $mobile, 
-            c.email = $email, 
-            c.model = $model,
-            c.variant = $variant,
-            c.level = "High"
-        MERGE (l)-[:CUSTOMER_OF_LEAD]->(c)
-        
-        WITH c
-        MATCH (m:Model {name: $model})
-        MERGE (c)-[:PREFERENCE]->(m)
-    """
-    
-    params = {
+    return None
+
+
+def lead_creation_params(name, phone, civil_id, email, model, variant) -> dict:
+    return {
         "name": name.capitalize(),
         "mobile": phone,
         "email": email,
@@ -276,23 +276,84 @@ def customer_lead_creation(name    : Annotated[str,"Customer name in lower case"
         "civil_id": civil_id
     }
 
+
+def _lead_created_message(result: list, params: dict) -> str:
+    for row in result:
+        lead_name_index.upsert(row['lead_id'], row['lead_name'])
+    # Write-through, the next verification of these identifiers must see the new lead
+    identifier_cache.invalidate_lead(params)
+
+    # Return success message with lead details
+    return (
+        f"Lead successfully created for {params['name']}.\n"
+        f"Customer Info:\n"
+        f"Name: {params['name']}\n"
+        f"Phone: {params['mobile']}\n"
+        f"Email: {params['email']}\n"
+        f"Model: {params['model']} (Variant: {params['variant']})\n"
+        f"Civil ID: {params['civil_id']}\n"
+        f"Lead Level: High\n"
+        f"Created At: {params['createdAt']}"
+    )
+
+
+def create_customer_lead(name    : Annotated[str,"Customer name in lower case"],
+                         phone   : Annotated[str,"Customer phone number in 10 digits"],
+                         civil_id: Annotated[str,"Customer civil ID in 12 digits"],
+                         email   : Annotated[str,"Customer email address"],
+                         model   : Annotated[str,"Car model"],
+                         variant : Annotated[str,"Car variant"]) -> str:
+    """
+    Creates a lead and links it to a customer in the Neo4j database.
+
+    Parameters:
+    - name: Customer's name (mandatory).
+    - phone: Customer's phone number (mandatory).
+    - civil_id: Customer's civil ID (mandatory).
+    - email: Customer's email (mandatory).
+    - model: The car model the customer is interested in (mandatory).
+    - variant: The car variant (mandatory).
+
+    Returns:
+    - A message confirming lead creation or an error message.
+    """
+    error = lead_creation_error(name, phone, civil_id, email, model, variant)
+    if error:
+        return error
+
+    params = lead_creation_params(name, phone, civil_id, email, model, variant)
     try:
         # Execute the query on the Neo4j database
-        test_graph.query(query, params)
-
-        # Return success message with lead details
-        return (
-            f"Lead successfully created for {name.capitalize()}.\n"
-            f"Customer Info:\n"
-            f"Name: {name.capitalize()}\n"
-            f"Phone: {phone}\n"
-            f"Email: {email}\n"
-            f"Model: {model} (Variant: {variant})\n"
-            f"Civil ID: {civil_id}\n"
-            f"Lead Level: High\n"
-            f"Created At: {params['createdAt']}"
-        )
+        result = query_registry.run(test_graph, "lead_creation", params)
+        return _lead_created_message(result, params)
 
     except Exception as e:
         # Catch any exceptions during the database operation and return an error message
         return f"Error: Failed to create lead due to: {str(e)}."
+
+
+async def acreate_customer_lead(name    : Annotated[str,"Customer name in lower case"],
+                                phone   : Annotated[str,"Customer phone number in 10 digits"],
+                                civil_id: Annotated[str,"Customer civil ID in 12 digits"],
+                                email   : Annotated[str,"Customer email address"],
+                                model   : Annotated[str,"Car model"],
+                                variant : Annotated[str,"Car variant"]) -> str:
+    """Async version of `create_customer_lead`, awaiting Neo4j through the async driver."""
+    error = lead_creation_error(name, phone, civil_id, email, model, variant)
+    if error:
+        return error
+
+    params = lead_creation_params(name, phone, civil_id, email, model, variant)
+    try:
+        result = await query_registry.arun(async_test_graph, "lead_creation", params)
+        return _lead_created_message(result, params)
+
+    except Exception as e:
+        return f"Error: Failed to create lead due to: {str(e)}."
+
+
+customer_lead_creation = StructuredTool.from_function(
+    func=create_customer_lead,
+    coroutine=acreate_customer_lead,
+    name="customer_lead_creation",
+)
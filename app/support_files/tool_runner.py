@@ -0,0 +1,150 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from loguru import logger
+
+# Tool calls running at the same time, per node and across the process for the sync path
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", 8))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _tool_executor() -> ThreadPoolExecutor:
+    """Process wide pool of the sync tool calls, created on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool-call")
+    return _executor
+
+
+def tool_error_message(call: dict, error: Exception) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: {repr(error)}\n please fix your mistakes.",
+        name=call["name"],
+        tool_call_id=call["id"],
+    )
+
+
+class ParallelToolNode:
+    """
+    Execute the tool calls of the last AI message, independent read-only calls concurrently.
+
+    `parallel_tools` only read, so all of their calls run at once on a bounded executor.
+    `sequential_tools` write and run one at a time after them, in the order the model asked
+    for them, so a batch that verifies a customer and creates the lead sees the state before the
+    write. The results come back in the order of the tool calls, unknown tools and failing calls
+    are answered with an error message instead of failing the whole batch.
+    """
+
+    def __init__(self, parallel_tools: list, sequential_tools: Optional[list] = None,
+                 max_workers: int = TOOL_MAX_WORKERS, prefetcher=None):
+        """
+        Parameters:
+        - parallel_tools: Tools without side effects.
+        - sequential_tools: Tools with side effects (optional).
+        - max_workers: Tool calls of one batch running at the same time.
+        - prefetcher: Answers calls already run in the background, e.g. a `VerificationPrefetcher` (optional).
+        """
+        self.parallel_tools = {tool.name: tool for tool in parallel_tools}
+        self.sequential_tools = {tool.name: tool for tool in sequential_tools or []}
+        self.max_workers = max_workers
+        self.prefetcher = prefetcher
+
+    @staticmethod
+    def _pending_calls(messages: list) -> list:
+        """Tool calls of the last AI message without a ToolMessage yet."""
+        for index in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[index], AIMessage):
+                answered = {m.tool_call_id for m in messages[index + 1:] if isinstance(m, ToolMessage)}
+                return [call for call in messages[index].tool_calls if call["id"] not in answered]
+        return []
+
+    def _tool(self, call: dict):
+        return self.parallel_tools.get(call["name"]) or self.sequential_tools.get(call["name"])
+
+    def _unknown(self, call: dict) -> ToolMessage:
+        known = ", ".join(list(self.parallel_tools) + list(self.sequential_tools))
+        return ToolMessage(
+            content=f"Error: {call['name']} is not a valid tool, try one of [{known}].",
+            name=call["name"],
+            tool_call_id=call["id"],
+        )
+
+    def _run_one(self, call: dict, config: RunnableConfig) -> ToolMessage:
+        if self.prefetcher is not None:
+            prefetched = self.prefetcher.take(call, config)
+            if prefetched is not None:
+                return prefetched
+        try:
+            return self._tool(call).invoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            logger.warning(f"Tool {call['name']} failed: {e}")
+            return tool_error_message(call, e)
+
+    async def _arun_one(self, call: dict, config: RunnableConfig) -> ToolMessage:
+        if self.prefetcher is not None:
+            prefetched = await self.prefetcher.atake(call, config)
+            if prefetched is not None:
+                return prefetched
+        try:
+            return await self._tool(call).ainvoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            logger.warning(f"Tool {call['name']} failed: {e}")
+            return tool_error_message(call, e)
+
+    def _split(self, calls: list) -> tuple:
+        results, parallel, sequential = {}, [], []
+        for call in calls:
+            if call["name"] in self.parallel_tools:
+                parallel.append(call)
+            elif call["name"] in self.sequential_tools:
+                sequential.append(call)
+            else:
+                results[call["id"]] = self._unknown(call)
+        return results, parallel, sequential
+
+    def __call__(self, state: dict, config: RunnableConfig) -> dict:
+        calls = self._pending_calls(state["messages"])
+        results, parallel, sequential = self._split(calls)
+        if len(parallel) == 1:
+            results[parallel[0]["id"]] = self._run_one(parallel[0], config)
+        elif parallel:
+            executor = _tool_executor()
+            # Batches larger than max_workers run in waves
+            for start in range(0, len(parallel), self.max_workers):
+                wave = parallel[start:start + self.max_workers]
+                # Every task gets its own copy of the context, which carries the callbacks
+                futures = [executor.submit(contextvars.copy_context().run, self._run_one, call, config) for call in wave]
+                for call, future in zip(wave, futures):
+                    results[call["id"]] = future.result()
+        for call in sequential:
+            results[call["id"]] = self._run_one(call, config)
+        return {"messages": [results[call["id"]] for call in calls]}
+
+    async def acall(self, state: dict, config: RunnableConfig) -> dict:
+        """Async version of `__call__`, the parallel calls are bounded by a semaphore instead of the executor."""
+        calls = self._pending_calls(state["messages"])
+        results, parallel, sequential = self._split(calls)
+        slots = asyncio.Semaphore(self.max_workers)
+
+        async def bounded(call: dict) -> ToolMessage:
+            async with slots:
+                return await self._arun_one(call, config)
+
+        for call, message in zip(parallel, await asyncio.gather(*(bounded(call) for call in parallel))):
+            results[call["id"]] = message
+        for call in sequential:
+            results[call["id"]] = await self._arun_one(call, config)
+        return {"messages": [results[call["id"]] for call in calls]}
+
+    def as_node(self, name: Optional[str] = None) -> Runnable:
+        """Graph node running `__call__` under invoke/stream and `acall` under ainvoke/astream."""
+        return RunnableLambda(self, afunc=self.acall, name=name)
@@ -1,45 +1,146 @@
 import phonenumbers
-from email_validator import validate_email, EmailNotValidError
+from email_validator import validate_email, EmailNotValidError, EmailUndeliverableError
 from phonenumbers import NumberParseException, is_valid_number
+from functools import lru_cache
+from typing import NamedTuple, Optional
 import re
 
-def validate_email_address(email):
-    """
-    Validate the email address format and provide feedback to the lead agent.
-    """
+# Distinct identifiers remembered per validator, lru_cache is thread-safe and bounded
+VALIDATION_CACHE_SIZE = 4096
+
+
+class ValidationResult(NamedTuple):
+    """Outcome of an identifier check: E.164 phone number or canonical email when valid, the feedback otherwise."""
+    valid: bool
+    normalized: Optional[str] = None
+    error: Optional[str] = None
+
+    def feedback(self):
+        """True when valid, the error message otherwise, as returned by the `validate_*` functions."""
+        return True if self.valid else self.error
+
+
+class _NotCached(Exception):
+    """Raised by a memoized check to return a result lru_cache must not remember."""
+
+    def __init__(self, result: ValidationResult):
+        super().__init__(result.error)
+        self.result = result
+
+
+def normalize_phone_key(number: str) -> str:
+    """The number without the spaces or hyphens it may contain after the leading character."""
+    return number[:1] + number[1:].replace(" ", "").replace("-", "")
+
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _check_email(email: str) -> ValidationResult:
     try:
         valid = validate_email(email)
-        email = valid.email
-        return True
-    except EmailNotValidError as e:
-        return f"The email address '{email}' is invalid. Please verify and provide a correct email address format."
+    except EmailUndeliverableError:
+        # The DNS lookup failed or its answer may change, the next check looks the domain up again
+        raise _NotCached(ValidationResult(False, error=f"The email address '{email}' is invalid. Please verify and provide a correct email address format."))
+    except EmailNotValidError:
+        return ValidationResult(False, error=f"The email address '{email}' is invalid. Please verify and provide a correct email address format.")
+    result = ValidationResult(True, valid.email)
+    # Without mail servers the address was only accepted because the DNS lookup timed out or got no answer
+    if not getattr(valid, "mx", None):
+        raise _NotCached(result)
+    return result
 
-def validate_phone_number(number: str):
-    """
-    Validate the phone number format including the country code and provide feedback to the lead agent.
-    """
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _check_phone_number(number: str) -> ValidationResult:
+    # The errors name the number as {number}, `check_phone_number` fills in the number the user typed
     if not number.startswith('+'):
-        return "The phone number must include the country code (e.g., +1 for the US). Please provide the correct format."
+        return ValidationResult(False, error="The phone number must include the country code (e.g., +1 for the US). Please provide the correct format.")
 
-    if not number[1:].replace("-", "").replace(" ", "").isdigit():
-        return "The phone number contains invalid characters. Ensure that it only contains digits, spaces, or hyphens after the country code."
+    if not number[1:].isdigit():
+        return ValidationResult(False, error="The phone number contains invalid characters. Ensure that it only contains digits, spaces, or hyphens after the country code.")
 
     try:
         phone_number = phonenumbers.parse(number)
         if is_valid_number(phone_number):
-            return True
+            return ValidationResult(True, phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164))
         else:
-            return f"The phone number '{number}' is not valid. Please double-check the number and try again."
+            return ValidationResult(False, error="The phone number '{number}' is not valid. Please double-check the number and try again.")
     except NumberParseException:
-        return f"An error occurred while validating the phone number '{number}'. Please verify that it is in the correct international format."
+        return ValidationResult(False, error="An error occurred while validating the phone number '{number}'. Please verify that it is in the correct international format.")
 
-def validate_civil_id(civil_id):
-    """
-    Validate the Civil ID format and provide feedback to the lead agent.
-    """
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _check_civil_id(civil_id: str) -> ValidationResult:
     civil_id_regex = r'^\d{12}$'
 
     if re.fullmatch(civil_id_regex, civil_id):
-        return True
+        return ValidationResult(True, civil_id)
     else:
-        return f"The Civil ID '{civil_id}' is invalid. A valid Civil ID should contain exactly 12 digits with no other characters."
+        return ValidationResult(False, error=f"The Civil ID '{civil_id}' is invalid. A valid Civil ID should contain exactly 12 digits with no other characters.")
+
+
+def check_email(email: str) -> ValidationResult:
+    """
+    Validate the email address format and the deliverability of its domain, memoized on the address.
+    Results that depend on the DNS lookup are never memoized.
+    """
+    try:
+        return _check_email(email)
+    except _NotCached as uncached:
+        return uncached.result
+
+
+def check_email_syntax(email: str) -> ValidationResult:
+    """
+    Validate the email address format only, without the DNS lookup of `check_email`, for the hot paths
+    that only need to recognize an address.
+    """
+    try:
+        valid = validate_email(email, check_deliverability=False)
+        return ValidationResult(True, valid.email)
+    except EmailNotValidError:
+        return ValidationResult(False, error=f"The email address '{email}' is invalid. Please verify and provide a correct email address format.")
+
+
+def check_phone_number(number: str) -> ValidationResult:
+    """
+    Validate the phone number format including the country code, memoized on the number without spaces or hyphens.
+    """
+    result = _check_phone_number(normalize_phone_key(number))
+    if result.error:
+        result = result._replace(error=result.error.replace("{number}", number))
+    return result
+
+
+def check_civil_id(civil_id: str) -> ValidationResult:
+    """
+    Validate the Civil ID format, memoized on the ID.
+    """
+    return _check_civil_id(civil_id)
+
+
+def validation_cache_info() -> dict:
+    """Hit and miss statistics of every validation cache."""
+    return {
+        "email": _check_email.cache_info(),
+        "phone_number": _check_phone_number.cache_info(),
+        "civil_id": _check_civil_id.cache_info(),
+    }
+
+
+def validate_email_address(email):
+    """
+    Validate the email address format and provide feedback to the lead agent.
+    """
+    return check_email(email).feedback()
+
+def validate_phone_number(number: str):
+    """
+    Validate the phone number format including the country code and provide feedback to the lead agent.
+    """
+    return check_phone_number(number).feedback()
+
+def validate_civil_id(civil_id):
+    """
+    Validate the Civil ID format and provide feedback to the lead agent.
+    """
+    return check_civil_id(civil_id).feedback()
@@ -0,0 +1,113 @@
+import json
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("loguru")
+pytest.importorskip("neo4j")
+email_validator = pytest.importorskip("email_validator")
+
+from support_files import bulk_ingestion
+from support_files.bulk_ingestion import ingest_leads, read_records
+from support_files.cypher_queries import query_registry
+from support_files.identifier_cache import IdentifierCache
+
+
+class _Graph:
+    """Records every write transaction, raising for the batches whose number is in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.writes = []
+
+    def execute_write(self, query: str, params: dict) -> list:
+        self.writes.append((query, params))
+        if len(self.writes) in self.failing:
+            raise ConnectionError("Neo4j unavailable")
+        return [{"lead_id": f"id-{row['mobile']}", "lead_name": row["name"]} for row in params["rows"]]
+
+
+class _NameIndex:
+    def __init__(self):
+        self.upserts = []
+
+    def upsert(self, lead_id, name):
+        self.upserts.append((lead_id, name))
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    # No DNS lookups for the email domains, fresh caches so the tests can look at them
+    monkeypatch.setattr(email_validator, "CHECK_DELIVERABILITY", False)
+    monkeypatch.setattr(bulk_ingestion, "identifier_cache", IdentifierCache())
+    monkeypatch.setattr(bulk_ingestion, "lead_name_index", _NameIndex())
+
+
+def _record(index: int, **overrides) -> dict:
+    return {"name": f"customer {index}", "phone": f"+9655000{index:04d}", "civil_id": f"29001010{index:04d}",
+            "email": f"customer{index}@example.com", "model": "creta", "variant": "sx", **overrides}
+
+
+def _records(*records) -> list:
+    return list(enumerate(records, start=1))
+
+
+def test_valid_records_are_written_in_batches():
+    graph = _Graph()
+    report = ingest_leads(_records(*(_record(index) for index in range(7))), graph=graph, batch_size=3, workers=2)
+    assert [len(params["rows"]) for _, params in graph.writes] == [3, 3, 1]
+    assert all(query == query_registry["bulk_lead_creation"].text for query, _ in graph.writes)
+    assert report.summary()["read"] == 7 and report.written == 7 and report.errors == []
+    assert len(bulk_ingestion.lead_name_index.upserts) == 7
+
+
+def test_unwind_rows_hold_the_lead_creation_parameters():
+    graph = _Graph()
+    ingest_leads(_records({"customer_name": "john", "mobile": "+96550000000", "civilID": "290010100000",
+                           "email_address": "john@example.com", "car_model": "creta", "car_variant": "sx"}),
+                 graph=graph)
+    (row,) = graph.writes[0][1]["rows"]
+    assert set(row) == {"name", "mobile", "civil_id", "email", "model", "variant", "createdAt"}
+    assert {key: value for key, value in row.items() if key != "createdAt"} == {
+        "name": "John", "mobile": "+96550000000", "civil_id": "290010100000", "email": "john@example.com",
+        "model": "creta", "variant": "sx"}
+
+
+def test_invalid_records_are_reported_and_left_out():
+    graph = _Graph()
+    records = _records(_record(1), _record(2, civil_id="123"), _record(3, phone=None), ValueError("bad json"),
+                       ["not", "an", "object"], _record(4))
+    report = ingest_leads(records, graph=graph, batch_size=10)
+    assert [row["mobile"] for row in graph.writes[0][1]["rows"]] == ["+96550000001", "+96550000004"]
+    assert [line for line, _ in report.errors] == [2, 3, 4, 5]
+    assert report.errors[0][1].startswith("Error: Invalid civil ID")
+    assert "Phone number" in report.errors[1][1]
+    assert report.read == 6 and report.written == 2
+
+
+def test_a_failed_batch_is_reported_and_the_others_are_written():
+    graph = _Graph(failing={2})
+    cache = bulk_ingestion.identifier_cache
+    cache.put("phone", "+96550000000", [])
+    cache.put("phone", "+96550000002", [])
+    report = ingest_leads(_records(*(_record(index) for index in range(5))), graph=graph, batch_size=2)
+
+    assert len(graph.writes) == 3
+    assert report.written == 3
+    assert report.errors == [(3, "Error: Failed to create lead due to: Neo4j unavailable."),
+                             (4, "Error: Failed to create lead due to: Neo4j unavailable.")]
+    # Only the written leads are invalidated and indexed
+    assert cache.get("phone", "+96550000000") is None
+    assert cache.get("phone", "+96550000002") == ()
+    assert [name for _, name in bulk_ingestion.lead_name_index.upserts] == ["Customer 0", "Customer 1", "Customer 4"]
+
+
+def test_records_are_read_with_their_line_numbers(tmp_path):
+    jsonl = tmp_path / "leads.jsonl"
+    jsonl.write_text(json.dumps(_record(1)) + "\n\n{broken\n")
+    (first, second) = list(read_records(str(jsonl)))
+    assert first == (1, _record(1))
+    assert second[0] == 3 and isinstance(second[1], json.JSONDecodeError)
+
+    csv_file = tmp_path / "leads.csv"
+    csv_file.write_text("name,phone\njohn,+96550000000\nmary,+96550000001\n")
+    assert [(line, row["name"]) for line, row in read_records(str(csv_file))] == [(2, "john"), (3, "mary")]
@@ -0,0 +1,68 @@
+import datetime
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langgraph")
+pytest.importorskip("msgpack")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pydantic import BaseModel
+from support_files.checkpoint_codec import MessageDeltaCodec
+from support_files.checkpointer import BoundedSqliteSaver
+
+
+class _Quote(BaseModel):
+    model: str
+    price: float
+
+
+def _checkpoint(checkpoint_id: str, messages: list) -> dict:
+    return {"v": 1, "id": checkpoint_id, "ts": "2026-01-01T00:00:00+00:00", "channel_values": {"messages": messages},
+            "channel_versions": {}, "versions_seen": {}, "pending_sends": []}
+
+
+def _round_trip(codec: MessageDeltaCodec, checkpoint: dict, stored: dict = None) -> tuple:
+    serde = JsonPlusSerializer()
+    type_, blob, new_messages = codec.encode("thread", "", checkpoint, serde.dumps_typed)
+    stored = {} if stored is None else stored
+    stored.update(new_messages)
+    return codec.decode(blob, serde.loads_typed, lambda hashes: {h: stored[h] for h in hashes if h in stored}), new_messages
+
+
+def test_messages_keep_their_values_types():
+    sent_at = datetime.datetime(2026, 1, 1, 12, 30, tzinfo=datetime.timezone.utc)
+    message = AIMessage(content="quote", additional_kwargs={"sent_at": sent_at, "quote": _Quote(model="creta", price=1.5)})
+    decoded, _ = _round_trip(MessageDeltaCodec(), _checkpoint("1", [HumanMessage(content="hi"), message]))
+    kwargs = decoded["channel_values"]["messages"][1].additional_kwargs
+    assert kwargs["sent_at"] == sent_at
+    assert kwargs["quote"] == _Quote(model="creta", price=1.5)
+
+
+def test_messages_are_stored_once_per_thread():
+    codec, stored = MessageDeltaCodec(), {}
+    first, second = HumanMessage(content="hi"), AIMessage(content="hello")
+    _, new_messages = _round_trip(codec, _checkpoint("1", [first]), stored)
+    assert len(new_messages) == 1
+    decoded, new_messages = _round_trip(codec, _checkpoint("2", [first, second]), stored)
+    assert len(new_messages) == 1
+    assert [m.content for m in decoded["channel_values"]["messages"]] == ["hi", "hello"]
+
+
+def test_trimmed_checkpoints_take_their_messages_along(tmp_path):
+    saver = BoundedSqliteSaver(str(tmp_path / "checkpoints.sqlite"), max_checkpoints_per_thread=2,
+                               flush_interval=3600, codec=MessageDeltaCodec())
+    config = {"configurable": {"thread_id": "thread", "checkpoint_ns": ""}}
+    try:
+        for checkpoint_id, content in (("1", "one"), ("2", "two"), ("3", "three")):
+            saver.put(config, _checkpoint(checkpoint_id, [HumanMessage(content=content)]), {}, {})
+        saver.flush()
+        assert saver._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 2
+
+        # A message deleted with its checkpoint is stored again when it comes back
+        saver.put(config, _checkpoint("4", [HumanMessage(content="one")]), {}, {})
+        latest = saver.get_tuple(config)
+        assert [m.content for m in latest.checkpoint["channel_values"]["messages"]] == ["one"]
+        assert saver._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 2
+    finally:
+        saver.close()
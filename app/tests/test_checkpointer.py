@@ -0,0 +1,108 @@
+import sqlite3
+import time
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langgraph")
+pytest.importorskip("msgpack")
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import ERROR, WRITES_IDX_MAP
+from support_files.checkpoint_codec import MessageDeltaCodec
+from support_files.checkpointer import BoundedSqliteSaver
+
+
+def _checkpoint(checkpoint_id: str, content: str) -> dict:
+    return {"v": 1, "id": checkpoint_id, "ts": "2026-01-01T00:00:00+00:00",
+            "channel_values": {"messages": [HumanMessage(content=content)]},
+            "channel_versions": {}, "versions_seen": {}, "pending_sends": []}
+
+
+def _config(thread_id: str = "thread") -> dict:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+def _stored(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+
+
+@pytest.fixture(params=[None, MessageDeltaCodec], ids=["plain", "delta"])
+def saver(request, tmp_path):
+    codec = request.param() if request.param else None
+    saver = BoundedSqliteSaver(str(tmp_path / "checkpoints.sqlite"), max_checkpoints_per_thread=3,
+                               flush_interval=3600, busy_timeout=0.05, codec=codec)
+    yield saver
+    saver.close()
+
+
+def test_puts_are_buffered_until_flushed(saver):
+    saved = saver.put(_config(), _checkpoint("1", "hi"), {"step": 1}, {})
+    saver.put_writes(saved, [("messages", "pending")], "task")
+    assert _stored(saver.path) == 0
+    saver.flush()
+    assert _stored(saver.path) == 1
+
+
+def test_reads_flush_first_and_resume_the_latest_checkpoint(saver):
+    saved = _config()
+    for checkpoint_id in ("1", "2"):
+        saved = saver.put(saved, _checkpoint(checkpoint_id, f"message {checkpoint_id}"), {"step": checkpoint_id}, {})
+    saver.put_writes(saved, [("messages", "pending")], "task")
+
+    checkpoint_tuple = saver.get_tuple(_config())
+    assert checkpoint_tuple.checkpoint["id"] == "2"
+    assert checkpoint_tuple.checkpoint["channel_values"]["messages"][0].content == "message 2"
+    assert checkpoint_tuple.metadata == {"step": "2"}
+    assert checkpoint_tuple.parent_config["configurable"]["checkpoint_id"] == "1"
+    assert checkpoint_tuple.pending_writes == [("task", "messages", "pending")]
+    assert [item.checkpoint["id"] for item in saver.list(_config())] == ["2", "1"]
+
+
+def test_only_the_latest_checkpoints_of_a_thread_are_kept(saver):
+    for checkpoint_id in "12345":
+        saver.put(_config(), _checkpoint(checkpoint_id, checkpoint_id), {}, {})
+    saver.put(_config("other"), _checkpoint("1", "other"), {}, {})
+    assert [item.checkpoint["id"] for item in saver.list(_config())] == ["5", "4", "3"]
+    assert saver.get_tuple(_config("other")).checkpoint["id"] == "1"
+
+
+def test_failed_flush_keeps_the_batch_for_the_next_one(saver):
+    saved = saver.put(_config(), _checkpoint("1", "hi"), {}, {})
+    saver.put_writes(saved, [("messages", "pending")], "task")
+    # Another worker sharing the file holds it longer than the busy timeout
+    other = sqlite3.connect(saver.path)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            saver.flush()
+        saver.put(saved, _checkpoint("2", "again"), {}, {})
+    finally:
+        other.rollback()
+        other.close()
+
+    saver.flush()
+    assert [item.checkpoint["id"] for item in saver.list(_config())] == ["2", "1"]
+    assert saver.get_tuple(saved).pending_writes == [("task", "messages", "pending")]
+
+
+def test_special_writes_use_their_fixed_index(saver):
+    saved = saver.put(_config(), _checkpoint("1", "hi"), {}, {})
+    saver.put_writes(saved, [("messages", "first"), (ERROR, ValueError("boom"))], "task")
+    saver.flush()
+    rows = saver._conn.execute("SELECT channel, idx FROM writes ORDER BY idx").fetchall()
+    assert rows == [(ERROR, WRITES_IDX_MAP[ERROR]), ("messages", 0)]
+
+
+def test_idle_threads_expire(tmp_path):
+    saver = BoundedSqliteSaver(str(tmp_path / "checkpoints.sqlite"), idle_ttl=0.05, flush_interval=3600, sweep_interval=0)
+    try:
+        saver.put(_config("idle"), _checkpoint("1", "hi"), {}, {})
+        saver.flush()
+        time.sleep(0.1)
+        saver.put(_config("active"), _checkpoint("1", "hi"), {}, {})
+        saver.flush()
+        assert saver.get_tuple(_config("idle")) is None
+        assert saver.get_tuple(_config("active")) is not None
+    finally:
+        saver.close()
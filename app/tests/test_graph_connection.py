@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+
+pytest.importorskip("neo4j")
+pytest.importorskip("langchain_community")
+
+from support_files import graph_connection
+from support_files.graph_connection import AsyncNeo4jConnectionManager
+
+
+class _FakeDriver:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+
+    async def verify_connectivity(self):
+        await asyncio.sleep(0)
+
+    async def execute_query(self, query, params, database_=None):
+        assert asyncio.get_running_loop() is self.loop, "driver used on another event loop"
+        return [], None, None
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def drivers(monkeypatch):
+    opened = []
+
+    def driver(*args, **kwargs):
+        opened.append(_FakeDriver())
+        return opened[-1]
+
+    monkeypatch.setenv("FAKE_NEO4J_URI", "neo4j://localhost")
+    monkeypatch.setenv("FAKE_NEO4J_USERNAME", "neo4j")
+    monkeypatch.setenv("FAKE_NEO4J_PASSWORD", "secret")
+    monkeypatch.setattr(graph_connection.AsyncGraphDatabase, "driver", driver)
+    return opened
+
+
+def test_pool_survives_one_event_loop_after_another(drivers):
+    pool = AsyncNeo4jConnectionManager("FAKE_NEO4J")
+
+    async def turn():
+        # Concurrent first queries open a single driver
+        await asyncio.gather(*(pool.query("RETURN 1") for _ in range(5)))
+        return await pool.get()
+
+    first = asyncio.run(turn())
+    second = asyncio.run(turn())
+    assert first is not second
+    assert drivers == [first, second]
+
+
+def test_close_only_drops_the_running_loops_driver(drivers):
+    pool = AsyncNeo4jConnectionManager("FAKE_NEO4J")
+
+    async def reconnect():
+        driver = await pool.get()
+        await pool.close()
+        return driver, await pool.get()
+
+    closed, reopened = asyncio.run(reconnect())
+    assert closed.closed and not reopened.closed
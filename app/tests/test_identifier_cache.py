@@ -0,0 +1,113 @@
+import time
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("loguru")
+
+from support_files.identifier_cache import IdentifierCache, normalize_identifier
+
+_LEAD = {"lead_id": 1, "lead_name": "John", "phone_number": "+96550000000", "email": "john@example.com",
+         "civil_id": "290010100000"}
+
+
+def _params(email: str = "john@example.com") -> dict:
+    return {"mobile": "+96550000000", "civil_id": "290010100000", "email": email}
+
+
+def test_hits_misses_and_expiry():
+    cache = IdentifierCache(ttl=0.05, negative_ttl=0.01)
+    assert cache.get("phone", "+96550000000") is None
+    cache.put("phone", "+96550000000", [_LEAD])
+    cache.put("email", "nobody@example.com", [])
+    assert cache.get("phone", "+96550000000") == (_LEAD,)
+    assert cache.get("email", "nobody@example.com") == ()
+    time.sleep(0.02)
+    assert cache.get("email", "nobody@example.com") is None
+    assert cache.stats()["phone"] == {"hits": 1, "negative_hits": 0, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_least_recently_used_goes_first():
+    cache = IdentifierCache(max_entries=2)
+    cache.put("phone", "1", [])
+    cache.put("phone", "2", [])
+    cache.get("phone", "1")
+    cache.put("phone", "3", [])
+    assert cache.get("phone", "2") is None
+    assert cache.get("phone", "1") == ()
+
+
+def test_invalidation_drops_every_entry_holding_the_phone_number():
+    cache = IdentifierCache()
+    cache.put("email", "old@example.com", [_LEAD])
+    cache.put("civil_id", "290010100000", [_LEAD])
+    cache.put("phone", "+96551111111", [])
+    cache.invalidate_lead(_params("new@example.com"))
+    assert cache.get("email", "old@example.com") is None
+    assert cache.get("civil_id", "290010100000") is None
+    assert cache.get("phone", "+96551111111") == ()
+
+
+def test_lookup_finishing_after_an_invalidation_is_not_cached():
+    cache = IdentifierCache()
+    # The lookup reads the database, a lead creation writes and invalidates, then the lookup finishes
+    generation = cache.generation()
+    cache.invalidate_lead(_params())
+    cache.put("email", "john@example.com", [], generation)
+    assert cache.get("email", "john@example.com") is None
+
+    # Found through another identifier, the lead's phone number was written meanwhile
+    generation = cache.generation()
+    cache.invalidate_lead(_params("new@example.com"))
+    cache.put("email", "john@example.com", [_LEAD], generation)
+    assert cache.get("email", "john@example.com") is None
+
+    # Lookups of other identifiers, or started after the invalidation, are cached
+    cache.put("phone", "+96551111111", [], generation)
+    generation = cache.generation()
+    cache.put("email", "john@example.com", [_LEAD], generation)
+    assert cache.get("phone", "+96551111111") == ()
+    assert cache.get("email", "john@example.com") == (_LEAD,)
+
+
+def test_forgotten_invalidations_still_drop_older_lookups():
+    cache = IdentifierCache(max_entries=1)
+    generation = cache.generation()
+    cache.invalidate_lead(_params())
+    cache.invalidate_lead({"mobile": "+96551111111"})
+    cache.put("phone", "+96552222222", [], generation)
+    assert cache.get("phone", "+96552222222") is None
+
+
+def test_identifiers_are_looked_up_as_stored():
+    assert normalize_identifier("  +96550000000 ") == "  +96550000000 "
+    assert normalize_identifier("+96550000000") == "+96550000000"
+    assert normalize_identifier("   ") is None
+    assert normalize_identifier(None) is None
+    # The invalidation of a lead created with the untrimmed value drops the entry looked up with it
+    cache = IdentifierCache()
+    cache.put("phone", " +96550000000", [])
+    cache.invalidate_lead({"mobile": " +96550000000"})
+    assert cache.get("phone", " +96550000000") is None
+
+
+class _SharedPhoneGraph:
+    """Answers identifier_lookup with `count` leads sharing one phone number, the last one named John."""
+
+    def __init__(self, count: int):
+        self.leads = [{**_LEAD, "lead_id": index, "lead_name": "John" if index == count - 1 else f"Other {index}"}
+                      for index in range(count)]
+
+    def query(self, text: str, params: dict) -> list:
+        return [{"identifier": "phone", **lead} for lead in self.leads] if params.get("phone") else []
+
+
+def test_the_exact_match_is_found_among_many_leads_sharing_a_phone_number(monkeypatch):
+    pytest.importorskip("neo4j")
+    from support_files import tool_execution
+    from support_files.cypher_queries import query_registry
+
+    assert "LIMIT" not in query_registry["identifier_lookup"].text
+    monkeypatch.setattr(tool_execution, "graph", _SharedPhoneGraph(50))
+    monkeypatch.setattr(tool_execution, "identifier_cache", IdentifierCache())
+    message = tool_execution.verify_customer_existence(name="john", phone="+96550000000")
+    assert message.startswith("A customer named 'John' already exists")
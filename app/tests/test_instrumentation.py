@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langgraph")
+
+from typing import Annotated
+from typing_extensions import TypedDict
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import START, StateGraph
+from langgraph.graph.message import add_messages
+from support_files import instrumentation as instrumentation_module
+from support_files.instrumentation import instrumentation, instrumented_config
+
+
+class _State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def _graph():
+    builder = StateGraph(_State)
+    builder.add_node("reply", lambda state: {"messages": [("ai", "hi")]})
+    builder.add_edge(START, "reply")
+    return builder.compile(checkpointer=MemorySaver())
+
+
+def test_disabled_instrumentation_leaves_the_config_alone(monkeypatch):
+    monkeypatch.setattr(instrumentation, "enabled", False)
+    config = {"configurable": {"thread_id": "1"}}
+    assert instrumented_config(config) is config
+
+
+def test_instrumented_calls_keep_the_compiled_graph_usable(monkeypatch):
+    monkeypatch.setattr(instrumentation, "enabled", True)
+    monkeypatch.setattr(instrumentation_module, "_graph_handler", None)
+    observed = []
+    monkeypatch.setattr(instrumentation, "observe", lambda metric, seconds, **labels: observed.append((metric, labels)))
+
+    graph = _graph()
+    config = instrumented_config({"configurable": {"thread_id": "1"}, "callbacks": []})
+    graph.invoke({"messages": [("user", "hello")]}, config)
+
+    assert ("node_duration_seconds", {"node": "reply"}) in observed
+    assert len(graph.get_state(config).values["messages"]) == 2
+    assert "reply" in graph.get_graph(xray=True).nodes
@@ -0,0 +1,78 @@
+import random
+import pytest
+
+pytest.importorskip("numpy")
+
+from support_files.jaro_winkler import PackedNames, jaro_winkler, score_batch
+
+_PAIRS = [
+    ("martha", "marhta"), ("dwayne", "duane"), ("dixon", "dicksonx"), ("crate", "trace"),
+    # Shared prefixes longer than the 4 characters the boost counts
+    ("johnathan", "johnathon"), ("alexandra", "alexander"), ("christopher", "christophe"),
+    ("John Smith", "john smith"), ("abc", "abc"), ("a", "a"), ("a", "b"), ("ab", "ba"),
+    ("José", "jose"), ("Müller", "Mueller"), ("Ærøskøbing", "aeroskobing"), ("محمد", "محمود"),
+    ("Straße", "strasse"), ("naïve café", "naive cafe"), ("a*b", "ab*"),
+]
+
+
+def _random_names(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    alphabet = "aabcdeeeijklmnoorstuy é-*"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+
+def test_matches_pyjarowinkler():
+    distance = pytest.importorskip("pyjarowinkler.distance")
+    if not hasattr(distance, "get_jaro_distance"):
+        pytest.skip("needs the pyjarowinkler 1.x API the name index was built on")
+    names = _random_names(300, seed=7)
+    pairs = _PAIRS + list(zip(names, reversed(names)))
+    for first, second in pairs:
+        assert jaro_winkler(first, second) == distance.get_jaro_distance(first, second), (first, second)
+        assert jaro_winkler(second, first) == distance.get_jaro_distance(second, first), (second, first)
+
+
+def test_empty_names_are_rejected():
+    for first, second in (("", "john"), ("john", ""), ("", "")):
+        with pytest.raises(ValueError):
+            jaro_winkler(first, second)
+    with pytest.raises(ValueError):
+        score_batch("", PackedNames(["john"]))
+
+
+def test_transpositions_and_prefix_boost():
+    assert jaro_winkler("martha", "marhta") == 0.96
+    # The boost stops at 4 characters however long the shared prefix is
+    assert jaro_winkler("abcdefgh", "abcdefgx") == jaro_winkler("abcdxfgh", "abcdyfgh")
+
+
+def _brute_force(query: str, names: list, threshold: float) -> list:
+    scores = [(slot, jaro_winkler(query, name)) for slot, name in enumerate(names)]
+    return [(slot, score) for slot, score in scores if score >= threshold]
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.5, 0.8, 0.86, 1.0])
+def test_threshold_returns_every_name_reaching_it(threshold):
+    names = _random_names(400, seed=1)
+    packed = PackedNames(names)
+    for query in ("john", "maria", "eeee", names[17]):
+        assert score_batch(query, packed, threshold=threshold) == _brute_force(query, names, threshold)
+
+
+@pytest.mark.parametrize("top_k", [1, 3, 10])
+def test_top_k_returns_the_best_names_first(top_k):
+    names = _random_names(400, seed=2)
+    packed = PackedNames(names)
+    for query in ("john", "marta", names[5]):
+        for threshold in (0.0, 0.7):
+            expected = sorted(_brute_force(query, names, threshold), key=lambda entry: (-entry[1], entry[0]))[:top_k]
+            assert score_batch(query, packed, threshold=threshold, top_k=top_k) == expected
+
+
+def test_top_k_zero_slots_and_discarded_names():
+    packed = PackedNames(["john", "joan", "jon"])
+    assert score_batch("john", packed, top_k=0) == []
+    assert [slot for slot, _ in score_batch("john", packed, slots=[1, 2])] == [1, 2]
+    packed.discard(0)
+    assert 0 not in [slot for slot, _ in score_batch("john", packed)]
+    assert len(packed) == 2
@@ -0,0 +1,199 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("loguru")
+pytest.importorskip("neo4j")
+
+from support_files.lead_write_queue import COMMITTED, WRITING, LeadWriteQueue
+from support_files.tool_execution import lead_creation_params
+
+
+class _FakeGraph:
+    """Records the rows of every bulk write, `gate` holds the writes back until it is set."""
+
+    def __init__(self):
+        self.writes = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def execute_write(self, query, params):
+        self.gate.wait(5)
+        self.writes.append([dict(row) for row in params["rows"]])
+        return [{"lead_id": index, "lead_name": row["name"]} for index, row in enumerate(params["rows"])]
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _lead(email: str = "john@example.com", phone: str = "+96550000000") -> dict:
+    return lead_creation_params("john", phone, "290010100000", email, "Patrol", "LE")
+
+
+@pytest.fixture
+def graph():
+    return _FakeGraph()
+
+
+@pytest.fixture
+def queue(tmp_path, graph):
+    queue = LeadWriteQueue(str(tmp_path / "lead_writes.sqlite"), graph=graph, flush_interval=0.01, backoff=0.01)
+    yield queue
+    queue.close()
+
+
+def test_same_lead_is_written_once(queue, graph):
+    key, status = queue.enqueue(_lead(), "thread")
+    assert status == "queued"
+    _wait_for(lambda: queue.status(key) == COMMITTED)
+    assert queue.enqueue(_lead(), "thread") == (key, COMMITTED)
+    assert len(graph.writes) == 1
+
+
+def test_changed_details_replace_a_pending_lead(queue, graph):
+    graph.gate.clear()
+    first, _ = queue.enqueue(_lead("other@example.com", phone="+96551111111"), "thread")
+    _wait_for(lambda: queue.status(first) == WRITING)
+    key, status = queue.enqueue(_lead(), "thread")
+    assert status == "queued"
+    # Holding the first write, the details of the second lead change before it is written
+    assert queue.enqueue(_lead("new@example.com"), "thread") == (key, "updated")
+    graph.gate.set()
+    _wait_for(lambda: queue.status(key) == COMMITTED)
+    assert [row["email"] for write in graph.writes for row in write] == ["other@example.com", "new@example.com"]
+
+
+def test_changed_details_while_writing_are_written_again(queue, graph):
+    graph.gate.clear()
+    original = _lead()
+    key, _ = queue.enqueue(original, "thread")
+    _wait_for(lambda: queue.status(key) == WRITING)
+    assert queue.enqueue(_lead("new@example.com"), "thread") == (key, "updated")
+    graph.gate.set()
+    _wait_for(lambda: len(graph.writes) == 2 and queue.status(key) == COMMITTED)
+    assert [write[0]["email"] for write in graph.writes] == ["john@example.com", "new@example.com"]
+    assert graph.writes[1][0]["createdAt"] == original["createdAt"]
+
+
+def test_changed_details_of_a_stored_lead_are_requeued(queue, graph):
+    key, _ = queue.enqueue(_lead(), "thread")
+    _wait_for(lambda: queue.status(key) == COMMITTED)
+    assert queue.enqueue(_lead("new@example.com"), "thread") == (key, "requeued")
+    _wait_for(lambda: len(graph.writes) == 2 and queue.status(key) == COMMITTED)
+    assert graph.writes[1][0]["email"] == "new@example.com"
+
+
+def test_reports_stay_pending_until_acknowledged(queue):
+    key, _ = queue.enqueue(_lead(), "thread")
+    _wait_for(lambda: queue.status(key) == COMMITTED)
+    reports = queue.pending_reports("thread")
+    assert [(report.key, report.status) for report in reports] == [(key, COMMITTED)]
+    # The turn failed before the user was told
+    assert queue.pending_reports("thread") == reports
+    assert queue.pending_reports("other thread") == []
+    queue.ack_reports(reports)
+    assert queue.pending_reports("thread") == []
+
+
+def test_acknowledging_an_outdated_report_keeps_the_new_one(queue, graph):
+    key, _ = queue.enqueue(_lead(), "thread")
+    _wait_for(lambda: queue.status(key) == COMMITTED)
+    outdated = queue.pending_reports("thread")
+    queue.enqueue(_lead("new@example.com"), "thread")
+    _wait_for(lambda: len(graph.writes) == 2 and queue.status(key) == COMMITTED)
+    queue.ack_reports(outdated)
+    assert [report.params["email"] for report in queue.pending_reports("thread")] == ["new@example.com"]
+
+
+def test_assistant_acknowledges_reports_after_answering(queue):
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    from main import Assistant
+    from support_files.retry import RetryPolicy
+
+    key, _ = queue.enqueue(_lead(), "thread")
+    _wait_for(lambda: queue.status(key) == COMMITTED)
+    config = {"configurable": {"thread_id": "thread"}}
+
+    def fail(_):
+        raise ValueError("LLM down")
+
+    with pytest.raises(ValueError):
+        Assistant(RunnableLambda(fail), retry_policy=RetryPolicy(max_attempts=1), lead_writes=queue)({"messages": []}, config)
+    assert len(queue.pending_reports("thread")) == 1
+
+    update = Assistant(RunnableLambda(lambda _: AIMessage(content="saved")), lead_writes=queue)({"messages": []}, config)
+    assert [message.type for message in update["messages"]] == ["system", "ai"]
+    assert queue.pending_reports("thread") == []
+
+
+def test_a_claimed_lead_is_not_claimed_by_another_process(tmp_path, graph):
+    graph.gate.clear()
+    path = str(tmp_path / "lead_writes.sqlite")
+    queue = LeadWriteQueue(path, graph=graph, flush_interval=0.01, write_timeout=0.2)
+    other = LeadWriteQueue(path, graph=graph, flush_interval=3600)
+    try:
+        key, _ = queue.enqueue(_lead(), "thread")
+        _wait_for(lambda: queue.status(key) == WRITING)
+        assert other._claim() == []
+        # The first writer is stuck, the lead is due again once its claim expired
+        time.sleep(0.25)
+        assert [row[0] for row in other._claim()] == [key]
+    finally:
+        graph.gate.set()
+        queue.close()
+        other.close()
+
+
+def test_finished_leads_are_purged(tmp_path, graph):
+    queue = LeadWriteQueue(str(tmp_path / "lead_writes.sqlite"), graph=graph, flush_interval=0.01,
+                           retention=0.05, unreported_retention=3600, sweep_interval=0)
+    try:
+        reported, _ = queue.enqueue(_lead(), "thread")
+        unreported, _ = queue.enqueue(_lead(phone="+96551111111"), "other thread")
+        _wait_for(lambda: queue.status(reported) == queue.status(unreported) == COMMITTED)
+        queue.ack_reports(queue.pending_reports("thread"))
+        time.sleep(0.1)
+        queue._maybe_sweep()
+        assert queue.status(reported) is None
+        assert queue.status(unreported) == COMMITTED
+    finally:
+        queue.close()
+
+
+def test_shared_file_waits_for_other_processes(tmp_path, graph):
+    queue = LeadWriteQueue(str(tmp_path / "lead_writes.sqlite"), graph=graph, busy_timeout=2.5)
+    try:
+        assert queue._conn.execute("PRAGMA busy_timeout").fetchone()[0] == 2500
+    finally:
+        queue.close()
+
+
+def test_close_does_not_flush_while_the_worker_is_writing(tmp_path, graph):
+    graph.gate.clear()
+    queue = LeadWriteQueue(str(tmp_path / "lead_writes.sqlite"), graph=graph, flush_interval=0.01)
+    key, _ = queue.enqueue(_lead(), "thread")
+    _wait_for(lambda: queue.status(key) == WRITING)
+    claims = []
+    queue._claim = lambda: claims.append(True) or []
+    queue.close(timeout=0.05)
+    assert claims == []
+
+    # The worker finishes its batch and closes the connection
+    graph.gate.set()
+    _wait_for(lambda: not queue._worker.is_alive())
+    assert len(graph.writes) == 1
+    with pytest.raises(Exception):
+        queue._conn.execute("SELECT 1")
+
+
+def test_close_flushes_once_the_worker_stopped(tmp_path, graph):
+    queue = LeadWriteQueue(str(tmp_path / "lead_writes.sqlite"), graph=graph, flush_interval=3600)
+    queue.enqueue(_lead(), "thread")
+    queue.close()
+    assert len(graph.writes) == 1
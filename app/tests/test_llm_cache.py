@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("loguru")
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from support_files.llm_cache import CachedChatModel, LLMResponseCache
+
+_PROMPT = [HumanMessage(content="Which models do you sell?")]
+
+
+def _model(*replies: AIMessage) -> CachedChatModel:
+    return CachedChatModel(GenericFakeChatModel(messages=iter(replies)), LLMResponseCache(path=None))
+
+
+async def _collect(stream) -> list:
+    return [chunk async for chunk in stream]
+
+
+def test_streams_pass_through_on_a_miss_and_replay_on_a_hit():
+    model = _model(AIMessage(content="the creta and the venue"))
+    chunks = asyncio.run(_collect(model.astream(_PROMPT)))
+    assert len(chunks) > 1
+    assert "".join(chunk.content for chunk in chunks) == "the creta and the venue"
+
+    # The fake model has no reply left, only the cache can answer
+    replayed = asyncio.run(_collect(model.astream(_PROMPT)))
+    assert len(replayed) == 1 and isinstance(replayed[0], AIMessageChunk)
+    assert replayed[0].content == "the creta and the venue"
+    assert model.invoke(_PROMPT).content == "the creta and the venue"
+    assert model.cache.stats() == {"memory_hits": 2, "disk_hits": 0, "misses": 1}
+
+
+def test_interrupted_stream_is_not_cached():
+    model = _model(AIMessage(content="the creta and the venue"), AIMessage(content="the tucson"))
+    stream = model.stream(_PROMPT)
+    next(stream)
+    stream.close()
+    assert model.invoke(_PROMPT).content == "the tucson"
+
+
+def test_hits_get_new_ids_without_the_providers():
+    tool_call = {"name": "Lead_assistant", "args": {"name": "john"}, "id": "call_provider"}
+    reply = AIMessage(content="", tool_calls=[tool_call], id="run-provider", response_metadata={"id": "chatcmpl-1"},
+                      additional_kwargs={"tool_calls": [{"id": "call_provider", "type": "function"}]})
+    model = _model(reply)
+    assert model.invoke(_PROMPT).tool_calls[0]["id"] == "call_provider"
+
+    first, second = model.invoke(_PROMPT), model.invoke(_PROMPT)
+    assert first.id is None and "id" not in first.response_metadata and "tool_calls" not in first.additional_kwargs
+    assert first.tool_calls[0]["args"] == {"name": "john"}
+    assert len({"call_provider", first.tool_calls[0]["id"], second.tool_calls[0]["id"]}) == 3
+
+    replayed = list(model.stream(_PROMPT))
+    assert replayed[0].tool_calls[0]["name"] == "Lead_assistant"
+    assert replayed[0].tool_calls[0]["id"] != "call_provider"
@@ -0,0 +1,147 @@
+import asyncio
+import time
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("loguru")
+
+from langchain_core.runnables import RunnableLambda
+from support_files.llm_hedging import CircuitBreaker, HedgeStats, HedgedChatModel
+
+
+def _backend(delay: float, answer: str = "ok", error: Exception = None) -> RunnableLambda:
+    def call(_):
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return answer
+
+    async def acall(_):
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return answer
+
+    return RunnableLambda(call, afunc=acall)
+
+
+def _open(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert breaker.allow()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    _open(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+
+def test_release_trial_only_frees_the_owners_claim():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    _open(breaker)
+    owner, other = object(), object()
+    assert breaker.allow(owner)
+    breaker.release_trial(other)
+    assert not breaker.allow(other)
+    breaker.release_trial(owner)
+    assert breaker.allow(other)
+
+
+def test_cancelled_hedge_gives_the_trial_back():
+    stats = HedgeStats()
+    model = HedgedChatModel([("primary", _backend(0.05, "primary")), ("secondary", _backend(1.0, "secondary"))],
+                            hedge_percentile=0.5, min_hedge_delay=0.0, max_hedge_delay=0.01,
+                            failure_threshold=1, reset_timeout=0.01, stats=stats)
+    secondary = model.backends[1].breaker
+    _open(secondary)
+    time.sleep(0.02)
+
+    # The hedge is the secondary's trial call and loses against the primary
+    assert asyncio.run(model.ainvoke("hi")) == "primary"
+    assert stats.snapshot()["hedges"] == 1
+    assert stats.snapshot()["hedge_losses"] == 1
+    assert secondary.allow()
+
+
+def test_cancelled_request_gives_the_trial_back():
+    model = HedgedChatModel([("primary", _backend(1.0))], hedge_percentile=None,
+                            failure_threshold=1, reset_timeout=0.0, stats=HedgeStats())
+    breaker = model.backends[0].breaker
+    _open(breaker)
+
+    async def cancelled():
+        task = asyncio.ensure_future(model.ainvoke("hi"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancelled())
+    assert breaker.allow()
+
+
+def test_failover_to_the_next_backend():
+    stats = HedgeStats()
+    model = HedgedChatModel([("primary", _backend(0.0, error=ConnectionError("down"))),
+                             ("secondary", _backend(0.0, "secondary"))],
+                            hedge_percentile=None, failure_threshold=2, stats=stats)
+    assert model.invoke("hi") == "secondary"
+    assert asyncio.run(model.ainvoke("hi")) == "secondary"
+    assert stats.snapshot()["failovers"] == 2
+    assert model.breaker_states() == {"primary": "open", "secondary": "closed"}
+
+
+class _StreamingBackend(RunnableLambda):
+    """Streams a first token through the callbacks before answering, like a chat model under astream_events."""
+
+    def __init__(self, first_token_after: float, delay: float, answer: str):
+        async def acall(_, config):
+            await asyncio.sleep(first_token_after)
+            for handler in config.get("callbacks").handlers if config.get("callbacks") else []:
+                if hasattr(handler, "on_llm_new_token"):
+                    handler.on_llm_new_token(answer[:2])
+            await asyncio.sleep(delay)
+            return answer
+
+        super().__init__(lambda _: answer, afunc=acall)
+
+
+def test_no_hedge_once_the_primary_streams():
+    stats = HedgeStats()
+    model = HedgedChatModel([("primary", _StreamingBackend(0.0, 0.1, "primary")), ("secondary", _backend(0.0, "secondary"))],
+                            hedge_percentile=0.5, min_hedge_delay=0.0, max_hedge_delay=0.02, stats=stats)
+    assert asyncio.run(model.ainvoke("hi")) == "primary"
+    assert stats.snapshot().get("hedges_skipped") == 1
+    assert "hedges" not in stats.snapshot()
+
+
+def test_faster_hedge_does_not_replace_a_streaming_reply():
+    stats = HedgeStats()
+    model = HedgedChatModel([("primary", _StreamingBackend(0.05, 0.1, "primary")), ("secondary", _backend(0.08, "secondary"))],
+                            hedge_percentile=0.5, min_hedge_delay=0.0, max_hedge_delay=0.01, stats=stats)
+    # The hedge is sent before the primary's first token and answers after it, but before the primary
+    assert asyncio.run(model.ainvoke("hi")) == "primary"
+    assert stats.snapshot()["hedges"] == 1
+
+
+def test_hedge_percentile_is_a_fraction():
+    with pytest.raises(ValueError):
+        HedgedChatModel([("primary", _backend(0.0))], hedge_percentile=95)
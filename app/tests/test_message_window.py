@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("loguru")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from support_files.message_window import MessageWindow
+
+
+class _Summarizer:
+    def __init__(self):
+        self.calls = []
+
+    def runnable(self) -> RunnableLambda:
+        def summarize(_):
+            self.calls.append("sync")
+            return AIMessage(content="short")
+
+        async def asummarize(_):
+            self.calls.append("async")
+            return AIMessage(content="short")
+
+        return RunnableLambda(summarize, afunc=asummarize)
+
+
+def _turn(index: int) -> list:
+    return [HumanMessage(content="question " * 10, id=f"human-{index}"), AIMessage(content="answer " * 10, id=f"ai-{index}")]
+
+
+def _summaries(margin: float, turns: int = 40) -> int:
+    summarizer = _Summarizer()
+    window = MessageWindow(200, summarizer.runnable(), summarize_margin=margin)
+    state = {"messages": [], "summary": None}
+    for index in range(turns):
+        state["messages"] = state["messages"] + _turn(index)
+        _, summary = window.apply(state)
+        if summary is not None:
+            state["summary"] = summary
+    return len(summarizer.calls)
+
+
+def test_margin_summarizes_less_often():
+    assert _summaries(0.0) > 2 * _summaries(0.5)
+
+
+def test_window_keeps_the_newest_turns_and_the_summary():
+    window = MessageWindow(200, _Summarizer().runnable())
+    messages = [message for index in range(10) for message in _turn(index)]
+    sent, summary = window.apply({"messages": messages})
+    assert isinstance(sent[0], SystemMessage) and "short" in sent[0].content
+    assert sent[-1].id == "ai-9"
+    assert summary["until"] == messages[len(messages) - len(sent)].id
+
+
+def test_tool_results_stay_with_their_call():
+    call = AIMessage(content="", id="call", tool_calls=[{"name": "lookup", "args": {"q": "x" * 400}, "id": "t1"}])
+    messages = [*_turn(0), call, ToolMessage(content="result", tool_call_id="t1", id="result"), *_turn(1)]
+    sent, _ = MessageWindow(150).apply({"messages": messages})
+    assert [message.id for message in sent if message.id in ("call", "result")] in ([], ["call", "result"])
+
+
+def test_async_path_awaits_the_summarizer():
+    summarizer = _Summarizer()
+    window = MessageWindow(200, summarizer.runnable())
+    messages = [message for index in range(10) for message in _turn(index)]
+    sent, summary = asyncio.run(window.aapply({"messages": messages}))
+    assert summarizer.calls == ["async"]
+    sync_sent, sync_summary = window.apply({"messages": messages})
+    assert summary == sync_summary and summary["text"] == "short"
+    assert [message.content for message in sent] == [message.content for message in sync_sent]
+
+
+def test_margin_is_a_fraction():
+    with pytest.raises(ValueError):
+        MessageWindow(200, summarize_margin=25)
+
+
+def test_assistants_keep_their_own_summary():
+    pytest.importorskip("langgraph")
+    pytest.importorskip("neo4j")
+    from main import Assistant, update_summaries
+
+    seen = {}
+
+    def assistant(name: str, budget: int) -> Assistant:
+        def reply(state):
+            seen[name] = state["messages"]
+            return AIMessage(content="ok")
+
+        return Assistant(RunnableLambda(reply), MessageWindow(budget, _Summarizer().runnable()), name=name)
+
+    small, large = assistant("primary_assistant", 200), assistant("lead_agent", 4000)
+    state = {"messages": [message for index in range(10) for message in _turn(index)], "summary": None}
+    for node in (small, large, small):
+        update = node(state, {})
+        if "summary" in update:
+            state["summary"] = update_summaries(state["summary"], update["summary"])
+
+    assert list(state["summary"]) == ["primary_assistant"]
+    assert isinstance(seen["primary_assistant"][0], SystemMessage)
+    # The larger budget still sees the whole history, not the window of the smaller one
+    assert [message.id for message in seen["lead_agent"]] == [message.id for message in state["messages"]]
+
+
+def test_summaries_of_older_checkpoints_are_dropped():
+    pytest.importorskip("langgraph")
+    pytest.importorskip("neo4j")
+    from main import update_summaries
+
+    assert update_summaries({"text": "old", "until": "ai-1"}, {"lead_agent": {"text": "new", "until": "ai-2"}}) == {
+        "lead_agent": {"text": "new", "until": "ai-2"}}
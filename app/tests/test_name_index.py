@@ -0,0 +1,105 @@
+import random
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("loguru")
+
+from support_files.jaro_winkler import jaro_winkler
+from support_files.name_index import NameIndex
+
+_FIRST = ["john", "jon", "joan", "johan", "mohammed", "muhammad", "ahmed", "ahmad", "fatima", "fatma", "sara",
+          "sarah", "anna", "ana", "maria", "mariam", "abdullah", "abdulla", "yousef", "youssef", "jose", "josé"]
+_LAST = ["smith", "smyth", "al-sabah", "alsabah", "khan", "kahn", "müller", "mueller", "o'neil", "oneil", "a*b"]
+
+
+def _names(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    names = []
+    for index in range(count):
+        name = f"{rng.choice(_FIRST)} {rng.choice(_LAST)}"
+        if rng.random() < 0.3:
+            # Typos, so the names are not all made of the same few tokens
+            position = rng.randrange(len(name))
+            name = name[:position] + rng.choice("aeioubdkmnrst ") + name[position + 1:]
+        names.append(name.title() if rng.random() < 0.5 else name)
+    return names
+
+
+def _score():
+    """pyjarowinkler's score the index was built to reproduce, the vectorized port without it."""
+    try:
+        from pyjarowinkler.distance import get_jaro_distance
+    except ImportError:
+        return jaro_winkler
+    return get_jaro_distance
+
+
+def _full_scan(query: str, leads: list) -> list:
+    """Scores of the scan of every Lead the index replaced, in database order."""
+    score = _score()
+    return [(name, score(query, name)) for _, name in leads if name]
+
+
+@pytest.fixture(scope="module")
+def leads() -> list:
+    return [(f"lead-{index}", name) for index, name in enumerate(_names(3000, seed=11))]
+
+
+def test_find_similar_matches_a_full_scan(leads):
+    indexes = {threshold: NameIndex(lambda: leads, threshold=threshold) for threshold in (0.7, 0.86, 0.95)}
+    queries = [name for _, name in leads[:10]] + _names(10, seed=12) + ["jo", "x", "A*B smith"]
+    for query in queries:
+        scores = _full_scan(query, leads)
+        for threshold, index in indexes.items():
+            expected = [(name, similarity) for name, similarity in scores if similarity >= threshold]
+            assert index.find_similar(query) == expected, (query, threshold)
+
+
+def test_loads_once_and_skips_missing_names():
+    loads = []
+
+    def loader():
+        loads.append(True)
+        return [("1", "John Smith"), ("2", None), ("3", "")]
+
+    index = NameIndex(loader)
+    assert index.find_similar("john smith") == [("John Smith", 1.0)]
+    assert len(index) == 1
+    assert len(loads) == 1
+
+
+def test_upsert_adds_and_renames_leads():
+    index = NameIndex(lambda: [("1", "John Smith")])
+    assert len(index) == 1
+    index.upsert("2", "Mariam Khan")
+    assert index.find_similar("mariam khan") == [("Mariam Khan", 1.0)]
+
+    index.upsert("1", "Jonathan Smyth")
+    assert index.find_similar("john smith") == []
+    assert index.find_similar("jonathan smyth") == [("Jonathan Smyth", 1.0)]
+    assert len(index) == 2
+
+
+def test_upsert_before_the_first_lookup_is_left_to_the_load():
+    index = NameIndex(lambda: [("1", "John Smith")])
+    index.upsert("1", "John Smith")
+    assert len(index) == 1
+
+
+def test_remove_drops_the_lead():
+    index = NameIndex(lambda: [("1", "John Smith"), ("2", "Jon Smith"), ("3", "A*B Smith")])
+    index.find_similar("john")
+    index.remove("1")
+    index.remove("3")
+    index.remove("unknown")
+    assert [name for name, _ in index.find_similar("john smith", threshold=0.5)] == ["Jon Smith"]
+    assert len(index) == 1
+
+
+def test_invalidate_reloads_from_the_database():
+    names = [("1", "John Smith")]
+    index = NameIndex(lambda: list(names))
+    assert len(index) == 1
+    names.append(("2", "Mariam Khan"))
+    index.invalidate()
+    assert index.find_similar("mariam khan") == [("Mariam Khan", 1.0)]
@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("email_validator")
+pytest.importorskip("phonenumbers")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from support_files import validation_functions
+from support_files.pre_router import PreRouter, PreRouterStats, extract_identifiers
+
+
+def _route(text: str, dialog_state: list = None) -> str:
+    state = {"messages": [HumanMessage(content=text)], "dialog_state": dialog_state or []}
+    return PreRouter(stats=PreRouterStats()).route(state)
+
+
+@pytest.mark.parametrize("text", [
+    "Create a new lead for john, +96550000000, john@example.com",
+    "Please register a lead, civil ID 290010100000",
+])
+def test_lead_requests_with_identifiers_skip_the_primary_assistant(text):
+    assert _route(text) == "pre_router_handoff"
+
+
+@pytest.mark.parametrize("text", [
+    "create a new lead",
+    "the new lead form is broken",
+    "Don't create a lead for +96550000000",
+    "I do not want a new lead, +96550000000",
+    "How do I add a lead for +96550000000?",
+    "what happens when I open a lead for john@example.com",
+])
+def test_bare_negated_or_questioning_mentions_go_to_the_primary_assistant(text):
+    assert _route(text) == "primary_assistant"
+
+
+def test_identifiers_and_confirmations_stay_in_the_lead_flow():
+    assert _route("my number is +96550000000", ["lead_agent"]) == "lead_agent"
+    assert _route("yes please", ["lead_agent"]) == "lead_agent"
+    assert _route("tell me about the Patrol", ["lead_agent"]) == "primary_assistant"
+
+
+def test_extracting_identifiers_does_not_look_up_the_email_domain(monkeypatch):
+    def deliverability(*args, **kwargs):
+        raise AssertionError("DNS lookup on the entry edge")
+
+    monkeypatch.setattr(validation_functions, "_check_email", deliverability)
+    assert extract_identifiers("john@example.com, +96550000000, 290010100000") == {
+        "email": "john@example.com", "phone": "+96550000000", "civil_id": "290010100000"}
+
+
+def test_a_phone_number_followed_by_a_civil_id_is_split():
+    assert extract_identifiers("my number +96550000000 290010100000") == {
+        "phone": "+96550000000", "civil_id": "290010100000"}
+    assert extract_identifiers("+965 5000-0000 290010100000") == {
+        "phone": "+965 5000-0000", "civil_id": "290010100000"}
+    assert extract_identifiers("call me on +965 5000 0000") == {"phone": "+965 5000 0000"}
+
+
+def test_only_user_turns_are_routed():
+    assert _route("") == "primary_assistant"
+    state = {"messages": [AIMessage(content="create a new lead for +96550000000")]}
+    assert PreRouter(stats=PreRouterStats()).route(state) == "primary_assistant"
@@ -0,0 +1,131 @@
+import asyncio
+import time
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("loguru")
+groq = pytest.importorskip("groq")
+httpx = pytest.importorskip("httpx")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from loguru import logger
+from support_files.retry import RetryPolicy, ainvoke_with_retry, invoke_with_retry, retry_stats
+
+_REQUEST = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+
+
+def _rate_limited(retry_after: str = None) -> Exception:
+    headers = {"retry-after": retry_after} if retry_after else {}
+    return groq.RateLimitError("slow down", response=httpx.Response(429, headers=headers, request=_REQUEST), body=None)
+
+
+class _Replies:
+    """Answers the LLM calls with `replies` in order, raising the exceptions among them."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def _next(self, state):
+        self.prompts.append(state["messages"])
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def runnable(self) -> RunnableLambda:
+        async def anext(state):
+            return self._next(state)
+
+        return RunnableLambda(self._next, afunc=anext)
+
+
+_FAST = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01)
+
+
+def _both(runnable, policy: RetryPolicy, **kwargs) -> list:
+    """The result of the sync and the async path, `runnable` must answer both."""
+    return [invoke_with_retry(runnable, {"messages": []}, policy, **kwargs),
+            asyncio.run(ainvoke_with_retry(runnable, {"messages": []}, policy, **kwargs))]
+
+
+def test_transient_errors_are_retried():
+    replies = _Replies(_rate_limited(), groq.APIConnectionError(request=_REQUEST), AIMessage(content="hi"),
+                       _rate_limited(), AIMessage(content="hi"))
+    before = retry_stats.snapshot()
+    assert [result.content for result in _both(replies.runnable(), _FAST)] == ["hi", "hi"]
+    after = retry_stats.snapshot()
+    assert after.get("rate_limited", 0) - before.get("rate_limited", 0) == 2
+    assert after.get("transient_errors", 0) - before.get("transient_errors", 0) == 1
+
+
+def test_gives_up_after_the_last_attempt():
+    for run in (lambda runnable: invoke_with_retry(runnable, {"messages": []}, _FAST),
+                lambda runnable: asyncio.run(ainvoke_with_retry(runnable, {"messages": []}, _FAST))):
+        replies = _Replies(*[_rate_limited() for _ in range(4)])
+        with pytest.raises(groq.RateLimitError):
+            run(replies.runnable())
+        assert len(replies.prompts) == 3
+
+
+def test_other_errors_are_not_retried():
+    replies = _Replies(ValueError("bad request"), AIMessage(content="hi"))
+    with pytest.raises(ValueError):
+        invoke_with_retry(replies.runnable(), {"messages": []}, _FAST)
+    assert len(replies.prompts) == 1
+
+
+def test_empty_responses_are_reprompted_then_returned():
+    replies = _Replies(AIMessage(content=""), AIMessage(content="real"),
+                       *[AIMessage(content="") for _ in range(3)])
+    first = invoke_with_retry(replies.runnable(), {"messages": []}, _FAST)
+    assert first.content == "real"
+    assert replies.prompts[1] == [("user", "Respond with a real output.")]
+    last = invoke_with_retry(replies.runnable(), {"messages": []}, _FAST)
+    assert last.content == "" and not replies.replies
+
+
+def test_deadline_stops_the_retries():
+    policy = RetryPolicy(max_attempts=10, base_delay=0.05, max_delay=0.05, deadline=0.0)
+    replies = _Replies(_rate_limited(), AIMessage(content="hi"))
+    with pytest.raises(groq.RateLimitError):
+        invoke_with_retry(replies.runnable(), {"messages": []}, policy)
+    assert len(replies.prompts) == 1
+
+
+def test_retry_after_is_honored_up_to_max_delay():
+    policy = RetryPolicy(base_delay=5, max_delay=0.2)
+    assert policy.backoff(0, _rate_limited("0.1")) == 0.1
+    assert policy.backoff(0, _rate_limited("30")) == 0.2
+    assert all(0 <= policy.backoff(attempt) <= 0.2 for attempt in range(10))
+
+    replies = _Replies(_rate_limited("0.05"), AIMessage(content="hi"))
+    started = time.monotonic()
+    invoke_with_retry(replies.runnable(), {"messages": []}, policy)
+    assert time.monotonic() - started >= 0.05
+
+
+def test_assistant_logs_its_name():
+    pytest.importorskip("langgraph")
+    pytest.importorskip("neo4j")
+    from main import Assistant
+
+    lines = []
+    handler = logger.add(lines.append, level="WARNING", format="{message}")
+    try:
+        replies = _Replies(_rate_limited(), AIMessage(content="hi"))
+        Assistant(replies.runnable(), retry_policy=_FAST, name="lead_agent")({"messages": []}, {})
+    finally:
+        logger.remove(handler)
+    assert lines and lines[0].startswith("lead_agent attempt 1 failed with RateLimitError")
+
+
+def test_groq_clients_leave_the_retries_to_the_policy(monkeypatch):
+    pytest.importorskip("langchain_groq")
+    pytest.importorskip("langgraph")
+    pytest.importorskip("neo4j")
+    from main import groq_client
+
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    assert groq_client("llama3-70b-8192", temperature=0).max_retries == 0
@@ -0,0 +1,103 @@
+import re
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("loguru")
+pytest.importorskip("neo4j")
+
+from support_files import schema_bootstrap
+from support_files.cypher_queries import query_registry
+from support_files.schema_bootstrap import SCHEMA, bootstrap, check, explain_coverage
+
+_DDL = re.compile(r"CREATE (?:CONSTRAINT|FULLTEXT INDEX|INDEX) (\w+)( IF NOT EXISTS)? ")
+
+
+class _Schema:
+    """Applies the DDL statements the way Neo4j does, recording the indexes it holds."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.indexes = {}
+        self.statements = []
+
+    def query(self, statement: str, params: dict = None) -> list:
+        if statement.startswith("SHOW INDEXES"):
+            return [{"name": name, "state": state} for name, state in self.indexes.items()]
+        self.statements.append(statement)
+        name, if_not_exists = _DDL.match(statement).groups()
+        if name in self.failing:
+            raise RuntimeError(f"Unable to create {name}: the data holds duplicates")
+        if name in self.indexes:
+            if not if_not_exists:
+                raise RuntimeError(f"An equivalent index already exists: {name}")
+            return []
+        self.indexes[name] = "ONLINE"
+        return []
+
+
+def test_bootstrap_is_idempotent():
+    graph = _Schema()
+    assert bootstrap(graph) == {name: "ok" for name in SCHEMA}
+    assert bootstrap(graph) == {name: "ok" for name in SCHEMA}
+    assert sorted(graph.indexes) == sorted(SCHEMA)
+    assert len(graph.statements) == 2 * len(SCHEMA)
+    assert all(" IF NOT EXISTS " in statement for statement in SCHEMA.values())
+
+
+def test_failed_statements_are_reported_and_the_others_created():
+    graph = _Schema(failing={"customer_phone_number_unique"})
+    results = bootstrap(graph)
+    assert results.pop("customer_phone_number_unique").startswith("Unable to create customer_phone_number_unique")
+    assert set(results.values()) == {"ok"}
+    assert check(graph) == {name: "MISSING" if name == "customer_phone_number_unique" else "ONLINE" for name in SCHEMA}
+
+
+class _Planner:
+    """Answers `EXPLAIN` with the plan given for each registered query, raising the exceptions among them."""
+
+    def __init__(self, plans: dict):
+        self.plans = {query_registry[name].text: plan for name, plan in plans.items()}
+        self.params = []
+
+    def explain(self, query: str, params: dict) -> dict:
+        self.params.append((query, params))
+        plan = self.plans.get(query, {"operatorType": "NodeIndexSeek@neo4j"})
+        if isinstance(plan, Exception):
+            raise plan
+        return plan
+
+
+def _plan(*operators: str) -> dict:
+    """A plan chaining `operators`, the first one being the root."""
+    plan = None
+    for operator in reversed(operators):
+        plan = {"operatorType": f"{operator}@neo4j", "children": [plan] if plan else []}
+    return plan
+
+
+def test_explain_coverage_reports_queries_without_an_index(monkeypatch):
+    planner = _Planner({
+        "all_lead_names": _plan("ProduceResults", "Filter", "NodeByLabelScan"),
+        "identifier_lookup": _plan("ProduceResults", "Distinct", "Union", "NodeIndexSeek"),
+        "lead_creation": _plan("ProduceResults", "Apply", "NodeUniqueIndexSeek", "AllNodesScan"),
+        "bulk_lead_creation": RuntimeError("Unknown function"),
+    })
+    monkeypatch.setattr(schema_bootstrap, "_TARGETS", {"main": planner, "test": planner})
+    coverage = explain_coverage()
+
+    assert coverage["all_lead_names"] == {"covered": False, "index_operators": [],
+                                          "scan_operators": ["NodeByLabelScan"]}
+    assert coverage["identifier_lookup"] == {"covered": True, "index_operators": ["NodeIndexSeek"],
+                                             "scan_operators": []}
+    assert coverage["lead_creation"] == {"covered": False, "index_operators": ["NodeUniqueIndexSeek"],
+                                         "scan_operators": ["AllNodesScan"]}
+    assert coverage["bulk_lead_creation"] == {"covered": False, "error": "Unknown function"}
+    assert set(coverage) == {query.name for query in query_registry}
+
+
+def test_explain_passes_every_query_parameter(monkeypatch):
+    planner = _Planner({})
+    monkeypatch.setattr(schema_bootstrap, "_TARGETS", {"main": planner, "test": planner})
+    explain_coverage()
+    for query, params in planner.params:
+        assert set(re.findall(r"\$(\w+)", query)) <= set(params)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("loguru")
+pytest.importorskip("neo4j")
+email_validator = pytest.importorskip("email_validator")
+
+from langgraph.checkpoint.memory import MemorySaver
+from benchmarks.fakes import (AsyncFakeNeo4jGraph, FakeNeo4jGraph, ScriptedChatModel, lead_script, primary_script,
+                              seed_leads)
+from support_files import tool_execution
+from support_files.lead_agent import lead_agent_prompt_template
+import main
+from server import SessionServer
+
+
+class _Writer:
+    """Collects what the server sends to one client."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.wait_closed_awaited = False
+
+    def write(self, data: bytes):
+        self.sent.extend(json.loads(line) for line in data.decode().splitlines())
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        self.wait_closed_awaited = True
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    # No DNS lookups for the generated email domains
+    monkeypatch.setattr(email_validator, "CHECK_DELIVERABILITY", False)
+    fake = FakeNeo4jGraph(seed_leads(20))
+    for name in ("graph", "test_graph"):
+        monkeypatch.setattr(tool_execution, name, fake)
+    for name in ("async_graph", "async_test_graph"):
+        monkeypatch.setattr(tool_execution, name, AsyncFakeNeo4jGraph(fake))
+    tool_execution.lead_name_index.invalidate()
+    yield main.create_graph_builder(
+        main.primary_assistant_prompt | ScriptedChatModel(script=primary_script),
+        lead_agent_prompt_template | ScriptedChatModel(script=lead_script),
+    ).compile(checkpointer=MemorySaver())
+    tool_execution.lead_name_index.invalidate()
+
+
+def _customer() -> str:
+    return json.dumps({"name": "new customer", "phone": "+96550000000", "civil_id": "290010100000",
+                       "email": "new.customer@example.com", "model": "creta", "variant": "sx"})
+
+
+async def _serve(server: SessionServer, *lines: str) -> _Writer:
+    reader = asyncio.StreamReader()
+    for line in lines:
+        reader.feed_data((line + "\n").encode())
+    reader.feed_eof()
+    writer = _Writer()
+    await server.handle_client(reader, writer)
+    return writer
+
+
+@pytest.mark.parametrize("stream_tokens", [True, False])
+def test_a_turn_sends_every_step_and_the_reply(graph, stream_tokens):
+    server = SessionServer(graph, stream_tokens=stream_tokens)
+    writer = asyncio.run(_serve(server, json.dumps({"message": _customer()})))
+
+    kinds = [payload["type"] for payload in writer.sent]
+    assert kinds[0] == "session" and kinds[-1] == "done"
+    messages = [payload for payload in writer.sent if payload["type"] == "message"]
+    assert [message["role"] for message in messages[:2]] == ["human", "ai"]
+    tool_results = [message for message in messages if message["role"] == "tool"]
+    assert tool_results and any("lead_agent" == message["dialog_state"] for message in messages)
+    # The primary assistant's answer after the lead assistant handed control back
+    assert messages[-1]["role"] == "ai" and messages[-1]["content"].startswith("The lead has been handled")
+    assert messages[-1]["dialog_state"] is None
+    assert writer.closed and writer.wait_closed_awaited
+
+
+def test_issued_sessions_resume_their_conversation(graph):
+    server = SessionServer(graph, session_secret=b"secret")
+    first = asyncio.run(_serve(server, json.dumps({"message": _customer()})))
+    session_id = first.sent[0]["session_id"]
+    thread_id = server.resume_session(session_id)
+    turns = len(graph.get_state({"configurable": {"thread_id": thread_id}}).values["messages"])
+
+    # Another worker sharing the secret accepts the id
+    other = SessionServer(graph, session_secret=b"secret")
+    second = asyncio.run(_serve(other, json.dumps({"session_id": session_id, "message": _customer()})))
+    assert second.sent[0] == {"type": "session", "session_id": session_id}
+    assert len(graph.get_state({"configurable": {"thread_id": thread_id}}).values["messages"]) > turns
+
+
+def test_session_ids_not_issued_by_the_server_are_rejected(graph):
+    server = SessionServer(graph, session_secret=b"secret")
+    issued = asyncio.run(_serve(server, json.dumps({"message": _customer()}))).sent[0]["session_id"]
+    thread_id = issued.split(".")[0]
+    forged = [thread_id, f"{thread_id}.{'0' * 64}", issued + "é"]
+    writer = asyncio.run(_serve(SessionServer(graph, session_secret=b"other secret"),
+                                *(json.dumps({"session_id": session_id, "message": "hi"}) for session_id in forged + [issued])))
+    assert [payload["error"] for payload in writer.sent] == ["invalid_session"] * 4
@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("email_validator")
+pytest.importorskip("phonenumbers")
+
+from email_validator import EmailSyntaxError, EmailUndeliverableError
+from support_files import validation_functions
+from support_files.validation_functions import check_civil_id, check_email, check_phone_number
+
+
+class _Validated:
+    def __init__(self, email: str, mx=None):
+        self.email = email
+        if mx is not None:
+            self.mx = mx
+
+
+@pytest.fixture
+def validate_email(monkeypatch):
+    """Stands in for email_validator's validate_email, answering from `outcomes` and counting the lookups."""
+    calls = []
+    outcomes = {}
+
+    def validate(email, **kwargs):
+        calls.append(email)
+        outcome = outcomes[email]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    validation_functions._check_email.cache_clear()
+    monkeypatch.setattr(validation_functions, "validate_email", validate)
+    yield outcomes, calls
+    validation_functions._check_email.cache_clear()
+
+
+def test_definite_email_results_are_memoized(validate_email):
+    outcomes, calls = validate_email
+    outcomes["john@example.com"] = _Validated("john@example.com", mx=[(10, "mx.example.com")])
+    outcomes["john@"] = EmailSyntaxError("no domain")
+    for _ in range(2):
+        assert check_email("john@example.com").valid
+        assert not check_email("john@").valid
+    assert calls == ["john@example.com", "john@"]
+
+
+def test_dns_dependent_email_results_are_checked_again(validate_email):
+    outcomes, calls = validate_email
+    outcomes["john@example.com"] = _Validated("john@example.com")
+    outcomes["john@example.org"] = EmailUndeliverableError("error while checking")
+    for _ in range(2):
+        assert check_email("john@example.com").valid
+        assert not check_email("john@example.org").valid
+    assert calls == ["john@example.com", "john@example.org"] * 2
+
+
+def test_civil_ids_are_not_trimmed():
+    assert check_civil_id("290010100000").valid
+    assert not check_civil_id(" 290010100000").valid
+
+
+def test_phone_numbers_may_contain_spaces_and_hyphens():
+    assert check_phone_number("+965 5000-0000").normalized == "+96550000000"
+    assert not check_phone_number(" +96550000000").valid
+
+
+def test_phone_number_errors_show_the_number_as_typed():
+    assert "'+965 0000-0000'" in check_phone_number("+965 0000-0000").error
+    assert "'+9650000 0000'" in check_phone_number("+9650000 0000").error
+
+
+def test_lead_creation_rejects_invalid_identifiers(validate_email):
+    pytest.importorskip("langchain_core")
+    pytest.importorskip("neo4j")
+    from support_files.tool_execution import lead_creation_error
+
+    outcomes, _ = validate_email
+    outcomes["john@example.com"] = _Validated("john@example.com", mx=[(10, "mx.example.com")])
+    outcomes["john@"] = EmailSyntaxError("no domain")
+    details = {"name": "john", "phone": "+96550000000", "civil_id": "290010100000", "email": "john@example.com",
+               "model": "creta", "variant": "sx"}
+    assert lead_creation_error(**details) is None
+    assert lead_creation_error(**{**details, "email": "john@"}).startswith("Error: Invalid email address")
+    assert lead_creation_error(**{**details, "phone": "96550000000"}).startswith("Error: Invalid phone number")
+    assert lead_creation_error(**{**details, "civil_id": "2900101"}).startswith("Error: Invalid civil ID")